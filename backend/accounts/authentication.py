@@ -0,0 +1,158 @@
+"""
+Autenticação JWT sem consulta ao banco por requisição.
+
+O token de acesso carrega os dados do usuário usados pelas views (papel,
+nome, email, flags) e, para usuários comuns com poucos tenants/domínios, um
+resumo do escopo (``scope``: ids de tenants gerenciados e de domínios
+liberados). ``StatelessJWTAuthentication`` monta a partir desses claims uma
+instância de ``User`` com os demais campos adiados (carregados só se
+acessados), sem ``SELECT`` em ``accounts_user``.
+
+Cada usuário tem um contador ``token_version``, gravado no token (``ver``).
+Mudanças de papel, senha, status ou escopo incrementam o contador (ver
+``accounts/signals.py``) e tokens com versão antiga passam a ser recusados;
+o cliente obtém um novo pelo refresh, que relê o usuário. A versão é lida do
+banco a cada requisição (uma coluna, pela chave primária), para que a
+revogação valha na hora em todos os processos. Só com um cache compartilhado
+entre os processos (Redis, Memcached, banco) ela fica no cache por
+``JWT_PRINCIPAL['VERSION_CACHE_TIMEOUT']`` segundos, invalidada a cada
+alteração; um cache local do processo não veria as alterações feitas pelos
+demais.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .scope import TenantScope, get_tenant_scope, set_tenant_scope
+
+User = get_user_model()
+
+DEFAULT_PRINCIPAL_SETTINGS = {
+    'ENABLED': True,
+    'VERSION_CACHE_TIMEOUT': 60,  # segundos; só com cache compartilhado entre processos
+    'SCOPE_MAX_IDS': 100,         # acima disso o escopo não vai no token
+}
+
+# Campos do usuário copiados para o token
+CLAIM_FIELDS = ('email', 'first_name', 'last_name', 'role', 'is_superuser', 'is_staff')
+
+_MISSING = -1  # usuário inexistente ou inativo (também guardado no cache)
+
+# Caches que cada processo mantém por conta própria
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_principal_settings():
+    config = dict(DEFAULT_PRINCIPAL_SETTINGS)
+    config.update(getattr(settings, 'JWT_PRINCIPAL', {}))
+    return config
+
+
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def version_cache_enabled():
+    """A versão só vai para o cache se ele for compartilhado entre os processos."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', PROCESS_LOCAL_CACHES[0])
+    return get_principal_settings()['VERSION_CACHE_TIMEOUT'] > 0 and backend not in PROCESS_LOCAL_CACHES
+
+
+def _read_token_version(user_id):
+    return User.objects.filter(pk=user_id, is_active=True).values_list('token_version', flat=True).first()
+
+
+def get_token_version(user_id):
+    """Versão atual dos tokens do usuário (``None`` se ele não existe ou está inativo)."""
+    if not version_cache_enabled():
+        return _read_token_version(user_id)
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _read_token_version(user_id)
+        if version is None:
+            version = _MISSING
+        cache.set(key, version, get_principal_settings()['VERSION_CACHE_TIMEOUT'])
+    return None if version == _MISSING else version
+
+
+def forget_token_versions(*user_ids):
+    """Descarta as versões em cache após o commit (a próxima leitura vem do banco)."""
+    keys = [_version_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bump_token_version(*user_ids):
+    """Invalida os tokens já emitidos para os usuários."""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+    forget_token_versions(*user_ids)
+
+
+def add_user_claims(token, user):
+    """Grava no token os dados do usuário, a versão e o resumo do escopo."""
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token['name'] = f"{user.first_name} {user.last_name}"
+    token['ver'] = user.token_version
+
+    scope = get_tenant_scope(user)
+    if not scope.is_admin and len(scope.tenant_ids) + len(scope.domain_ids) <= get_principal_settings()['SCOPE_MAX_IDS']:
+        token['scope'] = {'t': sorted(scope.tenant_ids), 'd': sorted(scope.domain_ids)}
+    elif 'scope' in token:
+        del token['scope']
+    return token
+
+
+def principal_from_token(token):
+    """``User`` com os campos do token; os demais são carregados só se acessados."""
+    values = {'id': token[api_settings.USER_ID_CLAIM], 'is_active': True, 'token_version': token['ver']}
+    values.update((field, token[field]) for field in CLAIM_FIELDS)
+    user = User.from_db(router.db_for_read(User), list(values), list(values.values()))
+
+    digest = token.get('scope')
+    if digest is not None and user.role != 'admin':
+        set_tenant_scope(user, TenantScope(False, digest['t'], digest['d']))
+    return user
+
+
+def get_full_user(user):
+    """O usuário com todos os campos carregados (uma consulta se ele veio do token)."""
+    if user.get_deferred_fields():
+        return User.objects.get(pk=user.pk)
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` que não carrega o usuário do banco.
+
+    Tokens sem os claims (emitidos antes desta versão) ou com o modo
+    desativado seguem o caminho padrão do simplejwt.
+    """
+
+    def get_user(self, validated_token):
+        if not get_principal_settings()['ENABLED'] or 'ver' not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('O token não identifica o usuário.')
+
+        version = get_token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed('Usuário inativo ou inexistente.', code='user_inactive')
+        if validated_token['ver'] != version:
+            raise InvalidToken('Token desatualizado: permissões do usuário foram alteradas.')
+        return principal_from_token(validated_token)
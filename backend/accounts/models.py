@@ -14,6 +14,8 @@ class User(AbstractUser):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)  # Novo campo para foto de perfil
+    # Incrementado quando papel, senha ou escopo mudam; invalida os tokens JWT emitidos (accounts/authentication.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
@@ -0,0 +1,69 @@
+"""
+Resolução em lote das permissões por domínio exibidas em ``UserSerializer``.
+
+Para uma lista de usuários monta, com três consultas, a matriz usuário ->
+permissões: as ``UserDomainPermission`` explícitas seguidas dos domínios dos
+tenants que o usuário gerencia (sem repetir domínios já presentes).
+"""
+from collections import defaultdict
+
+from domains.models import Domain
+from tenants.models import Tenant
+from .models import UserDomainPermission
+
+
+def _permission_entry(tenant_id, tenant_name, domain_id, domain_name, record=None):
+    return {
+        'tenant': tenant_id,
+        'tenant_name': tenant_name,
+        'domain': domain_id,
+        'domain_name': domain_name,
+        'allowed_a_record': record.id if record else None,
+        'allowed_a_record_name': f'{record.name} ({record.content})' if record else '',
+    }
+
+
+def resolve_domain_permissions(users):
+    """Retorna ``{user_id: [permissões]}`` para os usuários informados."""
+    user_ids = [getattr(user, 'pk', user) for user in users]
+    matrix = {user_id: [] for user_id in user_ids}
+    if not user_ids:
+        return matrix
+    seen_domains = defaultdict(set)
+
+    # 1) Permissões explícitas por domínio
+    perms = (
+        UserDomainPermission.objects.filter(user_id__in=user_ids)
+        .select_related('domain__tenant', 'allowed_a_record')
+        .order_by('id')
+    )
+    for perm in perms:
+        domain = perm.domain
+        matrix[perm.user_id].append(_permission_entry(
+            domain.tenant_id, domain.tenant.name, domain.id, domain.name, perm.allowed_a_record,
+        ))
+        seen_domains[perm.user_id].add(domain.id)
+
+    # 2) Tenants gerenciados e 3) seus domínios
+    managed = list(
+        Tenant.managers.through.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', 'tenant_id', 'tenant__name')
+        .order_by('tenant_id')
+    )
+    domains_by_tenant = defaultdict(list)
+    if managed:
+        domains = (
+            Domain.objects.filter(tenant_id__in={tenant_id for _, tenant_id, _ in managed})
+            .values_list('tenant_id', 'id', 'name')
+            .order_by('id')
+        )
+        for tenant_id, domain_id, domain_name in domains:
+            domains_by_tenant[tenant_id].append((domain_id, domain_name))
+
+    for user_id, tenant_id, tenant_name in managed:
+        seen = seen_domains[user_id]
+        for domain_id, domain_name in domains_by_tenant[tenant_id]:
+            if domain_id not in seen:
+                seen.add(domain_id)
+                matrix[user_id].append(_permission_entry(tenant_id, tenant_name, domain_id, domain_name))
+    return matrix
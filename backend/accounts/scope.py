@@ -0,0 +1,121 @@
+"""
+Escopo de acesso de um usuário: tenants que ele gerencia e domínios liberados
+por ``UserDomainPermission``.
+
+``get_tenant_scope(user)`` calcula o escopo uma única vez por requisição
+(memorizado na instância do usuário autenticado) e, se
+``TENANT_SCOPE['CACHE_TIMEOUT']`` for maior que zero, também no cache do
+Django entre requisições. A chave do cache inclui uma versão por usuário,
+trocada pelos sinais em ``accounts/signals.py`` sempre que os gerentes de um
+tenant ou as permissões por domínio mudam; entradas antigas simplesmente
+deixam de ser lidas. Use um cache compartilhado (Redis/Memcached) ao ativar o
+cache com mais de um processo.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+
+from tenants.models import Tenant
+from .models import UserDomainPermission
+
+DEFAULT_SCOPE_SETTINGS = {
+    'CACHE_TIMEOUT': 0,  # segundos; 0 = só por requisição
+}
+
+_REQUEST_ATTR = '_tenant_scope'
+
+
+def get_scope_settings():
+    config = dict(DEFAULT_SCOPE_SETTINGS)
+    config.update(getattr(settings, 'TENANT_SCOPE', {}))
+    return config
+
+
+class TenantScope:
+    def __init__(self, is_admin, tenant_ids=(), domain_ids=()):
+        self.is_admin = is_admin
+        self.tenant_ids = frozenset(tenant_ids)
+        self.domain_ids = frozenset(domain_ids)  # liberados por UserDomainPermission
+
+    def can_access_tenant(self, tenant_id):
+        return self.is_admin or int(tenant_id) in self.tenant_ids
+
+    def can_access_domain(self, domain):
+        """Acesso de gerente ao domínio (pelo tenant do domínio)."""
+        return self.is_admin or domain.tenant_id in self.tenant_ids
+
+
+def _version_key(user_id):
+    return f'tenant_scope:version:{user_id}'
+
+
+def _compute(user):
+    """Tenants gerenciados e domínios liberados, em uma única consulta (UNION ALL)."""
+    tenants = (
+        Tenant.managers.through.objects.filter(user_id=user.pk)
+        .annotate(kind=Value('tenant')).values_list('kind', 'tenant_id')
+    )
+    domains = (
+        UserDomainPermission.objects.filter(user_id=user.pk)
+        .annotate(kind=Value('domain')).values_list('kind', 'domain_id')
+    )
+    tenant_ids, domain_ids = set(), set()
+    for kind, pk in tenants.union(domains, all=True):
+        (tenant_ids if kind == 'tenant' else domain_ids).add(pk)
+    return tenant_ids, domain_ids
+
+
+def get_tenant_scope(user):
+    """Escopo do usuário, calculado no máximo uma vez por requisição."""
+    scope = getattr(user, _REQUEST_ATTR, None)
+    if scope is not None:
+        return scope
+
+    if getattr(user, 'role', None) == 'admin':
+        scope = TenantScope(is_admin=True)
+    else:
+        timeout = get_scope_settings()['CACHE_TIMEOUT']
+        if timeout > 0:
+            version = cache.get_or_set(_version_key(user.pk), lambda: uuid.uuid4().hex, None)
+            key = f'tenant_scope:{user.pk}:{version}'
+            data = cache.get(key)
+            if data is None:
+                data = _compute(user)
+                cache.set(key, data, timeout)
+        else:
+            data = _compute(user)
+        scope = TenantScope(False, *data)
+
+    setattr(user, _REQUEST_ATTR, scope)
+    return scope
+
+
+def managed_tenant_ids(user):
+    """
+    Tenants gerenciados pelo usuário, para filtrar querysets (``tenant_id__in``).
+
+    Usa o escopo se ele já é conhecido nesta requisição (token JWT ou consulta
+    anterior) ou se está em cache; senão devolve uma subconsulta, que o banco
+    resolve junto com a listagem, em vez de uma consulta a mais só para obter
+    os IDs.
+    """
+    scope = getattr(user, _REQUEST_ATTR, None)
+    if scope is None and get_scope_settings()['CACHE_TIMEOUT'] > 0:
+        scope = get_tenant_scope(user)
+    if scope is not None:
+        return scope.tenant_ids
+    return Tenant.managers.through.objects.filter(user_id=user.pk).values('tenant_id')
+
+
+def set_tenant_scope(user, scope):
+    """Define o escopo já conhecido do usuário (ex.: lido do token JWT)."""
+    setattr(user, _REQUEST_ATTR, scope)
+
+
+def invalidate_tenant_scope(*user_ids):
+    """Descarta o escopo em cache dos usuários (nova versão da chave)."""
+    if get_scope_settings()['CACHE_TIMEOUT'] <= 0:
+        return
+    cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
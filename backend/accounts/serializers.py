@@ -1,6 +1,9 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model
+from .authentication import add_user_claims
 from .models import CloudflareAPIKey, UserDomainPermission
 from domains.models import Domain
 
@@ -12,10 +15,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        token['role'] = getattr(user, 'role', '')
-        token['name'] = f"{user.first_name} {user.last_name}"
-        token['is_superuser'] = user.is_superuser
-        return token
+        return add_user_claims(token, user)
 
     def validate(self, attrs):
         # O campo 'email' já será passado como 'username' para o super().validate
@@ -26,6 +26,30 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         })
         return data
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh que relê o usuário: o novo token reflete papel, escopo e versão atuais."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM), is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('Usuário inativo ou inexistente.', code='user_inactive')
+        add_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # App de blacklist não instalado
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     avatar = serializers.ImageField(required=False, allow_null=True)
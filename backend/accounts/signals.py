@@ -0,0 +1,73 @@
+"""
+Invalidação quando o acesso de um usuário muda: escopo de tenants em cache
+(``accounts/scope.py``) e tokens JWT já emitidos (``accounts/authentication.py``).
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from tenants.models import Tenant
+from .authentication import CLAIM_FIELDS, bump_token_version, forget_token_versions
+from .models import UserDomainPermission
+from .scope import invalidate_tenant_scope
+
+User = get_user_model()
+
+# Campos que, alterados, invalidam os tokens do usuário
+TOKEN_FIELDS = CLAIM_FIELDS + ('is_active', 'password')
+
+
+def access_changed(*user_ids):
+    invalidate_tenant_scope(*user_ids)
+    bump_token_version(*user_ids)
+
+
+@receiver(m2m_changed, sender=Tenant.managers.through)
+def tenant_managers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.managed_tenants.add/remove/clear: a instância é o usuário
+        access_changed(instance.pk)
+    elif action == 'pre_clear':
+        access_changed(*instance.managers.values_list('pk', flat=True))
+    elif pk_set:
+        access_changed(*pk_set)
+
+
+@receiver(pre_delete, sender=Tenant)
+def tenant_deleted(sender, instance, **kwargs):
+    # A exclusão em cascata das linhas do M2M não dispara m2m_changed
+    access_changed(*instance.managers.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=UserDomainPermission)
+@receiver(post_delete, sender=UserDomainPermission)
+def domain_permission_changed(sender, instance, **kwargs):
+    access_changed(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def user_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fields = [field for field in TOKEN_FIELDS if update_fields is None or field in update_fields]
+    if not fields:
+        return
+    current = User.objects.filter(pk=instance.pk).values('token_version', *fields).first()
+    if current is None:
+        return
+    version = current.pop('token_version')
+    changed = any(getattr(instance, field) != value for field, value in current.items())
+    if changed:
+        version += 1
+        forget_token_versions(instance.pk)
+        if update_fields is not None and 'token_version' not in update_fields:
+            User.objects.filter(pk=instance.pk).update(token_version=version)
+    # Também evita que uma instância antiga regrave uma versão menor
+    instance.token_version = version
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_token_versions(instance.pk)
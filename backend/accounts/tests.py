@@ -1,3 +1,144 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from domains.models import Domain
+from tenants.models import Tenant
+from .models import UserDomainPermission
+from .scope import get_tenant_scope
+
+User = get_user_model()
+
+
+@override_settings(TENANT_SCOPE={'CACHE_TIMEOUT': 60})
+class TenantScopeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='dono', email='dono@example.com', password='x', role='admin')
+        cls.user = User.objects.create_user(username='gerente', email='gerente@example.com', password='x')
+        cls.tenant = Tenant.objects.create(owner=cls.owner, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        cls.domain = Domain.objects.create(tenant=cls.tenant, name='exemplo.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_scope(self):
+        # Instância nova = nova requisição
+        return get_tenant_scope(User.objects.get(pk=self.user.pk))
+
+    def test_scope_is_computed_once_per_request(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            get_tenant_scope(user)
+            get_tenant_scope(user)
+
+    def test_cached_between_requests(self):
+        self.fresh_scope()
+        with self.assertNumQueries(1):  # só o carregamento do usuário
+            self.assertFalse(self.fresh_scope().can_access_domain(self.domain))
+
+    def test_invalidated_by_manager_changes(self):
+        self.assertFalse(self.fresh_scope().can_access_tenant(self.tenant.pk))
+        self.tenant.managers.add(self.user)
+        self.assertTrue(self.fresh_scope().can_access_domain(self.domain))
+        self.user.managed_tenants.remove(self.tenant)
+        self.assertFalse(self.fresh_scope().can_access_tenant(self.tenant.pk))
+        self.tenant.managers.add(self.user)
+        self.tenant.managers.clear()
+        self.assertEqual(self.fresh_scope().tenant_ids, frozenset())
+
+    def test_invalidated_by_domain_permission_changes(self):
+        self.assertEqual(self.fresh_scope().domain_ids, frozenset())
+        permission = UserDomainPermission.objects.create(user=self.user, domain=self.domain)
+        self.assertEqual(self.fresh_scope().domain_ids, {self.domain.pk})
+        permission.delete()
+        self.assertEqual(self.fresh_scope().domain_ids, frozenset())
+
+    def test_admin_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(get_tenant_scope(self.owner).can_access_tenant(12345))
+
+
+class StatelessJWTTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='dono', email='dono@example.com', password='x', role='admin')
+        cls.user = User.objects.create_user(username='gerente', email='gerente@example.com', password='senha-forte')
+        cls.tenant = Tenant.objects.create(owner=cls.owner, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        cls.domain = Domain.objects.create(tenant=cls.tenant, name='exemplo.com')
+        cls.tenant.managers.add(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post('/api/auth/token/', {'email': self.user.email, 'password': 'senha-forte'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_domains(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/admin/domains/')
+
+    def test_authenticated_read_skips_user_lookup(self):
+        access = self.obtain()['access']
+        with CaptureQueriesContext(connection) as captured:
+            response = self.get_domains(access)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.domain.pk])
+        # Só a versão do token é lida do usuário
+        user_queries = [query['sql'] for query in captured if 'accounts_user' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('"token_version"', user_queries[0])
+        self.assertNotIn('"password"', user_queries[0])
+
+    def test_shared_cache_skips_version_read(self):
+        access = self.obtain()['access']
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            self.get_domains(access)  # carrega a versão do token no cache
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.get_domains(access).status_code, 200)
+        self.assertFalse([query['sql'] for query in captured if 'accounts_user' in query['sql']])
+
+    def test_revocation_from_another_process_applies_immediately(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.get_domains(access).status_code, 200)
+        # Alteração feita por outro processo: o cache local deste não é invalidado
+        User.objects.filter(pk=self.user.pk).update(token_version=F('token_version') + 1)
+        self.assertEqual(self.get_domains(access).status_code, 401)
+
+    def test_role_change_invalidates_token(self):
+        tokens = self.obtain()
+        self.assertEqual(self.get_domains(tokens['access']).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.role = 'admin'
+            user.save()
+        self.assertEqual(self.get_domains(tokens['access']).status_code, 401)
+
+        self.client.credentials()
+        refreshed = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(self.get_domains(refreshed.data['access']).status_code, 200)
+
+    def test_scope_change_invalidates_token(self):
+        tokens = self.obtain()
+        other = Domain.objects.create(tenant=Tenant.objects.create(
+            owner=self.owner, name='Outro', cloudflare_api_key='key2', cloudflare_email='o@example.com',
+        ), name='outro.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.tenant.managers.add(self.user)
+        self.assertEqual(self.get_domains(tokens['access']).status_code, 401)
+
+        self.client.credentials()
+        access = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']}, format='json').data['access']
+        self.assertEqual({item['id'] for item in self.get_domains(access).data}, {self.domain.pk, other.pk})
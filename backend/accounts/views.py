@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
+from .authentication import get_full_user
 from .models import CloudflareAPIKey, UserDomainPermission
 
 from .serializers import (
@@ -27,7 +28,7 @@ class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(get_full_user(request.user))
         return Response(serializer.data)
 
 class StatsView(APIView):
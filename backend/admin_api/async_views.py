@@ -0,0 +1,270 @@
+# backend/admin_api/async_views.py
+"""
+Versões assíncronas de ``DNSRecordCloudflareView`` e ``ARecordListView``.
+
+Usadas quando ``CLOUDFLARE_ASYNC_VIEWS`` está ativo e a aplicação roda sob
+``core/asgi.py``: as chamadas à Cloudflare são feitas com
+``AsyncCloudflareService`` e não bloqueiam o event loop; o acesso ao banco é
+delegado a threads com ``sync_to_async``. A listagem de registros A/AAAA,
+assim como a versão síncrona, responde com os dados locais e deixa a
+sincronização para o worker.
+
+``SyncJobEventsView`` transmite o progresso de uma tarefa da fila como
+Server-Sent Events; exige ASGI (sob WSGI a resposta só seria enviada com a
+tarefa encerrada) e cada conexão aberta ocupa só uma corrotina.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts.authentication import StatelessJWTAuthentication
+from accounts.scope import get_tenant_scope
+from cloudflare_api.async_services import AsyncCloudflareService
+from cloudflare_api.services import CloudflareAPIError
+from domains.models import Domain, DNSRecord, SyncJob, SyncJobEvent
+from domains.jobs import enqueue_domain_refresh_if_stale
+from domains.sync import get_sync_settings, reconcile_dns_records, record_from_cloudflare, update_record_from_cloudflare
+from .serializers import DNSRecordSerializer
+from .views import cloudflare_error_response
+
+
+def _authenticate(request, query_token=None):
+    backend = StatelessJWTAuthentication()
+    if query_token and backend.get_header(request) is None:
+        validated_token = backend.get_validated_token(query_token)
+        return backend.get_user(validated_token), validated_token
+    return backend.authenticate(request)
+
+
+async def authenticate(request, query_token=None):
+    """
+    Autentica o token JWT do header ``Authorization`` (ou ``query_token``, para
+    clientes como o ``EventSource`` que não enviam headers); retorna o usuário
+    ou ``None``.
+    """
+    try:
+        result = await sync_to_async(_authenticate)(request, query_token)
+    except AuthenticationFailed:
+        return None
+    if not result:
+        return None
+    request.user = result[0]  # como o DRF faz nas views síncronas
+    return result[0]
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'As credenciais de autenticação não foram fornecidas.'}, status=401)
+
+
+async def get_domain(domain_id):
+    return await Domain.objects.select_related('tenant').aget(pk=domain_id)
+
+
+def _serialize_a_records(domain):
+    a_aaaa_records = DNSRecord.objects.filter(domain=domain, record_type__in=["A", "AAAA"])
+    return DNSRecordSerializer(a_aaaa_records, many=True).data
+
+
+def _parse_body(request):
+    """Corpo JSON da requisição; ``None`` se não for um objeto JSON válido."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DNSRecordCloudflareAsyncView(View):
+    async def get(self, request, domain_id):
+        """Lista todos os registros DNS reais da Cloudflare para o domínio."""
+        if not await authenticate(request):
+            return unauthorized()
+        try:
+            domain = await get_domain(domain_id)
+            tenant = domain.tenant
+            service = AsyncCloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+            # O cliente assíncrono não passa pelo cache de zonas: a lista é sempre atual
+            records = await service.get_dns_records(domain.cloudflare_zone_id)
+            await sync_to_async(reconcile_dns_records)(domain, records)
+            return JsonResponse(records, safe=False)
+        except Domain.DoesNotExist:
+            return JsonResponse({'error': 'Domínio não encontrado.'}, status=404)
+        except CloudflareAPIError as e:
+            return cloudflare_error_response(e, response_class=JsonResponse)
+
+    async def post(self, request, domain_id):
+        """Cria um registro DNS na Cloudflare e salva no banco local."""
+        if not await authenticate(request):
+            return unauthorized()
+        data = _parse_body(request)
+        if data is None:
+            return JsonResponse({'error': 'O corpo deve ser um objeto JSON.'}, status=400)
+        try:
+            domain = await get_domain(domain_id)
+            tenant = domain.tenant
+            # Garantir que o campo 'type' esteja presente
+            if not data.get('type') and data.get('record_type'):
+                data['type'] = data['record_type']
+            service = AsyncCloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+            record = await service.create_dns_record(domain.cloudflare_zone_id, data)
+            await record_from_cloudflare(domain, record).asave()
+            return JsonResponse(record, status=201)
+        except Domain.DoesNotExist:
+            return JsonResponse({'error': 'Domínio não encontrado.'}, status=404)
+        except CloudflareAPIError as e:
+            return cloudflare_error_response(e, response_class=JsonResponse)
+
+    async def put(self, request, domain_id, record_id):
+        """Atualiza um registro DNS na Cloudflare e no banco local."""
+        if not await authenticate(request):
+            return unauthorized()
+        data = _parse_body(request)
+        if data is None:
+            return JsonResponse({'error': 'O corpo deve ser um objeto JSON.'}, status=400)
+        try:
+            domain = await get_domain(domain_id)
+            tenant = domain.tenant
+            service = AsyncCloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+            record = await service.update_dns_record(domain.cloudflare_zone_id, record_id, data)
+            await sync_to_async(update_record_from_cloudflare)(domain, record)
+            return JsonResponse(record)
+        except Domain.DoesNotExist:
+            return JsonResponse({'error': 'Domínio não encontrado.'}, status=404)
+        except CloudflareAPIError as e:
+            return cloudflare_error_response(e, response_class=JsonResponse)
+
+    async def delete(self, request, domain_id, record_id):
+        """Remove um registro DNS da Cloudflare e do banco local."""
+        if not await authenticate(request):
+            return unauthorized()
+        try:
+            domain = await get_domain(domain_id)
+            tenant = domain.tenant
+            record = await DNSRecord.objects.aget(domain=domain, cloudflare_record_id=record_id)
+            service = AsyncCloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+            await service.delete_dns_record(domain.cloudflare_zone_id, record_id)
+            await record.adelete()
+            return JsonResponse({'message': 'Registro DNS removido com sucesso.'})
+        except Domain.DoesNotExist:
+            return JsonResponse({'error': 'Domínio não encontrado.'}, status=404)
+        except DNSRecord.DoesNotExist:
+            return JsonResponse({'error': 'Registro DNS não encontrado.'}, status=404)
+        except CloudflareAPIError as e:
+            return cloudflare_error_response(e, response_class=JsonResponse)
+
+
+class ARecordListAsyncView(View):
+    async def get(self, request, domain_id):
+        if not await authenticate(request):
+            return unauthorized()
+        try:
+            domain = await get_domain(domain_id)
+            if not domain.cloudflare_zone_id:
+                return JsonResponse({'error': 'Domínio não possui Zone ID da Cloudflare.'}, status=400)
+
+            # Responde com os dados locais; a sincronização com a Cloudflare roda no worker
+            await sync_to_async(enqueue_domain_refresh_if_stale)(domain)
+            data = await sync_to_async(_serialize_a_records)(domain)
+            return JsonResponse(data, safe=False)
+        except Domain.DoesNotExist:
+            return JsonResponse({'error': 'Domínio não encontrado.'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Erro inesperado: {e}'}, status=500)
+
+
+def _format_event(event):
+    data = dict(event.data, zone=event.zone) if event.zone else event.data
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f'id: {event.pk}\nevent: {event.kind}\ndata: {payload}\n\n'
+
+
+async def _new_events(job_id, last_event_id):
+    queryset = SyncJobEvent.objects.filter(job_id=job_id, id__gt=last_event_id).order_by('id')
+    return [event async for event in queryset]
+
+
+async def stream_job_events(job_id, last_event_id=0):
+    """
+    Eventos da tarefa com id maior que ``last_event_id``, lidos do banco a cada
+    ``EVENTS_POLL_SECONDS``, até a tarefa terminar (concluída ou falha
+    definitiva). Sem eventos novos, envia um comentário a cada
+    ``EVENTS_KEEPALIVE_SECONDS`` para manter a conexão aberta em proxies.
+    """
+    config = get_sync_settings()
+    yield f"retry: {config['EVENTS_RETRY_MS']}\n\n"
+    idle = 0.0
+    while True:
+        events = await _new_events(job_id, last_event_id)
+        for event in events:
+            last_event_id = event.pk
+            yield _format_event(event)
+        if events:
+            idle = 0.0
+            continue
+
+        job_status = await SyncJob.objects.filter(pk=job_id).values_list('status', flat=True).afirst()
+        if job_status not in SyncJob.ACTIVE_STATUSES:
+            # O evento final é gravado antes do status; esta leitura pega o que faltar
+            for event in await _new_events(job_id, last_event_id):
+                yield _format_event(event)
+            return
+
+        await asyncio.sleep(config['EVENTS_POLL_SECONDS'])
+        idle += config['EVENTS_POLL_SECONDS']
+        if idle >= config['EVENTS_KEEPALIVE_SECONDS']:
+            idle = 0.0
+            yield ': keepalive\n\n'
+
+
+def _parse_event_id(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class SyncJobEventsView(View):
+    """
+    Progresso de uma tarefa de sincronização (``text/event-stream``).
+
+    Eventos: ``started``, ``zones``, por zona ``fetched``, ``diffed``,
+    ``written`` ou ``error``, e por fim ``finished`` ou ``failed``. O cliente
+    que reconecta com ``Last-Event-ID`` (ou ``?last_event_id=``) recebe só os
+    eventos seguintes; a tarefa continua rodando no worker independentemente
+    da conexão. Com a tarefa encerrada e nada a enviar, a resposta é 204, que
+    faz o ``EventSource`` parar de reconectar.
+    """
+
+    async def get(self, request, job_id):
+        user = await authenticate(request, query_token=request.GET.get('token'))
+        if not user:
+            return unauthorized()
+        job = await SyncJob.objects.filter(pk=job_id).afirst()
+        if job is None:
+            return JsonResponse({'error': 'Tarefa não encontrada.'}, status=404)
+        scope = await sync_to_async(get_tenant_scope)(user)
+        if not scope.can_access_tenant(job.tenant_id):
+            return JsonResponse({'error': 'Permissão negada.'}, status=403)
+
+        last_event_id = _parse_event_id(
+            request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        )
+        if job.status not in SyncJob.ACTIVE_STATUSES and not await SyncJobEvent.objects.filter(
+                job_id=job.pk, id__gt=last_event_id).aexists():
+            return HttpResponse(status=204)
+
+        response = StreamingHttpResponse(
+            stream_job_events(job.pk, last_event_id), content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Desativa o buffer do nginx para os eventos chegarem na hora
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from admin_api.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os contadores materializados do dashboard (DashboardCounter) e corrige divergências. '
+        'Agende periodicamente (ex.: cron a cada hora).'
+    )
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+        if drift:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} contador(es) corrigido(s): {", ".join(drift[:20])}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Contadores do dashboard consistentes.'))
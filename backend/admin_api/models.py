@@ -1,3 +1,18 @@
 from django.db import models
 
-# Create your models here.
+
+class DashboardCounter(models.Model):
+    """
+    Contadores materializados do dashboard (ver ``admin_api/stats.py``).
+
+    ``key`` identifica o escopo: ``global`` (admins), ``tenant:<id>`` (rollup
+    por cliente) e ``user:<id>`` (soma dos clientes que o usuário gerencia).
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    tenants = models.IntegerField(default=0)
+    domains = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.key}: {self.tenants} clientes, {self.domains} domínios, {self.users} usuários'
@@ -2,13 +2,20 @@
 # backend/admin_api/serializers.py
 import json
 from rest_framework import serializers
+import datetime
 from tenants.models import Tenant
-from domains.models import Domain, DNSRecord # Importar DNSRecord
+from domains.models import Domain, DNSRecord, SyncJob # Importar DNSRecord
 from cloudflare_keys.models import CloudflareKey # Importar o modelo CloudflareKey
 from django.contrib.auth import get_user_model
 from accounts.models import UserDomainPermission
+from accounts.permissions import resolve_domain_permissions
+from domains.analytics import ROLLUPS, get_analytics_settings
+from domains.batch import OPERATIONS
+from domains.sync import get_sync_settings
+from core.instrumentation import TimedSerializerMixin, get_logger
 
 User = get_user_model()
+logger = get_logger(__name__)
 
 class NestedDomainSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,7 +29,7 @@ class TenantManagerSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'full_name', 'email']
 
-class TenantSerializer(serializers.ModelSerializer):
+class TenantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner_email = serializers.EmailField(source='owner.email', read_only=True)
     domains = NestedDomainSerializer(many=True, read_only=True)
     managers = TenantManagerSerializer(many=True, read_only=True)
@@ -31,7 +38,20 @@ class TenantSerializer(serializers.ModelSerializer):
         model = Tenant
         fields = ['id', 'name', 'cloudflare_email', 'created_at', 'owner_email', 'domains', 'managers']
 
-class UserSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Carrega owner, domínios e gerentes em consultas fixas (evita N+1 nas listagens)."""
+        return queryset.select_related('owner').prefetch_related('domains', 'managers')
+
+class UserListSerializer(serializers.ListSerializer):
+    """Calcula as permissões de todos os usuários da página de uma vez."""
+
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        self.child.context['permission_matrix'] = resolve_domain_permissions(users)
+        return super().to_representation(users)
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     permissions = serializers.SerializerMethodField(read_only=True)
     permissions_input = serializers.CharField(
@@ -49,62 +69,28 @@ class UserSerializer(serializers.ModelSerializer):
             'is_active', 'date_joined', 'permissions', 'permissions_input',
             'password'  # Adicionado password aos fields
         ]
+        list_serializer_class = UserListSerializer
 
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}".strip()
 
     def get_permissions(self, obj):
-        from accounts.models import UserDomainPermission
-        from tenants.models import Tenant
-        from domains.models import Domain
-        # Permissões por domínio
-        perms = UserDomainPermission.objects.filter(user=obj)
-        permissions = [
-            {
-                'tenant': perm.domain.tenant.id,
-                'tenant_name': perm.domain.tenant.name,
-                'domain': perm.domain.id,
-                'domain_name': perm.domain.name,
-                'allowed_a_record': perm.allowed_a_record.id if perm.allowed_a_record else None,
-                'allowed_a_record_name': f'{perm.allowed_a_record.name} ({perm.allowed_a_record.content})' if perm.allowed_a_record else '',
-            }
-            for perm in perms
-        ]
-        # Adiciona tenants onde o usuário é gerente, mesmo sem UserDomainPermission
-        managed_tenants = obj.managed_tenants.all()
-        for tenant in managed_tenants:
-            tenant_domains = Domain.objects.filter(tenant=tenant)
-            for domain in tenant_domains:
-                if not any(p['domain'] == domain.id for p in permissions):
-                    permissions.append({
-                        'tenant': tenant.id,
-                        'tenant_name': tenant.name,
-                        'domain': domain.id,
-                        'domain_name': domain.name,
-                        'allowed_a_record': None,
-                        'allowed_a_record_name': '',
-                    })
-        return permissions
+        # Em listagens a matriz já vem calculada pelo UserListSerializer
+        matrix = self.context.get('permission_matrix')
+        if matrix is None or obj.pk not in matrix:
+            matrix = resolve_domain_permissions([obj])
+        return matrix[obj.pk]
 
     def validate(self, data):
-        import logging
-        logger = logging.getLogger('django')
-        
-        logger.info(f'[UserSerializer:validate] data recebida: {data}')
-        logger.info(f'[UserSerializer:validate] email: {data.get("email")}')
-        logger.info(f'[UserSerializer:validate] email type: {type(data.get("email"))}')
-        
         # Validação específica do email
         email = data.get('email', '').strip() if data.get('email') else None
         if not email:
-            logger.error('[UserSerializer:validate] Email está vazio ou None')
             raise serializers.ValidationError({'email': 'Este campo não pode ser em branco.'})
         
         # Validação de formato de email
         import re
         email_pattern = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
         if not email_pattern.match(email):
-            logger.error(f'[UserSerializer:validate] Email inválido: {email}')
             raise serializers.ValidationError({'email': 'Email inválido.'})
         
         if not data.get('first_name', '').strip():
@@ -114,26 +100,19 @@ class UserSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        import logging
-        logger = logging.getLogger('django')
-        
         permissions_input = validated_data.pop('permissions_input', '[]')
-        logger.info(f'[UserSerializer:create] permissions_input (raw): {permissions_input}')
-        logger.info(f'[UserSerializer:create] permissions_input type: {type(permissions_input)}')
-        
         permissions = []
         try:
             if isinstance(permissions_input, list):
                 permissions_input = permissions_input[0] if permissions_input else '[]'
-                logger.info(f'[UserSerializer:create] permissions_input from list: {permissions_input}')
             permissions = json.loads(permissions_input)
         except json.JSONDecodeError as e:
-            logger.error(f'[UserSerializer:create] Erro ao parsear permissions_input: {e}')
+            logger.warning('user.permissions_input_invalid', error=e)
             permissions = []
         except Exception as e:
-            logger.error(f'[UserSerializer:create] Erro inesperado ao processar permissions_input: {e}')
+            logger.error('user.permissions_input_error', error=e)
             permissions = []
-        logger.info(f'[UserSerializer:create] permissions (parsed): {permissions}')
+        logger.debug('user.create', email=validated_data.get('email'), permissions=len(permissions))
 
         if 'username' not in validated_data or not validated_data.get('username'):
             validated_data['username'] = validated_data['email']
@@ -148,10 +127,9 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
     def update(self, instance, validated_data):
-        import logging
-        logger = logging.getLogger('django')
-        logger.info(f'[UserSerializer:update] validated_data recebido: {validated_data}')
-        
+        # Só os nomes dos campos: validated_data pode conter a nova senha
+        logger.debug('user.update', user=instance.pk, fields=lambda: sorted(validated_data))
+
         # Extrair permissions_input antes de processar outros dados
         permissions_input = validated_data.pop('permissions_input', '[]')
         permissions = []
@@ -160,7 +138,7 @@ class UserSerializer(serializers.ModelSerializer):
                 permissions_input = permissions_input[0] if permissions_input else '[]'
             permissions = json.loads(permissions_input)
         except (json.JSONDecodeError, Exception) as e:
-            logger.error(f'[UserSerializer:update] Erro ao processar permissions: {e}')
+            logger.warning('user.permissions_input_invalid', user=instance.pk, error=e)
             permissions = []
         
         # Verificar se o email está sendo alterado para um que já existe
@@ -168,28 +146,17 @@ class UserSerializer(serializers.ModelSerializer):
         if email:
             email = email.strip().lower()  # Normalizar email
             instance_email = instance.email.strip().lower() if instance.email else ''
-            
-            logger.info(f'[UserSerializer:update] Email normalizado: {email}')
-            logger.info(f'[UserSerializer:update] Email atual normalizado: {instance_email}')
-            logger.info(f'[UserSerializer:update] Emails são diferentes? {email != instance_email}')
-            
+
             # Só verificar duplicata se o email realmente mudou
             if email != instance_email:
-                existing_user = User.objects.filter(email__iexact=email).exclude(pk=instance.pk).first()
-                if existing_user:
-                    logger.error(f'[UserSerializer:update] Email {email} já existe para usuário ID {existing_user.pk}')
+                if User.objects.filter(email__iexact=email).exclude(pk=instance.pk).exists():
                     raise serializers.ValidationError({'email': 'Já existe um usuário com este email.'})
-                else:
-                    logger.info(f'[UserSerializer:update] Email {email} está disponível para alteração')
-            else:
-                logger.info(f'[UserSerializer:update] Email não foi alterado, prosseguindo...')
         
         # Processar senha
         password = validated_data.pop('password', None)
-        logger.info(f'[UserSerializer:update] password recebido: {password}')
         if password:
             instance.set_password(password)
-            logger.info('[UserSerializer:update] Senha alterada com sucesso!')
+            logger.info('user.password_changed', user=instance.pk)
         
         # Garantir que is_active seja preservado para usuários comuns editando a si mesmos
         # Se o usuário for comum e estiver editando a si mesmo, não permitir desativar
@@ -197,12 +164,6 @@ class UserSerializer(serializers.ModelSerializer):
         if request and request.user.role == 'user' and request.user.id == instance.id:
             # Remover is_active do validated_data para não alterar
             validated_data.pop('is_active', None)
-            logger.info('[UserSerializer:update] Usuário comum editando a si mesmo - is_active preservado')
-        else:
-            # Log do valor de is_active
-            is_active = validated_data.get('is_active')
-            if is_active is not None:
-                logger.info(f'[UserSerializer:update] is_active será definido como: {is_active}')
         
         # Atualizar outros campos
         for attr, value in validated_data.items():
@@ -217,13 +178,10 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
     def _save_permissions(self, user, permissions):
-        import logging
-        logger = logging.getLogger('django')
-        logger.info(f'[UserSerializer:_save_permissions] user={user.id} email={user.email} permissions={permissions}')
-        
+        logger.debug('user.save_permissions', user=user.id, permissions=len(permissions))
+
         # Se não houver permissões, não faz nada
         if not permissions:
-            logger.info(f'[UserSerializer:_save_permissions] Nenhuma permissão fornecida para o usuário {user.email}')
             return
             
         from accounts.models import UserDomainPermission
@@ -241,31 +199,31 @@ class UserSerializer(serializers.ModelSerializer):
                 # Verificar se o tenant existe
                 tenant_exists = Tenant.objects.filter(id=tenant_id).exists()
                 if not tenant_exists:
-                    logger.warning(f'[UserSerializer:_save_permissions] Tenant {tenant_id} não existe')
+                    logger.warning('user.permission_skipped', user=user.id, reason='tenant_not_found', tenant=tenant_id)
                     continue
                     
                 # Verificar se o domínio existe e pertence ao tenant
                 domain_exists = Domain.objects.filter(id=domain_id, tenant_id=tenant_id).exists()
                 if not domain_exists:
-                    logger.warning(f'[UserSerializer:_save_permissions] Domínio {domain_id} não existe ou não pertence ao tenant {tenant_id}')
+                    logger.warning('user.permission_skipped', user=user.id, reason='domain_not_in_tenant', domain=domain_id, tenant=tenant_id)
                     continue
                     
                 # Verificar se o registro existe e pertence ao domínio
                 record_exists = DNSRecord.objects.filter(id=record_id, domain_id=domain_id).exists()
                 if not record_exists:
-                    logger.warning(f'[UserSerializer:_save_permissions] Registro {record_id} não existe ou não pertence ao domínio {domain_id}')
+                    logger.warning('user.permission_skipped', user=user.id, reason='record_not_in_domain', record=record_id, domain=domain_id)
                     continue
                     
                 # Se passou por todas as validações, adiciona à lista de permissões válidas
                 valid_permissions.append(perm)
                 
             except (ValueError, TypeError) as e:
-                logger.error(f'[UserSerializer:_save_permissions] Erro ao validar permissão {perm}: {e}')
+                logger.warning('user.permission_invalid', user=user.id, permission=perm, error=e)
                 continue
         
         # Se não houver permissões válidas, não faz nada
         if not valid_permissions:
-            logger.warning(f'[UserSerializer:_save_permissions] Nenhuma permissão válida para o usuário {user.email}')
+            logger.warning('user.permissions_none_valid', user=user.id)
             return
             
         # Processar permissões válidas
@@ -275,7 +233,7 @@ class UserSerializer(serializers.ModelSerializer):
         # Remover permissões que não estão mais na lista
         for domain_id, record_id in current_perms - new_perms:
             UserDomainPermission.objects.filter(user=user, domain_id=domain_id, allowed_a_record_id=record_id).delete()
-            logger.info(f'[UserSerializer:_save_permissions] Removida permissão: domínio={domain_id}, registro={record_id}')
+            logger.debug('user.permission_removed', user=user.id, domain=domain_id, record=record_id)
         
         # Adicionar novas permissões
         for perm in valid_permissions:
@@ -286,11 +244,11 @@ class UserSerializer(serializers.ModelSerializer):
                     allowed_a_record_id=perm['allowed_a_record']
                 )
                 if created:
-                    logger.info(f'[UserSerializer:_save_permissions] Criada permissão: domínio={perm["domain"]}, registro={perm["allowed_a_record"]}')
+                    logger.debug('user.permission_created', user=user.id, domain=perm['domain'], record=perm['allowed_a_record'])
             except Exception as e:
-                logger.error(f'[UserSerializer:_save_permissions] Erro ao criar permissão {perm}: {e}')
+                logger.error('user.permission_create_failed', user=user.id, permission=perm, error=e)
 
-class DNSRecordSerializer(serializers.ModelSerializer):
+class DNSRecordSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = DNSRecord
         fields = ['id', 'name', 'record_type', 'content', 'ttl', 'proxied', 'cloudflare_record_id']
@@ -320,7 +278,7 @@ class DNSRecordSerializer(serializers.ModelSerializer):
 
         return data
 
-class DomainSerializer(serializers.ModelSerializer):
+class DomainSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     tenant_name = serializers.CharField(source='tenant.name', read_only=True)
     dns_records = DNSRecordSerializer(many=True, read_only=True) # Aninhar registros DNS
     status = serializers.CharField(read_only=True)
@@ -332,6 +290,11 @@ class DomainSerializer(serializers.ModelSerializer):
             'tenant': {'write_only': True}
         }
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Carrega o tenant e os registros DNS aninhados em consultas fixas (evita N+1 nas listagens)."""
+        return queryset.select_related('tenant').prefetch_related('dns_records')
+
     def validate(self, data):
         tenant = data.get('tenant') or self.instance.tenant if self.instance else None
         name = data.get('name') or self.instance.name if self.instance else None
@@ -356,7 +319,7 @@ class TenantCreateSerializer(serializers.ModelSerializer):
         model = Tenant
         fields = ['id', 'name', 'cloudflare_api_key', 'cloudflare_email']
 
-class RecentSubdomainSerializer(serializers.ModelSerializer):
+class RecentSubdomainSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     domain_name = serializers.CharField(source='domain.name', read_only=True)
     tenant_name = serializers.CharField(source='domain.tenant.name', read_only=True)
 
@@ -364,7 +327,11 @@ class RecentSubdomainSerializer(serializers.ModelSerializer):
         model = DNSRecord
         fields = ['id', 'name', 'record_type', 'content', 'created_at', 'domain_name', 'tenant_name']
 
-class UserDomainPermissionSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('domain__tenant')
+
+class UserDomainPermissionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     domain_name = serializers.CharField(source='domain.name', read_only=True)
     allowed_a_record_name = serializers.SerializerMethodField()
@@ -373,13 +340,6 @@ class UserDomainPermissionSerializer(serializers.ModelSerializer):
         model = UserDomainPermission
         fields = ['id', 'user', 'user_name', 'domain', 'domain_name', 'allowed_a_record', 'allowed_a_record_name']
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        import logging
-        logger = logging.getLogger('django')
-        logger.info(f'[UserDomainPermissionSerializer] id={instance.id} user={instance.user_id} domain={instance.domain_id} allowed_a_record={instance.allowed_a_record_id}')
-        return data
-
     def get_allowed_a_record_name(self, obj):
         if obj.allowed_a_record:
             return f"{obj.allowed_a_record.name} ({obj.allowed_a_record.content})"
@@ -399,3 +359,75 @@ class UserDomainPermissionSerializer(serializers.ModelSerializer):
             if data['allowed_a_record'].domain_id != data['domain'].id:
                 raise serializers.ValidationError({'allowed_a_record': 'O registro não pertence ao domínio selecionado.'})
         return data
+
+class SyncJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    domain_name = serializers.CharField(source='domain.name', read_only=True, default=None)
+
+    class Meta:
+        model = SyncJob
+        fields = ['id', 'kind', 'tenant', 'domain', 'domain_name', 'status', 'attempts', 'error', 'result', 'options',
+                  'run_after', 'created_at', 'started_at', 'heartbeat_at', 'finished_at']
+
+class DNSBatchOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    record_id = serializers.CharField(max_length=100, required=False)  # ID do registro na Cloudflare
+    type = serializers.ChoiceField(choices=[choice for choice, _ in DNSRecord.RECORD_TYPES], required=False)
+    record_type = serializers.ChoiceField(choices=[choice for choice, _ in DNSRecord.RECORD_TYPES], required=False)
+    name = serializers.CharField(max_length=255, required=False)
+    content = serializers.CharField(required=False)
+    ttl = serializers.IntegerField(min_value=1, required=False)
+    proxied = serializers.BooleanField(required=False)
+    priority = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+
+    def validate(self, data):
+        # Aceita 'record_type' como sinônimo de 'type', como a view de registro único
+        record_type = data.pop('record_type', None)
+        if not data.get('type') and record_type:
+            data['type'] = record_type
+        if data['op'] == 'create':
+            missing = [field for field in ('type', 'name', 'content') if not data.get(field)]
+            if missing:
+                raise serializers.ValidationError(f"Campos obrigatórios para criar: {', '.join(missing)}.")
+        elif not data.get('record_id'):
+            raise serializers.ValidationError('O record_id é obrigatório para alterar ou remover.')
+        return data
+
+class DNSBatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(child=DNSBatchOperationSerializer(), allow_empty=False)
+
+    def validate_operations(self, operations):
+        limit = get_sync_settings()['MUTATION_MAX_OPERATIONS']
+        if len(operations) > limit:
+            raise serializers.ValidationError(f'No máximo {limit} operações por lote.')
+        return operations
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Parâmetros das consultas de analytics; ``until`` é inclusivo (dia inteiro)."""
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=list(ROLLUPS), default='day')
+    group = serializers.ChoiceField(choices=['domain'], required=False)
+    tenant = serializers.IntegerField(required=False)
+    domains = serializers.CharField(required=False)  # IDs separados por vírgula
+
+    def validate_domains(self, value):
+        try:
+            return [int(item) for item in value.split(',') if item.strip()]
+        except ValueError:
+            raise serializers.ValidationError('Informe os IDs dos domínios separados por vírgula.')
+
+    def validate(self, data):
+        until = data.get('until') or datetime.date.today()
+        default_days = 1 if data['granularity'] == 'hour' else 30
+        since = data.get('since') or until - datetime.timedelta(days=default_days - 1)
+        if since > until:
+            raise serializers.ValidationError('since deve ser anterior a until.')
+        max_days = get_analytics_settings()['MAX_RANGE_DAYS']
+        if (until - since).days + 1 > max_days:
+            raise serializers.ValidationError(f'Intervalo máximo de {max_days} dias.')
+        data['since'], data['until'] = since, until
+        # Limites do intervalo em UTC, como os períodos gravados
+        data['since_at'] = datetime.datetime.combine(since, datetime.time.min, tzinfo=datetime.timezone.utc)
+        data['until_at'] = datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min, tzinfo=datetime.timezone.utc)
+        return data
+
@@ -0,0 +1,86 @@
+"""Manutenção dos contadores do dashboard (``admin_api/stats.py``)."""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from domains.models import Domain
+from domains.signals import domains_bulk_created, domains_bulk_deleted
+from tenants.models import Tenant
+from . import stats
+from .models import DashboardCounter
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Domain)
+def domain_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.domains_changed(instance.tenant_id, 1)
+
+
+@receiver(domains_bulk_created, sender=Domain)
+def domains_created_in_bulk(sender, tenant, domains, **kwargs):
+    stats.domains_changed(tenant.pk, len(domains))
+
+
+@receiver(domains_bulk_deleted, sender=Domain)
+def domains_deleted(sender, tenant_id, domain_ids, **kwargs):
+    # Uma atualização por exclusão (não por linha); sem post_delete em Domain
+    stats.domains_changed(tenant_id, -len(domain_ids))
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.tenants_changed(1)
+
+
+@receiver(pre_delete, sender=Tenant)
+def tenant_deleting(sender, instance, **kwargs):
+    # Depois da exclusão a lista de gerentes já não existe
+    stats.invalidate_users(instance.managers.values_list('pk', flat=True))
+    # Os domínios saem em cascata, sem sinal por domínio
+    instance._dashboard_domains = instance.domains.count()
+
+
+@receiver(post_delete, sender=Tenant)
+def tenant_deleted(sender, instance, **kwargs):
+    stats.tenants_changed(-1, domains=-getattr(instance, '_dashboard_domains', 0))
+    DashboardCounter.objects.filter(pk=stats.tenant_key(instance.pk)).delete()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.users_changed(1)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    stats.users_changed(-1)
+    stats.invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=Tenant.managers.through)
+def tenant_managers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            # user.managed_tenants.clear(): guarda os tenants afetados para o post_clear
+            instance._dashboard_cleared_tenants = list(instance.managed_tenants.values_list('pk', flat=True))
+        else:
+            stats.invalidate_users(instance.managers.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # A instância é o usuário e pk_set são tenants
+        stats.invalidate_users([instance.pk])
+        tenant_ids = pk_set if action != 'post_clear' else getattr(instance, '_dashboard_cleared_tenants', [])
+    else:
+        tenant_ids = [instance.pk]
+        if pk_set:
+            # Gerentes removidos não aparecem mais em refresh_tenant
+            stats.invalidate_users(pk_set)
+    for tenant_id in tenant_ids:
+        stats.refresh_tenant(tenant_id)
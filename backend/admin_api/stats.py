@@ -0,0 +1,160 @@
+"""
+Contadores materializados do dashboard (modelo ``DashboardCounter``).
+
+``DashboardStatsView`` lê uma única linha pela chave primária. As linhas
+``global`` e ``tenant:<id>`` são mantidas por incrementos (``F()``) a partir
+dos sinais em ``admin_api/signals.py`` e dos ganchos chamados após os
+``bulk_create`` da sincronização; as linhas ``user:<id>`` são descartadas
+quando o conjunto de clientes do usuário muda e recalculadas na próxima
+leitura. Linhas ausentes são calculadas na leitura, e o comando
+``reconcile_dashboard_stats`` corrige qualquer divergência periodicamente.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from domains.models import Domain
+from tenants.models import Tenant
+from .models import DashboardCounter
+
+User = get_user_model()
+
+GLOBAL_KEY = 'global'
+
+
+def tenant_key(tenant_id):
+    return f'tenant:{tenant_id}'
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def compute_global():
+    return {
+        'tenants': Tenant.objects.count(),
+        'domains': Domain.objects.count(),
+        'users': User.objects.count(),
+    }
+
+
+def compute_tenant(tenant_id):
+    return {
+        'tenants': 1,
+        'domains': Domain.objects.filter(tenant_id=tenant_id).count(),
+        'users': Tenant.managers.through.objects.filter(tenant_id=tenant_id).count(),
+    }
+
+
+def compute_user(user_id):
+    tenant_ids = list(Tenant.managers.through.objects.filter(user_id=user_id).values_list('tenant_id', flat=True))
+    if not tenant_ids:
+        return {'tenants': 0, 'domains': 0, 'users': 0}
+    return {
+        'tenants': len(tenant_ids),
+        'domains': Domain.objects.filter(tenant_id__in=tenant_ids).count(),
+        'users': User.objects.filter(managed_tenants__id__in=tenant_ids).distinct().count(),
+    }
+
+
+def _load(key, compute):
+    """Leitura pela chave primária; calcula e grava a linha se ainda não existir."""
+    counter = DashboardCounter.objects.filter(pk=key).first()
+    if counter is not None:
+        return counter
+    counter = DashboardCounter(key=key, **compute())
+    try:
+        with transaction.atomic():
+            counter.save(force_insert=True)
+    except IntegrityError:
+        # Outra requisição gravou a linha ao mesmo tempo
+        counter = DashboardCounter.objects.get(pk=key)
+    return counter
+
+
+def get_dashboard_counter(user):
+    if user.role == 'admin':
+        return _load(GLOBAL_KEY, compute_global)
+    return _load(user_key(user.pk), lambda: compute_user(user.pk))
+
+
+def _increment(keys, **deltas):
+    """Aplica deltas às linhas existentes (linhas ausentes são calculadas na leitura)."""
+    DashboardCounter.objects.filter(pk__in=list(keys)).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items() if delta},
+    )
+
+
+def _manager_keys(tenant_id):
+    return [user_key(user_id) for user_id in Tenant.managers.through.objects.filter(tenant_id=tenant_id).values_list('user_id', flat=True)]
+
+
+def domains_changed(tenant_id, delta):
+    """Gancho para criação/remoção de ``delta`` domínios do tenant (inclusive em lote)."""
+    if not delta:
+        return
+    _increment([GLOBAL_KEY, tenant_key(tenant_id), *_manager_keys(tenant_id)], domains=delta)
+
+
+def tenants_changed(delta, domains=0):
+    """Criação/remoção de tenants; ``domains`` são os domínios removidos junto (cascata)."""
+    _increment([GLOBAL_KEY], tenants=delta, domains=domains)
+
+
+def users_changed(delta):
+    _increment([GLOBAL_KEY], users=delta)
+
+
+def refresh_tenant(tenant_id):
+    """Recalcula o rollup do tenant e descarta as linhas dos gerentes (mudança de gerentes)."""
+    DashboardCounter.objects.update_or_create(key=tenant_key(tenant_id), defaults=compute_tenant(tenant_id))
+    invalidate_users(Tenant.managers.through.objects.filter(tenant_id=tenant_id).values_list('user_id', flat=True))
+
+
+def invalidate_users(user_ids):
+    DashboardCounter.objects.filter(pk__in=[user_key(user_id) for user_id in user_ids]).delete()
+
+
+def reconcile():
+    """
+    Recalcula as linhas global e por tenant com consultas agregadas e descarta
+    as linhas por usuário. Retorna as chaves que estavam divergentes.
+    """
+    expected = {GLOBAL_KEY: compute_global()}
+    domains_per_tenant = dict(Domain.objects.values_list('tenant_id').annotate(total=Count('id')))
+    managers_per_tenant = dict(
+        Tenant.managers.through.objects.values_list('tenant_id').annotate(total=Count('id'))
+    )
+    for tenant_id in Tenant.objects.values_list('id', flat=True):
+        expected[tenant_key(tenant_id)] = {
+            'tenants': 1,
+            'domains': domains_per_tenant.get(tenant_id, 0),
+            'users': managers_per_tenant.get(tenant_id, 0),
+        }
+
+    drift = []
+    with transaction.atomic():
+        current = {
+            counter.key: counter
+            for counter in DashboardCounter.objects.select_for_update().exclude(key__startswith='user:')
+        }
+        to_create, to_update = [], []
+        for key, values in expected.items():
+            counter = current.pop(key, None)
+            if counter is None:
+                to_create.append(DashboardCounter(key=key, **values))
+                continue
+            if any(getattr(counter, field) != value for field, value in values.items()):
+                drift.append(key)
+                for field, value in values.items():
+                    setattr(counter, field, value)
+                counter.updated_at = timezone.now()
+                to_update.append(counter)
+        DashboardCounter.objects.bulk_create(to_create, batch_size=1000)
+        DashboardCounter.objects.bulk_update(to_update, ['tenants', 'domains', 'users', 'updated_at'], batch_size=1000)
+        # Linhas de tenants que não existem mais e todas as linhas por usuário
+        DashboardCounter.objects.filter(pk__in=list(current)).delete()
+        DashboardCounter.objects.filter(key__startswith='user:').delete()
+    return drift
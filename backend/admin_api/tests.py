@@ -1,3 +1,1615 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.db.models.signals import post_delete
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import UserDomainPermission
+from accounts.serializers import CustomTokenObtainPairSerializer
+from cloudflare_api.cache import ZoneRecordCache, get_record_cache
+from cloudflare_api.management.commands.benchmark_cloudflare import percentile
+from cloudflare_api.emulator import EmulatorConfig, EmulatorServer, EmulatorStats, ZoneStore
+from cloudflare_api.models import RateLimitBucket
+from cloudflare_api.pool import close_all_pools
+from cloudflare_api.ratelimit import (
+    DEFAULT_RATE_LIMIT_SETTINGS, DatabaseTokenBucket, RateLimitExceeded, TokenBucket, get_rate_limiter,
+)
+from cloudflare_api.services import CloudflareAPIError, CloudflareService
+from core import instrumentation
+from core.db import database_pool_stats, release_connections
+from core.instrumentation import InstrumentationMiddleware, RequestTimings
+from domains.analytics import refresh_tenant_analytics
+from domains.drift import check_drift, check_zone_drift
+from domains.merkle import update_zone_trees
+from domains.management.commands.explain_dns_queries import hot_queries
+from domains.jobs import (
+    JobProgress, claim_next_job, enqueue_analytics_refresh_if_stale, requeue_stuck_jobs, run_pending_jobs,
+    schedule_tenant_syncs,
+)
+from domains.models import Domain, DNSRecord, SyncJob, ZoneAnalytics
+from domains.sync import import_tenant_zones, reconcile_dns_records, sync_domain_records, sync_tenant_domains
+from tenants.models import Tenant
+from .models import DashboardCounter
+from .stats import reconcile
+
+User = get_user_model()
+
+
+class ListQueryCountTests(TestCase):
+    """
+    As listagens devem executar um número fixo de consultas, independente da
+    quantidade de clientes, domínios e registros DNS (regressão de N+1).
+    """
+    TENANTS = 20
+    DOMAINS_PER_TENANT = 50
+    RECORDS_PER_DOMAIN = 3
+    MANAGERS_PER_TENANT = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='admin',
+            first_name='Admin', last_name='Teste',
+        )
+        cls.manager = User.objects.create_user(
+            username='gerente', email='gerente@example.com', password='x', role='user',
+            first_name='Gerente', last_name='Teste',
+        )
+        managers = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com', password='x',
+                first_name='Usuário', last_name=str(i),
+            )
+            for i in range(cls.MANAGERS_PER_TENANT)
+        ]
+        cls.tenants = Tenant.objects.bulk_create([
+            Tenant(owner=cls.admin, name=f'Cliente {i}', cloudflare_api_key='key', cloudflare_email=f'c{i}@example.com')
+            for i in range(cls.TENANTS)
+        ])
+        for tenant in cls.tenants:
+            tenant.managers.add(cls.manager, *managers)
+        domains = Domain.objects.bulk_create([
+            Domain(tenant=tenant, name=f'dominio{j}.cliente{tenant.pk}.com', cloudflare_zone_id=f'zone-{tenant.pk}-{j}')
+            for tenant in cls.tenants
+            for j in range(cls.DOMAINS_PER_TENANT)
+        ])
+        DNSRecord.objects.bulk_create([
+            DNSRecord(
+                domain=domain, name=f'sub{k}.{domain.name}', record_type='CNAME' if k else 'A',
+                content='alvo.example.com' if k else '192.0.2.1', cloudflare_record_id=f'{domain.pk}-{k}',
+            )
+            for domain in domains
+            for k in range(cls.RECORDS_PER_DOMAIN)
+        ], batch_size=1000)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assertMaxQueries(self, user, url, max_queries):
+        client = self.client_for(user)
+        with self.assertNumQueries(max_queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_tenant_list(self):
+        response = self.assertMaxQueries(self.admin, reverse('tenant-list-create'), 3)
+        self.assertEqual(len(response.data), self.TENANTS)
+        self.assertEqual(len(response.data[0]['domains']), self.DOMAINS_PER_TENANT)
+        self.assertEqual(len(response.data[0]['managers']), self.MANAGERS_PER_TENANT + 1)
+
+    def test_tenant_list_for_manager(self):
+        response = self.assertMaxQueries(self.manager, reverse('tenant-list-create'), 3)
+        self.assertEqual(len(response.data), self.TENANTS)
+
+    def test_recent_tenants(self):
+        response = self.assertMaxQueries(self.admin, reverse('recent-tenants'), 3)
+        self.assertEqual(len(response.data), 5)
+
+    def test_domain_list(self):
+        response = self.assertMaxQueries(self.admin, reverse('domain-list-create'), 2)
+        self.assertEqual(len(response.data), self.TENANTS * self.DOMAINS_PER_TENANT)
+        self.assertEqual(len(response.data[0]['dns_records']), self.RECORDS_PER_DOMAIN)
+
+    def test_domain_list_for_manager(self):
+        response = self.assertMaxQueries(self.manager, reverse('domain-list-create'), 2)
+        self.assertEqual(len(response.data), self.TENANTS * self.DOMAINS_PER_TENANT)
+
+    def test_tenant_domain_list(self):
+        url = reverse('tenant-domain-list', kwargs={'tenant_pk': self.tenants[0].pk})
+        response = self.assertMaxQueries(self.admin, url, 2)
+        self.assertEqual(len(response.data), self.DOMAINS_PER_TENANT)
+
+    def test_tenant_domain_list_for_manager(self):
+        url = reverse('tenant-domain-list', kwargs={'tenant_pk': self.tenants[0].pk})
+        # +1 consulta do escopo do usuário, para verificar se ele gerencia o cliente
+        self.assertMaxQueries(self.manager, url, 3)
+
+    def test_recent_subdomains(self):
+        self.assertMaxQueries(self.admin, reverse('recent-subdomains'), 1)
+
+    def test_query_count_does_not_grow_with_data(self):
+        client = self.client_for(self.admin)
+        tenant = Tenant.objects.create(owner=self.admin, name='Cliente extra', cloudflare_api_key='key', cloudflare_email='x@example.com')
+        domains = Domain.objects.bulk_create([
+            Domain(tenant=tenant, name=f'extra{j}.com') for j in range(200)
+        ])
+        DNSRecord.objects.bulk_create([
+            DNSRecord(domain=domain, name=f'www.{domain.name}', record_type='A', content='192.0.2.2')
+            for domain in domains
+        ])
+        with self.assertNumQueries(3):
+            client.get(reverse('tenant-list-create'))
+        with self.assertNumQueries(2):
+            client.get(reverse('domain-list-create'))
+
+
+class UserPermissionMatrixTests(TestCase):
+    """``UserListCreateView`` resolve as permissões de todos os usuários em consultas fixas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='admin',
+            first_name='Admin', last_name='Teste',
+        )
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com', password='x',
+                first_name='Usuário', last_name=str(i),
+            )
+            for i in range(30)
+        ]
+        tenants = Tenant.objects.bulk_create([
+            Tenant(owner=cls.admin, name=f'Cliente {i}', cloudflare_api_key='key', cloudflare_email=f'c{i}@example.com')
+            for i in range(200)
+        ])
+        for tenant in tenants:
+            tenant.managers.add(cls.admin, *cls.users[:5])
+        domains = Domain.objects.bulk_create([
+            Domain(tenant=tenant, name=f'dominio{j}.cliente{tenant.pk}.com')
+            for tenant in tenants
+            for j in range(5)
+        ])
+        records = DNSRecord.objects.bulk_create([
+            DNSRecord(domain=domain, name=f'www.{domain.name}', record_type='A', content='192.0.2.1')
+            for domain in domains
+        ])
+        UserDomainPermission.objects.bulk_create([
+            UserDomainPermission(user=user, domain=record.domain, allowed_a_record=record)
+            for user in cls.users
+            for record in records[:10]
+        ])
+        cls.first_domain = domains[0]
+
+    def test_user_list_query_count(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        # usuários + permissões explícitas + tenants gerenciados + domínios
+        with self.assertNumQueries(4):
+            response = client.get(reverse('user-list-create'))
+        self.assertEqual(response.status_code, 200)
+
+        by_id = {user['id']: user['permissions'] for user in response.data}
+        self.assertEqual(len(by_id[self.admin.pk]), 200 * 5)
+        # Permissões explícitas primeiro; domínios dos tenants gerenciados sem repetição
+        manager_perms = by_id[self.users[0].pk]
+        self.assertEqual(len(manager_perms), 200 * 5)
+        self.assertEqual(len({perm['domain'] for perm in manager_perms}), 200 * 5)
+        self.assertEqual(manager_perms[0]['domain'], self.first_domain.pk)
+        self.assertTrue(manager_perms[0]['allowed_a_record_name'].startswith('www.'))
+        self.assertEqual(len(by_id[self.users[-1].pk]), 10)
+
+    def test_user_detail_uses_same_resolver(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('user-detail', kwargs={'pk': self.users[0].pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['permissions']), 200 * 5)
+
+
+def index_plan(queryset):
+    """Plano da consulta; no PostgreSQL sem leitura sequencial, que ganharia nas tabelas pequenas dos testes."""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+class CnameTargetTests(TestCase):
+    """CNAMEs do registro A permitido buscados pela coluna indexada ``content_target``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        cls.user = User.objects.create_user(username='cliente', email='cliente@example.com', password='x')
+        tenant = Tenant.objects.create(owner=admin, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        cls.domain = Domain.objects.create(tenant=tenant, name='example.com')
+        cls.a_record = DNSRecord.objects.create(domain=cls.domain, name='www.example.com', record_type='A', content='192.0.2.1')
+        cls.cnames = [
+            DNSRecord.objects.create(domain=cls.domain, name=name, record_type='CNAME', content=content)
+            for name, content in [('app.example.com', 'www.example.com'), ('loja.example.com', 'WWW.Example.com.'),
+                                  ('blog.example.com', 'outro.example.com')]
+        ]
+        UserDomainPermission.objects.create(user=cls.user, domain=cls.domain, allowed_a_record=cls.a_record)
+
+    def test_content_target_follows_type_and_content(self):
+        app, loja, blog = self.cnames
+        self.assertEqual((app.content_target, loja.content_target, self.a_record.content_target),
+                         ('www.example.com', 'www.example.com', ''))
+
+        blog.content = 'Www.example.com.'
+        blog.save(update_fields=['content'])
+        blog.refresh_from_db()
+        self.assertEqual(blog.content_target, 'www.example.com')
+
+        app.record_type = 'TXT'
+        app.save(update_fields=['record_type'])
+        app.refresh_from_db()
+        self.assertEqual(app.content_target, '')
+
+    def test_user_sees_cnames_pointing_to_allowed_record(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('domain-dnsrecords-custom', args=[self.domain.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(record['name'] for record in response.data), ['app.example.com', 'loja.example.com'])
+
+    def test_lookup_uses_target_index(self):
+        queryset = DNSRecord.objects.filter(domain=self.domain, record_type='CNAME', content_target='www.example.com')
+        self.assertIn('dnsrecord_content_target_idx', index_plan(queryset))
+
+
+class DNSRecordIndexTests(TestCase):
+    """Constraint única e índices das consultas mais usadas sobre DNSRecord (migração 0010)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        tenant = Tenant.objects.create(owner=admin, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        cls.domain, cls.other = Domain.objects.bulk_create([
+            Domain(tenant=tenant, name='example.com'), Domain(tenant=tenant, name='example.net'),
+        ])
+
+    def record(self, domain, record_id, name='www'):
+        return DNSRecord.objects.create(domain=domain, name=f'{name}.{domain.name}', record_type='A',
+                                        content='192.0.2.1', cloudflare_record_id=record_id)
+
+    def test_cloudflare_id_is_unique_per_domain(self):
+        self.record(self.domain, 'abc')
+        self.record(self.other, 'abc')
+        # Registros só locais (sem ID) não conflitam entre si
+        self.record(self.domain, '', name='a')
+        self.record(self.domain, None, name='b')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.record(self.domain, 'abc', name='c')
+
+    def test_hot_queries_use_the_indexes(self):
+        self.record(self.domain, 'abc')
+        plans = {label: index_plan(queryset) for label, queryset in hot_queries(self.domain)}
+
+        # O SQLite cria a constraint dentro da tabela, com um índice automático
+        unique_index = 'sqlite_autoindex' if connection.vendor == 'sqlite' else 'unique_dnsrecord_cloudflare_id'
+        self.assertIn(unique_index, plans['Busca por ID da Cloudflare'])
+        self.assertIn('dnsrecord_domain_type_name_idx', plans['Subdomínios (CNAME) do domínio por nome'])
+        self.assertIn('dnsrecord_type_created_idx', plans['Subdomínios recentes (todos os clientes)'])
+
+    def test_explain_command(self):
+        self.record(self.domain, 'abc')
+        out = StringIO()
+        call_command('explain_dns_queries', domain=self.domain.pk, stdout=out)
+        self.assertEqual(out.getvalue().count('== '), len(hot_queries(self.domain)))
+        if connection.vendor != 'postgresql':
+            with self.assertRaisesMessage(CommandError, 'só estão disponíveis no PostgreSQL'):
+                call_command('explain_dns_queries', compare=True, stdout=out)
+
+    def test_postgresql_migration_builds_indexes_concurrently(self):
+        migration = import_module('domains.migrations.0010_dnsrecord_hot_path_indexes').Migration
+        self.assertFalse(migration.atomic)
+        unique, index = migration.operations[:2]
+        from_state = mock.Mock()
+        to_state = mock.Mock()
+        to_state.apps.get_model.return_value = DNSRecord
+        editor = mock.Mock()
+        editor.connection.vendor = 'postgresql'
+        editor.connection.alias = 'default'
+        editor.quote_name = lambda name: f'"{name}"'
+
+        index.database_forwards('domains', editor, from_state, to_state)
+        editor.add_index.assert_called_once_with(DNSRecord, index.index, concurrently=True)
+
+        unique.database_forwards('domains', editor, from_state, to_state)
+        self.assertEqual([call.args[0] for call in editor.execute.call_args_list], [
+            'DROP INDEX CONCURRENTLY IF EXISTS "unique_dnsrecord_cloudflare_id"',
+            'CREATE UNIQUE INDEX CONCURRENTLY "unique_dnsrecord_cloudflare_id" ON "domains_dnsrecord" '
+            '("domain_id", "cloudflare_record_id")',
+            'ALTER TABLE "domains_dnsrecord" ADD CONSTRAINT "unique_dnsrecord_cloudflare_id" '
+            'UNIQUE USING INDEX "unique_dnsrecord_cloudflare_id"',
+        ])
+
+
+class KeysetPaginationTests(TestCase):
+    """Paginação por cursor: páginas profundas com o mesmo custo da primeira."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='admin',
+            first_name='Admin', last_name='Teste',
+        )
+        tenant = Tenant.objects.create(owner=cls.admin, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        Domain.objects.bulk_create([Domain(tenant=tenant, name=f'dominio{i:04d}.com') for i in range(1050)])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_walks_every_page_with_constant_queries(self):
+        url = reverse('domain-list-create') + '?page_size=100'
+        seen = []
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 100)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 1050)
+        self.assertEqual(len(set(seen)), 1050)
+
+    def test_ties_on_first_key_use_composite_cursor(self):
+        # created_at repetido: a posição precisa incluir o pk, sem recorrer a OFFSET
+        Domain.objects.update(created_at=timezone.now())
+        url = reverse('domain-list-create') + '?page_size=100'
+        seen, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in captured.captured_queries))
+            seen.extend(item['id'] for item in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(set(seen)), 1050)
+
+        # Voltando pelos links 'previous' a partir da última página
+        back = [item['id'] for item in pages[-1]['results']]
+        url = pages[-1]['previous']
+        while url:
+            response = self.client.get(url)
+            back = [item['id'] for item in response.data['results']] + back
+            url = response.data['previous']
+        self.assertEqual(back, seen)
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get(reverse('domain-list-create'), {'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 500)
+
+    def test_unpaginated_without_cursor_params(self):
+        # Compatibilidade: sem ?cursor= / ?page_size= a listagem continua sendo uma lista
+        with self.settings(API_PAGINATION={'UNPAGINATED_MAX': 2000}):
+            response = self.client.get(reverse('domain-list-create'))
+        self.assertEqual(len(response.data), 1050)
+        self.assertNotIn('Link', response)
+
+    def test_unpaginated_list_is_capped(self):
+        with self.settings(API_PAGINATION={'UNPAGINATED_MAX': 1000}):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('domain-list-create'))
+        self.assertEqual(len(response.data), 1000)
+        self.assertTrue(any('LIMIT 1001' in query['sql'] for query in captured.captured_queries))
+        # A continuação é a próxima página do cursor
+        next_url = response['Link'].split(';')[0].strip('<>')
+        rest = self.client.get(next_url + '&page_size=100').data['results']
+        self.assertEqual(len(rest), 50)
+        self.assertFalse({item['id'] for item in rest} & {item['id'] for item in response.data})
+
+
+class DashboardCounterTests(TestCase):
+    """Contadores materializados do dashboard (admin_api/stats.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='admin',
+            first_name='Admin', last_name='Teste',
+        )
+        cls.manager = User.objects.create_user(
+            username='gerente', email='gerente@example.com', password='x',
+            first_name='Gerente', last_name='Teste',
+        )
+
+    def stats_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse('dashboard-stats')).data
+
+    def expected_for_admin(self):
+        return {'totalTenants': Tenant.objects.count(), 'totalDomains': Domain.objects.count(), 'totalUsers': User.objects.count()}
+
+    def test_single_primary_key_read(self):
+        self.stats_for(self.admin)  # materializa a linha global
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            client.get(reverse('dashboard-stats'))
+
+    def test_counters_follow_writes(self):
+        self.stats_for(self.admin)
+        self.stats_for(self.manager)
+        tenant = Tenant.objects.create(owner=self.admin, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        tenant.managers.add(self.manager)
+        Domain.objects.create(tenant=tenant, name='a.com')
+        domain = Domain.objects.create(tenant=tenant, name='b.com')
+        User.objects.create_user(username='novo', email='novo@example.com', password='x')
+        self.assertEqual(self.stats_for(self.admin), self.expected_for_admin())
+        self.assertEqual(self.stats_for(self.manager), {'totalTenants': 1, 'totalDomains': 2, 'totalUsers': 1})
+
+        domain.delete()
+        self.assertEqual(self.stats_for(self.manager)['totalDomains'], 1)
+        tenant.managers.remove(self.manager)
+        self.assertEqual(self.stats_for(self.manager), {'totalTenants': 0, 'totalDomains': 0, 'totalUsers': 0})
+        tenant.delete()
+        self.assertEqual(self.stats_for(self.admin), self.expected_for_admin())
+
+    def test_bulk_sync_hook_and_reconcile(self):
+        tenant = Tenant.objects.create(owner=self.admin, name='Cliente', cloudflare_api_key='key', cloudflare_email='c@example.com')
+        self.stats_for(self.admin)
+        zones = [{'id': f'zone{i}', 'name': f'd{i}.com', 'status': 'active'} for i in range(25)]
+        sync_tenant_domains(tenant, zones=zones)
+        self.assertEqual(self.stats_for(self.admin)['totalDomains'], 25)
+        # Remoção em lote: um único decremento pelo sinal domains_bulk_deleted
+        sync_tenant_domains(tenant, zones=zones[:20])
+        self.assertEqual(self.stats_for(self.admin)['totalDomains'], 20)
+        self.assertFalse(post_delete.has_listeners(Domain))
+
+        DashboardCounter.objects.filter(pk='global').update(domains=999)
+        self.assertEqual(reconcile(), ['global'])
+        self.assertEqual(self.stats_for(self.admin), self.expected_for_admin())
+        self.assertEqual(reconcile(), [])
+
+    def test_queryset_and_admin_deletes_update_counters(self):
+        first = Tenant.objects.create(owner=self.admin, name='Um', cloudflare_api_key='k1', cloudflare_email='1@example.com')
+        second = Tenant.objects.create(owner=self.admin, name='Dois', cloudflare_api_key='k2', cloudflare_email='2@example.com')
+        first.managers.add(self.manager)
+        domains = [Domain.objects.create(tenant=tenant, name=f'd{i}.{tenant.pk}.com') for tenant in (first, second) for i in range(3)]
+        self.stats_for(self.admin)
+        self.stats_for(self.manager)
+
+        # Um lote com domínios de dois tenants
+        Domain.objects.filter(pk__in=[domains[0].pk, domains[3].pk, domains[4].pk]).delete()
+        self.assertEqual(self.stats_for(self.admin), self.expected_for_admin())
+        self.assertEqual(self.stats_for(self.manager)['totalDomains'], 2)
+
+        # Ação de exclusão em massa do admin do Django
+        superuser = User.objects.create_superuser(username='super', email='super@example.com', password='x')
+        self.client.force_login(superuser)
+        response = self.client.post(reverse('admin:domains_domain_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [domains[1].pk, domains[5].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats_for(self.admin), self.expected_for_admin())
+        self.assertEqual(self.stats_for(self.manager)['totalDomains'], 1)
+
+
+class DNSBatchTests(TestCase):
+    """Alterações em lote e importação/exportação de zona contra o emulador local da Cloudflare."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.emulator.store.seed(1, 4)
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+        ))
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        self.tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        import_tenant_zones(self.tenant)
+        self.domain = Domain.objects.get(tenant=self.tenant)
+        self.url = reverse('domain-dns-records-batch', args=[self.domain.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_mixed_operations_are_applied_locally(self):
+        first, second = DNSRecord.objects.filter(domain=self.domain).order_by('name')[:2]
+        operations = [
+            {'op': 'create', 'type': 'CNAME', 'name': f'novo{i}.{self.domain.name}', 'content': self.domain.name}
+            for i in range(5)
+        ]
+        operations += [
+            {'op': 'update', 'record_id': first.cloudflare_record_id, 'content': 'alvo.example.net', 'type': 'CNAME'},
+            {'op': 'delete', 'record_id': second.cloudflare_record_id},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['succeeded'], 7)
+        self.assertEqual(DNSRecord.objects.filter(domain=self.domain).count(), 4 + 5 - 1)
+        first.refresh_from_db()
+        self.assertEqual(first.content_target, 'alvo.example.net')
+        self.assertFalse(DNSRecord.objects.filter(pk=second.pk).exists())
+
+    def test_invalid_batch_is_rejected_before_calling_cloudflare(self):
+        requests_before = self.emulator.stats.requests
+        response = self.client.post(self.url, {'operations': [
+            {'op': 'create', 'type': 'CNAME', 'name': f'ok.{self.domain.name}', 'content': self.domain.name},
+            {'op': 'delete', 'record_id': 'inexistente'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('1', response.data['operations'])
+        self.assertEqual(self.emulator.stats.requests, requests_before)
+
+    def test_managers_are_limited_to_cname_records(self):
+        manager = User.objects.create_user(username='gerente', email='gerente@example.com', password='x')
+        self.tenant.managers.add(manager)
+        self.client.force_authenticate(manager)
+        a_record = DNSRecord.objects.filter(domain=self.domain, record_type='A').first()
+
+        response = self.client.post(self.url, {'operations': [
+            {'op': 'delete', 'record_id': a_record.cloudflare_record_id},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(DNSRecord.objects.filter(pk=a_record.pk).exists())
+
+    def test_cloudflare_list_ignores_stale_cached_zone(self):
+        # Cache de outro processo que não viu a criação do último registro
+        service = CloudflareService(self.tenant.cloudflare_api_key, self.tenant.cloudflare_email)
+        records = service.get_dns_records(self.domain.cloudflare_zone_id)
+        get_record_cache().get_or_load(
+            service._zone_cache_key(self.domain.cloudflare_zone_id), lambda: records[:-1], fresh=True,
+        )
+        url = reverse('cloudflare-dns-records-list-create', args=[self.domain.pk])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+        self.assertTrue(DNSRecord.objects.filter(cloudflare_record_id=records[-1]['id']).exists())
+
+    def test_zone_file_export_and_import_round_trip(self):
+        url = reverse('domain-zone-file', args=[self.domain.pk])
+        response = self.client.get(url, {'zone_format': 'bind'})
+        self.assertEqual(response.status_code, 200)
+        zone_file = b''.join(response.streaming_content).decode()
+        self.assertEqual(zone_file.count('\tIN\t'), 4)
+
+        # Reimportar a mesma zona não cria nada; um registro novo é enviado à Cloudflare
+        zone_file += f'extra.{self.domain.name}.\t300\tIN\tTXT\t"v=spf1 -all"\n'
+        response = self.client.post(f'{url}?zone_format=bind', zone_file, content_type='text/dns')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['existing']), (1, 4))
+        self.assertTrue(DNSRecord.objects.filter(domain=self.domain, record_type='TXT', content='v=spf1 -all').exists())
+
+        response = self.client.post(f'{url}?zone_format=ndjson', '{"type": "A"}\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('linha 1', response.data['error'])
+
+    def test_invalid_lines_do_not_discard_valid_records(self):
+        url = reverse('domain-zone-file', args=[self.domain.pk])
+        zone_file = ''.join([
+            f'a1.{self.domain.name}.\t300\tIN\tA\t192.0.2.10\n',
+            f'quebrado.{self.domain.name}.\t300\tIN\tMX\tservidor\n',
+            f'a2.{self.domain.name}.\t300\tIN\tTXT\t"sem fim\n',
+            f'a3.{self.domain.name}.\t300\tIN\tA\t192.0.2.11\n',
+        ])
+        with self.settings(CLOUDFLARE_SYNC={'IMPORT_BATCH_SIZE': 10}):
+            response = self.client.post(f'{url}?zone_format=bind', zone_file, content_type='text/dns')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['invalid']), (2, 2))
+        self.assertIsNone(response.data['error'])
+        self.assertEqual([error.split(':')[0] for error in response.data['errors']], ['linha 2', 'linha 3'])
+        self.assertEqual(DNSRecord.objects.filter(domain=self.domain, name__in=[
+            f'a1.{self.domain.name}', f'a3.{self.domain.name}']).count(), 2)
+
+    def test_large_import_runs_in_the_worker(self):
+        url = reverse('domain-zone-file', args=[self.domain.pk])
+        zone_file = ''.join(
+            f'bg{i}.{self.domain.name}.\t300\tIN\tA\t192.0.2.{i}\n' for i in range(1, 6)
+        )
+        with tempfile.TemporaryDirectory() as media, self.settings(
+            MEDIA_ROOT=media, CLOUDFLARE_SYNC={'IMPORT_BACKGROUND_BYTES': 100},
+        ):
+            response = self.client.post(f'{url}?zone_format=bind', zone_file, content_type='text/dns')
+            self.assertEqual(response.status_code, 202)
+            job = SyncJob.objects.get(pk=response.data['job']['id'])
+            self.assertEqual(job.kind, SyncJob.KIND_ZONE_IMPORT)
+            self.assertFalse(DNSRecord.objects.filter(domain=self.domain, name__startswith='bg').exists())
+
+            run_pending_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, SyncJob.STATUS_DONE)
+            self.assertEqual(job.result['created'], 5)
+            self.assertEqual(DNSRecord.objects.filter(domain=self.domain, name__startswith='bg').count(), 5)
+            self.assertEqual(os.listdir(os.path.join(media, 'zone_imports')), [])
+
+
+class AnalyticsTests(TestCase):
+    """Coleta de analytics em lote (GraphQL do emulador) e consultas servidas pela tabela local."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.emulator.store.seed(12, 0)
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+            CLOUDFLARE_ANALYTICS={'ZONES_PER_QUERY': 5, 'DAYS_PER_QUERY': 31, 'BACKFILL_DAYS': 60, 'HOURLY_DAYS': 1},
+        ))
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        self.tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        import_tenant_zones(self.tenant)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def graphql_calls(self):
+        return self.emulator.stats.by_route.get('graphql', 0)
+
+    def test_backfill_batches_zones_per_query(self):
+        calls = self.graphql_calls()
+        summary = refresh_tenant_analytics(self.tenant)
+        # 3 lotes de zonas x (2 janelas diárias + 1 horária)
+        self.assertEqual(summary['queries'], 9)
+        self.assertEqual(self.graphql_calls() - calls, 9)
+        self.assertEqual(ZoneAnalytics.objects.filter(granularity='day').count(), 12 * 60)
+
+        # Incremental: só o último dia/hora de cada zona
+        summary = refresh_tenant_analytics(self.tenant)
+        self.assertEqual(summary['queries'], 6)
+        self.assertEqual(ZoneAnalytics.objects.filter(granularity='day').count(), 12 * 60)
+
+    def test_zones_without_traffic_are_not_backfilled_again(self):
+        refresh_tenant_analytics(self.tenant)
+        # Zona sem tráfego: a Cloudflare não devolve linhas para ela
+        domain = Domain.objects.filter(tenant=self.tenant).first()
+        ZoneAnalytics.objects.filter(domain=domain).delete()
+        summary = refresh_tenant_analytics(self.tenant)
+        self.assertEqual(summary['queries'], 6)
+
+    def test_failed_window_is_fetched_again(self):
+        oldest = (timezone.now().date() - datetime.timedelta(days=59)).isoformat()
+        graphql = CloudflareService.graphql
+
+        def failing(service, query, variables=None):
+            if variables['since'] == oldest:
+                raise CloudflareAPIError('falha simulada')
+            return graphql(service, query, variables)
+
+        with mock.patch.object(CloudflareService, 'graphql', failing):
+            summary = refresh_tenant_analytics(self.tenant)
+        self.assertEqual(len(summary['errors']), 3)
+        self.assertFalse(Domain.objects.filter(analytics_day_through__isnull=False).exists())
+
+        # A janela que falhou é buscada de novo, mesmo com a seguinte já gravada
+        summary = refresh_tenant_analytics(self.tenant)
+        self.assertEqual(summary['queries'], 9)
+        self.assertEqual(ZoneAnalytics.objects.filter(granularity='day').count(), 12 * 60)
+        self.assertEqual(refresh_tenant_analytics(self.tenant)['queries'], 6)
+
+    def test_failed_refresh_waits_for_interval(self):
+        job = SyncJob.objects.create(
+            kind=SyncJob.KIND_TENANT_ANALYTICS, tenant=self.tenant, dedup_key='x',
+            status=SyncJob.STATUS_FAILED, finished_at=timezone.now(),
+        )
+        self.assertEqual(enqueue_analytics_refresh_if_stale([self.tenant]), [])
+        SyncJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - datetime.timedelta(hours=2))
+        self.assertEqual(len(enqueue_analytics_refresh_if_stale([self.tenant])), 1)
+
+    def test_dashboard_reads_local_table(self):
+        refresh_tenant_analytics(self.tenant)
+        calls = self.graphql_calls()
+        since = (datetime.date.today() - datetime.timedelta(days=59)).isoformat()
+
+        response = self.client.get(reverse('analytics'), {'since': since, 'granularity': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['domains'], 12)
+        stored = ZoneAnalytics.objects.filter(granularity='day').aggregate(total=Sum('requests'))['total']
+        self.assertEqual(response.data['totals']['requests'], stored)
+        self.assertEqual(sum(item['requests'] for item in response.data['series']), stored)
+        self.assertEqual(self.graphql_calls(), calls)
+
+        domain = Domain.objects.filter(tenant=self.tenant).first()
+        response = self.client.get(reverse('domain-analytics', args=[domain.pk]), {'since': since})
+        self.assertEqual(len(response.data['series']), 60)
+        self.assertEqual(response.data['uniques'], response.data['series'][-1]['uniques'])
+
+    def test_managers_only_see_their_domains(self):
+        manager = User.objects.create_user(username='gerente', email='gerente@example.com', password='x')
+        self.client.force_authenticate(manager)
+        response = self.client.get(reverse('analytics'))
+        self.assertEqual((response.data['domains'], response.data['series']), (0, []))
+        domain = Domain.objects.filter(tenant=self.tenant).first()
+        self.assertEqual(self.client.get(reverse('domain-analytics', args=[domain.pk])).status_code, 403)
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+class SyncProgressTests(TestCase):
+    """Sincronização em segundo plano com o progresso lido pelo stream SSE."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.emulator.store.seed(3, 4)
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+        ))
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.token = str(CustomTokenObtainPairSerializer.get_token(self.admin).access_token)
+
+    def stream(self, job_id, **headers):
+        response = self.client.get(
+            reverse('sync-job-events', args=[job_id]), {'token': self.token}, headers=headers,
+        )
+        if response.status_code != 200:
+            return response, []
+        events = []
+        for block in async_to_sync(read_stream)(response).decode().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+        return response, events
+
+    def test_background_import_streams_zone_events(self):
+        response = self.api.post(reverse('tenant-create'), {
+            'name': 'Cliente', 'cloudflare_api_key': 'chave', 'cloudflare_email': 'cf@example.com', 'background': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        job_id = response.data['sync']['job']['id']
+        self.assertFalse(Domain.objects.exists())
+
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(Domain.objects.count(), 3)
+        response, events = self.stream(job_id)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        kinds = [kind for _, kind, _ in events]
+        self.assertEqual(kinds[0], 'started')
+        self.assertEqual(kinds[-1], 'finished')
+        self.assertEqual(kinds.count('fetched'), 3)
+        self.assertEqual(kinds.count('written'), 3)
+        self.assertTrue(all(data['records'] == 4 for _, kind, data in events if kind == 'written'))
+
+        # Reconexão: só os eventos posteriores ao Last-Event-ID
+        middle = events[len(events) // 2][0]
+        _, resumed = self.stream(job_id, last_event_id=str(middle))
+        self.assertEqual([event[0] for event in resumed], [event[0] for event in events if event[0] > middle])
+        # Tarefa encerrada e nada novo: 204 encerra o EventSource
+        response, _ = self.stream(job_id, last_event_id=str(events[-1][0]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_background_sync_reuses_active_job(self):
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        url = reverse('tenant-sync-domains', args=[tenant.pk])
+        # Em segundo plano a sincronização busca os registros mesmo sem 'incremental'
+        first = self.api.post(url, {'background': True}, format='json')
+        second = self.api.post(url, {'background': True, 'incremental': False}, format='json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data['job']['id'], second.data['job']['id'])
+        self.assertEqual(SyncJob.objects.get().options, {'incremental': True})
+
+        run_pending_jobs()
+        _, events = self.stream(first.data['job']['id'])
+        zones = [data for _, kind, data in events if kind == 'zones']
+        self.assertEqual(zones[0]['created'], 3)
+        self.assertEqual({data['zone'] for _, kind, data in events if kind == 'diffed'}, set(Domain.objects.values_list('name', flat=True)))
+        self.assertEqual(DNSRecord.objects.count(), 12)
+
+    def test_import_fails_when_zones_cannot_be_listed(self):
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        job = SyncJob.objects.create(kind=SyncJob.KIND_TENANT_IMPORT, tenant=tenant, dedup_key='x')
+        with self.settings(CLOUDFLARE_API_BASE_URL='http://127.0.0.1:9/client/v4/'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_PENDING)  # reagendada
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.error)
+        self.assertEqual(job.events.last().kind, 'failed')
+
+    def test_failed_sync_waits_for_interval(self):
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+            sync_interval_minutes=60,
+        )
+        job = schedule_tenant_syncs()[0]
+        job.status, job.finished_at = SyncJob.STATUS_FAILED, timezone.now()
+        job.save()
+        # Sem sincronização bem-sucedida, mas a falha recente adia a próxima tentativa
+        self.assertEqual(schedule_tenant_syncs(), [])
+        SyncJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - datetime.timedelta(minutes=61))
+        self.assertEqual([job.tenant_id for job in schedule_tenant_syncs()], [tenant.pk])
+
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        SyncJob.objects.create(kind=SyncJob.KIND_TENANT_IMPORT, tenant=tenant, dedup_key='x')
+        job = claim_next_job()
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        SyncJob.objects.filter(pk=job.pk).update(started_at=long_ago, heartbeat_at=long_ago)
+
+        # Tarefa longa que continua emitindo progresso: o worker está vivo
+        with self.settings(CLOUDFLARE_SYNC={'HEARTBEAT_SECONDS': 0}):
+            JobProgress(job)('zones', total=3)
+        self.assertEqual(requeue_stuck_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_RUNNING)
+
+        SyncJob.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        self.assertEqual(requeue_stuck_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.STATUS_PENDING)
+
+    def test_stream_requires_tenant_access(self):
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        job = SyncJob.objects.create(kind=SyncJob.KIND_TENANT_DOMAINS, tenant=tenant, dedup_key='x')
+        other = User.objects.create_user(username='outro', email='outro@example.com', password='x', role='manager')
+        self.token = str(CustomTokenObtainPairSerializer.get_token(other).access_token)
+        self.assertEqual(self.stream(job.pk)[0].status_code, 403)
+        self.token = 'invalido'
+        self.assertEqual(self.stream(job.pk)[0].status_code, 401)
+
+    def test_async_views_are_instrumented_without_sync_adapter(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(InstrumentationMiddleware(get_response)))
+
+        tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        job = SyncJob.objects.create(
+            kind=SyncJob.KIND_TENANT_DOMAINS, tenant=tenant, dedup_key='x', status=SyncJob.STATUS_DONE,
+        )
+        with self.settings(INSTRUMENTATION={'SERVER_TIMING_HEADER': True}):
+            response = async_to_sync(self.async_client.get)(reverse('sync-job-events', args=[job.pk]), {'token': self.token})
+        self.assertEqual(response.status_code, 204)
+        self.assertRegex(response['Server-Timing'], r'(^|, )db;dur=')
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        url = reverse('domain-list-create')
+        self.assertNotIn('Server-Timing', self.api.get(url))  # desativado por padrão
+        with self.settings(INSTRUMENTATION={'SERVER_TIMING_HEADER': True}):
+            self.assertIn('Server-Timing', APIClient().get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}'))
+            self.assertNotIn('Server-Timing', APIClient().get(url))
+            manager = User.objects.create_user(username='gerente', email='gerente@example.com', password='x')
+            token = str(CustomTokenObtainPairSerializer.get_token(manager).access_token)
+            self.assertNotIn('Server-Timing', APIClient().get(url, HTTP_AUTHORIZATION=f'Bearer {token}'))
+
+
+class DriftTests(TestCase):
+    """Árvore de hashes por zona e verificação de divergência contra o emulador."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.emulator.store.seed(2, 40)
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+        ))
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        self.tenant = Tenant.objects.create(
+            name='Cliente', owner=admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        import_tenant_zones(self.tenant)
+        self.domain = Domain.objects.select_related('tenant').order_by('name').first()
+        self.zone_id = self.domain.cloudflare_zone_id
+
+    def test_clean_zones_do_not_read_local_rows(self):
+        reports = check_drift(Domain.objects.select_related('tenant'))
+        self.assertEqual([report['drift'] for report in reports], [False, False])
+        self.assertEqual(reports[0]['records'], 40)
+        with self.assertNumQueries(0):
+            self.assertFalse(check_zone_drift(self.domain)['drift'])
+
+    def test_reports_only_differing_records(self):
+        store = self.emulator.store
+        remote_ids = sorted(store.records[self.zone_id])
+        store.update_record(self.zone_id, remote_ids[0], {'content': '192.0.2.250'}, replace=False)
+        store.delete_record(self.zone_id, remote_ids[1])
+        added = store.add_record(self.zone_id, {'type': 'TXT', 'name': self.domain.name, 'content': 'novo'})
+        # Edição só no banco local também é divergência
+        local = DNSRecord.objects.get(cloudflare_record_id=remote_ids[2])
+        local.ttl = 60
+        local.save()
+
+        self.domain.refresh_from_db()
+        report = check_zone_drift(self.domain)
+        self.assertTrue(report['drift'])
+        found = {key: sorted(rid for bucket in report['buckets'] for rid in bucket[key]) for key in ('missing', 'extra', 'changed')}
+        self.assertEqual(found, {
+            'missing': [added['id']], 'extra': [remote_ids[1]], 'changed': sorted(remote_ids[0:1] + remote_ids[2:3]),
+        })
+        self.assertLessEqual(len(report['buckets']), 4)
+
+        # A sincronização desfaz também a edição feita só no banco local
+        sync_domain_records(self.domain)
+        self.domain.refresh_from_db()
+        self.assertFalse(check_zone_drift(self.domain)['drift'])
+        self.assertEqual(DNSRecord.objects.get(cloudflare_record_id=remote_ids[2]).ttl, 1)
+
+    def test_edits_update_only_touched_buckets(self):
+        record = DNSRecord.objects.filter(domain=self.domain).order_by('pk').first()
+        record.content = '192.0.2.99'
+        with CaptureQueriesContext(connection) as queries:
+            record.save()
+        reads = [query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')]
+        # Lê só o balde do registro (e a árvore, travando o domínio)
+        self.assertTrue(any('"bucket" IN' in sql for sql in reads))
+        self.assertFalse(any('"cloudflare_record_id" IS NOT NULL' in sql for sql in reads))
+
+        created = DNSRecord(domain=self.domain, name=f'novo.{self.domain.name}', record_type='A',
+                            content='192.0.2.1', ttl=1, cloudflare_record_id='novo-id')
+        created.save()
+        DNSRecord.objects.filter(domain=self.domain).exclude(pk__in=[record.pk, created.pk]).first().delete()
+        self.domain.refresh_from_db()
+        root, tree = self.domain.records_root, self.domain.records_tree
+        update_zone_trees([self.domain.pk])
+        self.domain.refresh_from_db()
+        self.assertEqual((root, tree), (self.domain.records_root, self.domain.records_tree))
+
+
+class RecordSyncTests(TestCase):
+    """Reconciliação dos registros de uma zona e reimportação das zonas do tenant."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.emulator.store.seed(2, 6)
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+        ))
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        self.tenant = Tenant.objects.create(
+            name='Cliente', owner=self.admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com',
+        )
+        import_tenant_zones(self.tenant)
+        self.domain = Domain.objects.select_related('tenant').order_by('name').first()
+        self.zone_id = self.domain.cloudflare_zone_id
+
+    def remote_records(self):
+        return [dict(record) for record in self.emulator.store.records[self.zone_id].values()]
+
+    def test_reconcile_upserts_and_deletes(self):
+        records = self.remote_records()
+        records[0]['content'] = '192.0.2.250'
+        removed = records.pop(1)
+        records.append({'id': 'novo-id', 'type': 'TXT', 'name': self.domain.name, 'content': 'novo', 'ttl': 1})
+
+        summary = reconcile_dns_records(self.domain, records)
+
+        self.assertEqual(summary, {'created': 1, 'updated': 1, 'deleted': 1, 'unchanged': 4})
+        self.assertEqual(DNSRecord.objects.get(cloudflare_record_id=records[0]['id']).content, '192.0.2.250')
+        self.assertFalse(DNSRecord.objects.filter(cloudflare_record_id=removed['id']).exists())
+        self.assertEqual(DNSRecord.objects.get(cloudflare_record_id='novo-id').content_target, '')
+        self.domain.refresh_from_db()
+        root = self.domain.records_root
+        update_zone_trees([self.domain.pk])
+        self.domain.refresh_from_db()
+        self.assertEqual(self.domain.records_root, root)
+
+    def test_reconcile_limited_to_record_types_keeps_other_types(self):
+        records = [record for record in self.remote_records() if record['type'] != 'A']
+        local_a = DNSRecord.objects.filter(domain=self.domain, record_type='A').count()
+        self.assertGreater(local_a, 0)
+
+        summary = reconcile_dns_records(self.domain, records, record_types=['CNAME'])
+
+        self.assertEqual(summary['deleted'], 0)
+        self.assertEqual(DNSRecord.objects.filter(domain=self.domain, record_type='A').count(), local_a)
+
+    def test_sync_skips_reconcile_when_root_matches(self):
+        records = self.remote_records()
+        self.domain.records_fingerprint = ''
+        self.domain.save(update_fields=['records_fingerprint'])
+
+        with mock.patch('domains.sync.reconcile_dns_records') as reconcile_mock:
+            summary = sync_domain_records(self.domain, records)
+
+        reconcile_mock.assert_not_called()
+        self.assertEqual(summary, {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': len(records)})
+        self.domain.refresh_from_db()
+        self.assertNotEqual(self.domain.records_fingerprint, '')
+
+    def test_sync_applies_remote_changes(self):
+        store = self.emulator.store
+        remote_ids = sorted(store.records[self.zone_id])
+        store.delete_record(self.zone_id, remote_ids[0])
+        store.add_record(self.zone_id, {'type': 'CNAME', 'name': f'www2.{self.domain.name}', 'content': 'alvo.example.net'})
+
+        summary = sync_domain_records(self.domain)
+
+        self.assertEqual((summary['created'], summary['deleted']), (1, 1))
+        self.assertEqual(
+            set(DNSRecord.objects.filter(domain=self.domain).values_list('cloudflare_record_id', flat=True)),
+            set(store.records[self.zone_id]),
+        )
+        self.domain.refresh_from_db()
+        self.assertFalse(check_zone_drift(self.domain)['drift'])
+
+    def test_import_retry_after_committed_run_upserts(self):
+        # Nova execução da mesma importação (ex.: tarefa reenfileirada depois de gravar)
+        store = self.emulator.store
+        remote_ids = sorted(store.records[self.zone_id])
+        store.update_record(self.zone_id, remote_ids[0], {'content': '192.0.2.250'}, replace=False)
+        store.delete_record(self.zone_id, remote_ids[1])
+        store.add_zone('nova.example.com')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        client.get(reverse('dashboard-stats'))  # materializa a linha global
+
+        report = import_tenant_zones(self.tenant)
+
+        self.assertNotIn('error', report)
+        self.assertEqual(report['domains_created'], 1)
+        self.assertEqual(Domain.objects.filter(tenant=self.tenant).count(), 3)
+        # Só o domínio novo entra no contador
+        self.assertEqual(client.get(reverse('dashboard-stats')).data['totalDomains'], 3)
+        self.assertEqual(DNSRecord.objects.get(cloudflare_record_id=remote_ids[0]).content, '192.0.2.250')
+        self.assertFalse(DNSRecord.objects.filter(cloudflare_record_id=remote_ids[1]).exists())
+        self.assertEqual(DNSRecord.objects.filter(domain=self.domain).count(), 5)
+        self.domain.refresh_from_db()
+        self.assertFalse(check_zone_drift(self.domain)['drift'])
+
+
+class CloudflareClientTests(SimpleTestCase):
+    """Sessão HTTP compartilhada e paginação do cliente da Cloudflare contra o emulador local."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.emulator = EmulatorServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.emulator.store = ZoneStore()
+        self.zone = self.emulator.store.seed(1, 12)[0]
+        self.emulator.config = EmulatorConfig()
+        self.emulator.stats = EmulatorStats()
+        self.enterContext(self.settings(
+            CLOUDFLARE_API_BASE_URL=self.emulator.base_url,
+            CLOUDFLARE_RATE_LIMIT={'ENABLED': False},
+            CLOUDFLARE_HTTP={'MAX_RETRIES': 2, 'RETRY_BACKOFF_FACTOR': 0},
+        ))
+        # Os pools são por processo: recria com as configurações do teste
+        close_all_pools()
+        self.addCleanup(close_all_pools)
+
+    def service(self):
+        return CloudflareService('chave', 'cf@example.com')
+
+    def test_session_is_shared_and_connections_reused(self):
+        first, second = self.service(), self.service()
+        self.assertIs(first.pool, second.pool)
+        self.assertIsNot(first.pool, CloudflareService('outra', 'cf@example.com').pool)
+
+        for service in (first, second, first):
+            service._make_request('GET', f'zones/{self.zone["id"]}')
+
+        stats = first.pool.stats.snapshot()
+        self.assertEqual((stats['requests'], stats['new_connections'], stats['reused_connections']), (3, 1, 2))
+
+    def test_only_idempotent_methods_are_retried(self):
+        self.emulator.config.error_rate = 1.0
+        service = self.service()
+        path = f'zones/{self.zone["id"]}/dns_records'
+
+        with self.assertRaisesMessage(CloudflareAPIError, 'HTTP 500'):
+            service._make_request('GET', path)
+        self.assertEqual(self.emulator.stats.requests, 3)  # 1 + MAX_RETRIES
+
+        with self.assertRaisesMessage(CloudflareAPIError, 'HTTP 500'):
+            service._make_request('POST', path, {'type': 'A', 'name': self.zone['name'], 'content': '192.0.2.1'})
+        self.assertEqual(self.emulator.stats.requests, 4)  # POST não é reenviado
+        self.assertEqual(len(self.emulator.store.records[self.zone['id']]), 12)
+
+    def test_pagination_follows_result_info(self):
+        service = self.service()
+        expected = sorted(self.emulator.store.records[self.zone['id']])
+        for prefetch in (False, True):
+            self.emulator.stats = EmulatorStats()
+            records = list(service.iter_dns_records(self.zone['id'], per_page=5, prefetch=prefetch))
+            self.assertEqual(sorted(record['id'] for record in records), expected)
+            # 12 registros em páginas de 5: total_pages = 3, sem página extra vazia
+            self.assertEqual(self.emulator.stats.by_route, {'zones/:id/dns_records': 3})
+
+    def test_pagination_without_result_info_stops_at_short_page(self):
+        service = self.service()
+        pages = {1: [{'id': 1}, {'id': 2}], 2: [{'id': 3}]}
+        with mock.patch.object(service, '_send', side_effect=lambda method, endpoint, params: {
+            'success': True, 'result': pages[params['page']],
+        }) as send:
+            items = list(service._paginate('zones', per_page=2, prefetch=False))
+        self.assertEqual([item['id'] for item in items], [1, 2, 3])
+        self.assertEqual(send.call_count, 2)
+
+    def test_page_error_is_raised_after_earlier_pages(self):
+        service = self.service()
+        calls = []
+
+        def send(method, endpoint, params):
+            calls.append(params['page'])
+            if params['page'] == 2:
+                raise CloudflareAPIError('falha na página 2')
+            return {'success': True, 'result': [{'id': params['page']}], 'result_info': {'total_pages': 3}}
+
+        for prefetch in (False, True):
+            calls.clear()
+            received = []
+            with mock.patch.object(service, '_send', side_effect=send):
+                with self.assertRaisesMessage(CloudflareAPIError, 'falha na página 2'):
+                    for item in service._paginate('zones', per_page=1, prefetch=prefetch):
+                        received.append(item['id'])
+            self.assertEqual(received, [1])
+            self.assertEqual(calls, [1, 2])
+
+
+class CloudflareEmulatorTests(SimpleTestCase):
+    """Emulador local da API da Cloudflare (``cloudflare_api/emulator.py``)."""
+
+    headers = {'X-Auth-Email': 'cf@example.com', 'X-Auth-Key': 'chave'}
+
+    def server(self, **config):
+        server = EmulatorServer(config=EmulatorConfig(**config)).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def call(self, server, method, path, **kwargs):
+        response = requests.request(method, server.base_url + path, headers=kwargs.pop('headers', self.headers), **kwargs)
+        return response.status_code, response.json()
+
+    def test_listing_is_paginated_with_result_info(self):
+        server = self.server()
+        zone = server.store.seed(1, 12)[0]
+        status, body = self.call(server, 'GET', f'zones/{zone["id"]}/dns_records', params={'page': 3, 'per_page': 5})
+        self.assertEqual(status, 200)
+        self.assertTrue(body['success'])
+        self.assertEqual(len(body['result']), 2)
+        self.assertEqual(body['result_info'], {'page': 3, 'per_page': 5, 'count': 2, 'total_count': 12, 'total_pages': 3})
+
+        # per_page abaixo do mínimo da API é ajustado; filtros por campo
+        _, body = self.call(server, 'GET', f'zones/{zone["id"]}/dns_records', params={'per_page': 1, 'type': 'CNAME'})
+        self.assertEqual((body['result_info']['per_page'], body['result_info']['total_count']), (5, 6))
+        self.assertEqual(server.stats.by_route, {'zones/:id/dns_records': 2})
+
+    def test_record_crud_and_errors(self):
+        server = self.server()
+        zone = server.store.add_zone('example.com')
+        path = f'zones/{zone["id"]}/dns_records'
+
+        status, body = self.call(server, 'POST', path, json={'type': 'MX', 'name': 'example.com'})
+        self.assertEqual((status, body['errors'][0]['code']), (400, 9000))
+        status, body = self.call(server, 'POST', path, json={
+            'type': 'MX', 'name': 'example.com', 'content': 'mx.example.com', 'priority': 10,
+        })
+        self.assertEqual(status, 200)
+        record_id = body['result']['id']
+
+        _, body = self.call(server, 'PATCH', f'{path}/{record_id}', json={'ttl': 300})
+        self.assertEqual((body['result']['ttl'], body['result']['priority']), (300, 10))
+        # PUT substitui o registro: campos omitidos (priority) são removidos
+        _, body = self.call(server, 'PUT', f'{path}/{record_id}', json={
+            'type': 'MX', 'name': 'example.com', 'content': 'mx2.example.com',
+        })
+        self.assertNotIn('priority', body['result'])
+
+        self.assertEqual(self.call(server, 'DELETE', f'{path}/{record_id}')[0], 200)
+        status, body = self.call(server, 'GET', f'{path}/{record_id}')
+        self.assertEqual((status, body['errors'][0]['code']), (404, 81044))
+        status, body = self.call(server, 'GET', 'zones/inexistente/dns_records')
+        self.assertEqual((status, body['errors'][0]['code']), (404, 1001))
+
+    def test_authentication_and_rate_limit(self):
+        server = self.server(rate_limit=2, retry_after=7)
+        status, body = self.call(server, 'GET', 'zones', headers={})
+        self.assertEqual((status, body['errors'][0]['code']), (400, 6003))
+
+        # Janela fixa de um segundo: o relógio parado mantém as chamadas na mesma janela
+        with mock.patch('cloudflare_api.emulator.time.monotonic', return_value=100.0):
+            responses = [requests.get(server.base_url + 'zones', headers=self.headers) for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertEqual(responses[-1].headers['Retry-After'], '7')
+        self.assertEqual(server.stats.rate_limited, 1)
+
+    def test_graphql_analytics_are_deterministic(self):
+        server = self.server()
+        zone = server.store.add_zone('example.com')
+        query = {'query': '{ viewer { zones { httpRequests1dGroups } } }', 'variables': {
+            'zoneTags': [zone['id'], 'inexistente'], 'since': '2026-10-01', 'until': '2026-10-07',
+        }}
+        _, first = self.call(server, 'POST', 'graphql', json=query)
+        _, second = self.call(server, 'POST', 'graphql', json=query)
+
+        zones = first['data']['viewer']['zones']
+        self.assertEqual([item['zoneTag'] for item in zones], [zone['id']])
+        self.assertEqual(len(zones[0]['series']), 7)
+        self.assertEqual(first, second)
+
+        query['variables']['since'] = 'ontem'
+        _, body = self.call(server, 'POST', 'graphql', json=query)
+        self.assertIsNone(body['data'])
+        self.assertIn('invalid variables', body['errors'][0]['message'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """``benchmark_cloudflare`` no banco de testes atual (sem criar outro)."""
+
+    def setUp(self):
+        module = 'cloudflare_api.management.commands.benchmark_cloudflare'
+        for name in ('DiscoverRunner', 'setup_test_environment', 'teardown_test_environment'):
+            self.enterContext(mock.patch(f'{module}.{name}'))
+
+    def test_runs_scenarios_and_compares_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resultado.json')
+            with transaction.atomic():
+                call_command('benchmark_cloudflare', sizes='12', iterations=2, json_path=path, stdout=StringIO())
+                transaction.set_rollback(True)  # cada execução real usa um banco novo
+            with open(path, encoding='utf-8') as fp:
+                report = json.load(fp)
+            out = StringIO()
+            call_command('benchmark_cloudflare', sizes='12', iterations=1, compare=path, stdout=out)
+
+        self.assertEqual([item['scenario'] for item in report['results']], [
+            'tenant_create', 'tenant_sync_full', 'tenant_sync_incremental', 'cloudflare_records_list',
+            'local_records_list', 'local_records_page', 'record_create',
+        ])
+        by_scenario = {item['scenario']: item for item in report['results']}
+        self.assertEqual(by_scenario['cloudflare_records_list']['cloudflare_requests'], 1.0)
+        self.assertEqual(by_scenario['local_records_list']['cloudflare_requests'], 0.0)
+        self.assertTrue(all(item['queries'] > 0 and item['iterations'] == 2 for item in report['results']))
+        self.assertIn('Comparação', out.getvalue())
+        self.assertIn('p50_ms', out.getvalue())
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesMessage(CommandError, '--sizes'):
+            call_command('benchmark_cloudflare', sizes='dez', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, '--iterations'):
+            call_command('benchmark_cloudflare', iterations=0, stdout=StringIO())
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, fraction) for fraction in (0.5, 0.99, 1.0)], [50, 99, 100])
+        self.assertEqual(percentile([7], 0.99), 7)
+
+
+class DatabaseConnectionTests(TestCase):
+    """Conexões em threads auxiliares e métricas do pool (``core/db``)."""
+
+    def spy_close(self):
+        """Registra (alias, thread) de cada ``close()`` das conexões."""
+        closed = []
+        wrapper_class = type(connections['default'])
+        original = wrapper_class.close
+
+        def close(wrapper):
+            closed.append((wrapper.alias, threading.get_ident()))
+            return original(wrapper)
+
+        self.enterContext(mock.patch.object(wrapper_class, 'close', close))
+        return closed
+
+    def test_worker_connections_are_returned(self):
+        closed = self.spy_close()
+
+        def query():
+            User.objects.count()
+            return threading.get_ident()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            worker = executor.submit(release_connections(query)).result()
+            self.assertEqual(closed, [('default', worker)])
+            # Sem consultas, nada a devolver
+            executor.submit(release_connections(threading.get_ident)).result()
+        self.assertEqual(closed, [('default', worker)])
+
+    def test_connections_opened_before_the_call_are_kept(self):
+        closed = self.spy_close()
+        self.assertTrue(connection.in_atomic_block)
+
+        self.assertEqual(release_connections(User.objects.count)(), 0)
+
+        self.assertEqual(closed, [])
+        self.assertTrue(connection.in_atomic_block)
+
+    def test_pool_stats(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'requests_num': 9, 'requests_queued': 2, 'requests_wait_ms': 30, 'requests_errors': 1}
+        pooled = mock.Mock(_connection_pools={'default': pool})
+        with mock.patch('core.db.connections', {'default': pooled, 'replica': mock.Mock(_connection_pools={})}):
+            stats = database_pool_stats()
+
+        self.assertEqual(list(stats), ['default'])
+        self.assertEqual(stats['default'], {
+            'pool_size': 4, 'requests_num': 9, 'requests_queued': 2, 'requests_wait_ms': 30, 'requests_errors': 1,
+            'connections_lost': 0, 'returns_bad': 0, 'pid': os.getpid(), 'exhausted': 1, 'wait_ms_avg': 15.0,
+        })
+
+    def test_engine_times_pool_waits_and_logs_exhaustion(self):
+        from psycopg_pool import PoolTimeout
+        from core.db.base import DatabaseWrapper
+
+        wrapper = DatabaseWrapper(dict(connections.settings['default'], ENGINE='core.db', OPTIONS={}), alias='default')
+        self.enterContext(mock.patch.object(DatabaseWrapper, 'pool', new_callable=mock.PropertyMock, return_value=mock.Mock()))
+        parent = self.enterContext(mock.patch('django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection'))
+        timings = RequestTimings()
+        token = instrumentation._current.set(timings)
+        self.addCleanup(instrumentation._current.reset, token)
+
+        wrapper.get_new_connection({})
+        self.assertEqual(timings.counts, {'db_pool': 1})
+
+        parent.side_effect = PoolTimeout('sem conexões livres')
+        with mock.patch('core.db.database_pool_stats', return_value={'default': {'pid': 1, 'pool_max': 10, 'exhausted': 3}}), \
+                mock.patch('core.db.base.logger') as logger, self.assertRaises(PoolTimeout):
+            wrapper.get_new_connection({})
+        logger.warning.assert_called_once_with(
+            'db.pool_exhausted', alias='default', pid=1, size=None, max_size=10, waiting=None, exhausted=3,
+        )
+
+
+class ZoneRecordCacheTests(SimpleTestCase):
+    """Cache de registros por zona (cloudflare_api/cache.py)."""
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+    def test_entries_expire_after_ttl(self):
+        cache = ZoneRecordCache(ttl=30, max_entries=10)
+        loader = mock.Mock(side_effect=[['v1'], ['v2']])
+        with mock.patch('cloudflare_api.cache.time.monotonic', return_value=100.0) as now:
+            self.assertEqual(cache.get_or_load('zona', loader), ['v1'])
+            now.return_value = 129.0
+            self.assertEqual(cache.get_or_load('zona', loader), ['v1'])
+            now.return_value = 131.0
+            self.assertEqual(cache.get_or_load('zona', loader), ['v2'])
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ZoneRecordCache(ttl=30, max_entries=2)
+        cache.get_or_load('a', lambda: 'a')
+        cache.get_or_load('b', lambda: 'b')
+        cache.get_or_load('a', lambda: 'a2')  # 'a' passa a ser a mais recente
+        cache.get_or_load('c', lambda: 'c')
+
+        self.assertEqual(cache.get_or_load('a', lambda: 'a3'), 'a')
+        self.assertEqual(cache.get_or_load('b', lambda: 'b2'), 'b2')
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = ZoneRecordCache(ttl=30, max_entries=10)
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return ['registros']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('zona', loader))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        self._wait_for(lambda: cache.stats()['coalesced'] == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['registros']] * 5)
+
+    def test_invalidation_during_load_discards_result(self):
+        cache = ZoneRecordCache(ttl=30, max_entries=10)
+        started, release = threading.Event(), threading.Event()
+
+        def stale_loader():
+            started.set()
+            release.wait(5)
+            return ['antes da escrita']
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(cache.get_or_load('zona', stale_loader)))
+        thread.start()
+        started.wait(5)
+        cache.invalidate('zona')
+        release.set()
+        thread.join()
+
+        # Quem iniciou a carga recebe o valor, mas ele não fica no cache
+        self.assertEqual(results, [['antes da escrita']])
+        self.assertEqual(cache.get_or_load('zona', lambda: ['depois da escrita']), ['depois da escrita'])
+
+
+class RateLimiterTests(TestCase):
+    """Limitador de requisições por credencial (cloudflare_api/ratelimit.py)."""
+
+    def setUp(self):
+        self.enterContext(self.settings(CLOUDFLARE_RATE_LIMIT={'RATE': 1.0, 'BURST': 2, 'MAX_WAIT': 5.0}))
+
+    def test_rejected_reservation_keeps_tokens(self):
+        limiter = get_rate_limiter('chave', 'cf@example.com')
+        for _ in range(2 + 5):
+            limiter.reserve()  # esvazia o bucket e reserva até o limite de MAX_WAIT
+        tokens = limiter.bucket.tokens
+        for _ in range(3):
+            with self.assertRaises(RateLimitExceeded):
+                limiter.reserve()
+        self.assertEqual(limiter.bucket.tokens, tokens)
+        self.assertEqual(limiter.stats.snapshot()['acquired'], 7)
+
+    def test_setting_change_resets_limiters(self):
+        limiter = get_rate_limiter('chave', 'cf@example.com')
+        with self.settings(CLOUDFLARE_RATE_LIMIT={'RATE': 10.0, 'BURST': 50}):
+            other = get_rate_limiter('chave', 'cf@example.com')
+            self.assertIsNot(other, limiter)
+            self.assertEqual(other.bucket.burst, 50)
+        self.assertEqual(get_rate_limiter('chave', 'cf@example.com').bucket.burst, 2)
+
+    def test_default_quota(self):
+        config = DEFAULT_RATE_LIMIT_SETTINGS
+        self.assertLessEqual(config['BURST'] + config['RATE'] * 300, 1200)
+
+    def test_token_bucket_spaces_reservations(self):
+        bucket = TokenBucket('chave', rate=2.0, burst=2)
+        with mock.patch.object(bucket, '_clock', return_value=bucket.updated_at):
+            waits = [bucket.reserve(max_wait=1.0) for _ in range(4)]
+            self.assertEqual(waits, [0.0, 0.0, 0.5, 1.0])
+            # Acima de max_wait nada é reservado
+            self.assertEqual(bucket.reserve(max_wait=1.0), 1.5)
+            self.assertEqual(bucket.tokens, -2.0)
+            bucket.pause(10)
+            self.assertEqual(bucket.reserve(), 10.0)  # nada sai antes do fim da pausa
+
+    def test_worker_waits_longer_than_requests(self):
+        limiter = get_rate_limiter('chave', 'cf@example.com')
+        self.assertEqual(limiter.max_wait, 5.0)
+        with mock.patch('cloudflare_api.ratelimit._background_waits', True):
+            self.assertEqual(limiter.max_wait, DEFAULT_RATE_LIMIT_SETTINGS['WORKER_MAX_WAIT'])
+
+    def test_exhausted_quota_answers_429_without_waiting(self):
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='admin')
+        tenant = Tenant.objects.create(name='Cliente', owner=admin, cloudflare_api_key='chave', cloudflare_email='cf@example.com')
+        domain = Domain.objects.create(tenant=tenant, name='example.com', cloudflare_zone_id='zona')
+        get_rate_limiter('chave', 'cf@example.com').bucket.pause(60)
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        started = time.monotonic()
+        response = client.get(reverse('cloudflare-dns-records-list-create', args=[domain.pk]))
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 60)
+
+
+class DatabaseTokenBucketTests(TransactionTestCase):
+    """Bucket compartilhado pelo banco (``SHARED``), disputado por várias threads."""
+
+    def setUp(self):
+        self.bucket = DatabaseTokenBucket('chave', rate=10.0, burst=2)
+        self.enterContext(mock.patch.object(DatabaseTokenBucket, '_clock', return_value=1000.0))
+
+    def test_reservations_from_several_connections_share_the_row(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            waits = [executor.submit(release_connections(self.bucket.reserve)).result() for _ in range(4)]
+        self.assertEqual([round(wait, 3) for wait in waits], [0.0, 0.0, 0.1, 0.2])
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_reservations_do_not_share_tokens(self):
+        # Sem SELECT ... FOR UPDATE (SQLite) as transações concorrentes falham em vez de esperar
+        self.bucket.reserve()  # cria a linha antes da disputa
+        barrier = threading.Barrier(6)
+
+        def reserve(_):
+            barrier.wait(5)
+            return self.bucket.reserve()
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            waits = list(executor.map(release_connections(reserve), range(6)))
+
+        # Cada reserva recebe a sua vez: nenhum token é usado por duas threads
+        self.assertEqual(sorted(round(wait, 3) for wait in waits), [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        self.assertAlmostEqual(RateLimitBucket.objects.get(key='chave').tokens, -5.0)
+
+    def test_reservation_inside_caller_transaction_commits_on_its_own(self):
+        self.bucket.reserve()
+        with transaction.atomic():
+            self.bucket.reserve()
+            # Outra conexão já vê o token consumido, antes do commit do chamador
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                tokens = executor.submit(release_connections(
+                    lambda: RateLimitBucket.objects.get(key='chave').tokens
+                )).result()
+        self.assertEqual(tokens, 0.0)
@@ -1,8 +1,18 @@
 
 # backend/admin_api/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import DashboardStatsView, RecentTenantsView, UserListCreateView, UserRetrieveUpdateDestroyView, DomainListCreateView, DomainRetrieveUpdateDestroyView, CloudflareKeyListCreateView, CloudflareKeyRetrieveUpdateDestroyView, UserProfileView, TenantListCreateView, TenantCreateAPIView, TenantRetrieveUpdateDestroyView, TenantManagerView, TenantDomainListView, DomainSubdomainListView, DomainSubdomainCreateView, RecentSubdomainsView, DNSRecordView, DNSRecordDetailView, TenantSyncDomainsView, DNSRecordCloudflareView, DomainAnalyticsView, ARecordListView, DNSRecordCustomListView, UserDomainPermissionListCreateView, UserDomainPermissionDetailView
+from .views import DashboardStatsView, RecentTenantsView, UserListCreateView, UserRetrieveUpdateDestroyView, DomainListCreateView, DomainRetrieveUpdateDestroyView, CloudflareKeyListCreateView, CloudflareKeyRetrieveUpdateDestroyView, UserProfileView, TenantListCreateView, TenantCreateAPIView, TenantRetrieveUpdateDestroyView, TenantManagerView, TenantDomainListView, DomainSubdomainListView, DomainSubdomainCreateView, RecentSubdomainsView, DNSRecordView, DNSRecordDetailView, TenantSyncDomainsView, DNSRecordCloudflareView, DomainAnalyticsView, AnalyticsView, ARecordListView, DNSRecordCustomListView, UserDomainPermissionListCreateView, UserDomainPermissionDetailView, SyncJobListView, DomainSyncView, DNSRecordBatchView, DomainZoneFileView
 from .views_user_manager import UserIsManagerView
+from .async_views import DNSRecordCloudflareAsyncView, ARecordListAsyncView, SyncJobEventsView
+
+# Sob ASGI (core/asgi.py) as rotas que falam com a Cloudflare podem usar as views assíncronas
+if getattr(settings, 'CLOUDFLARE_ASYNC_VIEWS', False):
+    dns_record_cloudflare_view = DNSRecordCloudflareAsyncView.as_view()
+    a_record_list_view = ARecordListAsyncView.as_view()
+else:
+    dns_record_cloudflare_view = DNSRecordCloudflareView.as_view()
+    a_record_list_view = ARecordListView.as_view()
 
 urlpatterns = [
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
@@ -15,8 +25,10 @@ urlpatterns = [
     path('dns-records/', DNSRecordView.as_view(), name='dns-record-list-create'),
     path('dns-records/<str:pk>/', DNSRecordDetailView.as_view(), name='dns-record-detail'),
     path('domains/<int:domain_id>/dns-records/', DNSRecordView.as_view(), name='domain-dns-records'),
-    path('domains/<int:domain_id>/dns-records/cloudflare/', DNSRecordCloudflareView.as_view(), name='cloudflare-dns-records-list-create'),
-    path('domains/<int:domain_id>/dns-records/cloudflare/<str:record_id>/', DNSRecordCloudflareView.as_view(), name='cloudflare-dns-records-detail'),
+    path('domains/<int:domain_id>/dns-records/cloudflare/', dns_record_cloudflare_view, name='cloudflare-dns-records-list-create'),
+    path('domains/<int:domain_id>/dns-records/batch/', DNSRecordBatchView.as_view(), name='domain-dns-records-batch'),
+    path('domains/<int:domain_id>/zone-file/', DomainZoneFileView.as_view(), name='domain-zone-file'),
+    path('domains/<int:domain_id>/dns-records/cloudflare/<str:record_id>/', dns_record_cloudflare_view, name='cloudflare-dns-records-detail'),
     path('cloudflare-keys/', CloudflareKeyListCreateView.as_view(), name='cloudflare-key-list-create'),
     path('cloudflare-keys/<str:pk>/', CloudflareKeyRetrieveUpdateDestroyView.as_view(), name='cloudflare-key-detail'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
@@ -30,9 +42,13 @@ urlpatterns = [
     path('domains/<int:domain_pk>/subdomains/create/', DomainSubdomainCreateView.as_view(), name='domain-subdomain-create'),
     path('tenants/<int:tenant_pk>/sync-domains/', TenantSyncDomainsView.as_view(), name='tenant-sync-domains'),
     path('domains/<int:domain_id>/analytics/', DomainAnalyticsView.as_view(), name='domain-analytics'),
-    path('domains/<int:domain_id>/a-records/', ARecordListView.as_view(), name='domain-a-records'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('domains/<int:domain_id>/a-records/', a_record_list_view, name='domain-a-records'),
     path('domains/<int:domain_id>/dnsrecords/custom/', DNSRecordCustomListView.as_view(), name='domain-dnsrecords-custom'),
     path('user-domain-permissions/', UserDomainPermissionListCreateView.as_view(), name='user-domain-permission-list-create'),
     path('user-domain-permissions/<int:pk>/', UserDomainPermissionDetailView.as_view(), name='user-domain-permission-detail'),
     path('users/<str:user_id>/is-manager/', UserIsManagerView.as_view(), name='user-is-manager'),
+    path('sync-jobs/', SyncJobListView.as_view(), name='sync-job-list'),
+    path('sync-jobs/<int:job_id>/events/', SyncJobEventsView.as_view(), name='sync-job-events'),
+    path('domains/<int:domain_id>/sync/', DomainSyncView.as_view(), name='domain-sync'),
 ]
@@ -5,28 +5,74 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import generics, serializers
 from django.db import IntegrityError
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from tenants.models import Tenant
 from domains.models import Domain
 from cloudflare_keys.models import CloudflareKey
-import requests
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from domains.models import Domain
-import datetime
 from accounts.models import UserDomainPermission
 from domains.models import DNSRecord
 from rest_framework.decorators import action
+import math
 import re
 
-from .serializers import TenantSerializer, UserSerializer, DomainSerializer, CloudflareKeySerializer, TenantCreateSerializer, TenantManagerSerializer, RecentSubdomainSerializer, DNSRecordSerializer, UserDomainPermissionSerializer
+from .serializers import TenantSerializer, UserSerializer, DomainSerializer, CloudflareKeySerializer, TenantCreateSerializer, TenantManagerSerializer, RecentSubdomainSerializer, DNSRecordSerializer, UserDomainPermissionSerializer, SyncJobSerializer, DNSBatchSerializer, AnalyticsQuerySerializer
 from .permissions import IsAdminUser
-from cloudflare_api.services import CloudflareService, CloudflareAPIError
-from domains.models import Domain, DNSRecord
+from cloudflare_api.services import CloudflareService, CloudflareAPIError, CloudflareRateLimitError
+from domains.models import Domain, DNSRecord, normalize_dns_name
+from domains.models import SyncJob
+from domains.sync import get_sync_settings, import_tenant_zones, reconcile_dns_records, record_from_cloudflare, sync_tenant_domains, update_record_from_cloudflare
+from domains.analytics import last_analytics_refresh, query_series
+from domains.jobs import enqueue, enqueue_analytics_refresh_if_stale, enqueue_domain_refresh, enqueue_domain_refresh_if_stale
+from domains.batch import apply_dns_batch, prepare_dns_batch
+from domains.zonefile import CONTENT_TYPES, FORMATS, export_zone, import_zone, save_import_file
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from core.pagination import StrictKeysetCursorPagination
+from accounts.authentication import get_full_user
+from accounts.scope import get_tenant_scope, managed_tenant_ids
+from .stats import get_dashboard_counter
+from core.instrumentation import get_logger
+
+logger = get_logger(__name__)
 
 User = get_user_model()
 
+
+def with_sync_headers(response, domain, job=None):
+    """Informa ao cliente a idade dos dados locais e a tarefa de sincronização pendente."""
+    if domain.last_synced_at:
+        response['X-Last-Synced-At'] = domain.last_synced_at.isoformat()
+    if job is not None:
+        response['X-Sync-Job'] = str(job.pk)
+        response['X-Sync-Status'] = job.status
+    return response
+
+def request_flag(request, name):
+    return str(request.data.get(name, request.query_params.get(name, ''))).lower() in ('1', 'true')
+
+def background_job_data(request, job):
+    """Tarefa enfileirada e a URL do stream SSE com o progresso dela."""
+    return {
+        'job': SyncJobSerializer(job).data,
+        'events_url': request.build_absolute_uri(reverse('sync-job-events', args=[job.pk])),
+    }
+
+def cloudflare_error_response(e, message=None, response_class=Response):
+    """
+    Resposta para um erro da Cloudflare: 429 com ``Retry-After`` quando a cota
+    da credencial se esgotou (a requisição não espera por ela), senão 400.
+    """
+    if isinstance(e, CloudflareRateLimitError):
+        return response_class({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                              headers={'Retry-After': str(math.ceil(e.retry_after))})
+    return response_class({'error': message or str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
@@ -38,39 +84,23 @@ class TenantCreateAPIView(generics.CreateAPIView):
     serializer_class = TenantCreateSerializer
     permission_classes = [IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.data['sync'] = self.sync_report
+        return response
+
     def perform_create(self, serializer):
         # Associa o usuário logado ao novo tenant como proprietário
         instance = serializer.save(owner=self.request.user)
-        
-        # Tenta buscar e criar domínios e registros DNS da Cloudflare
-        try:
-            service = CloudflareService(instance.cloudflare_api_key, instance.cloudflare_email)
-            zones = service.get_zones()
-            for zone in zones:
-                domain_obj = Domain.objects.create(
-                    tenant=instance,
-                    name=zone['name'],
-                    proxied=zone['proxied'] if 'proxied' in zone else False # Cloudflare API pode não retornar 'proxied' para todos os tipos
-                )
-                # Agora busca os registros DNS para esta zona
-                dns_records = service.get_dns_records(zone['id'])
-                for record in dns_records:
-                    DNSRecord.objects.create(
-                        domain=domain_obj,
-                        name=record['name'],
-                        record_type=record['type'],
-                        content=record['content'],
-                        ttl=record['ttl'],
-                        proxied=record['proxied'] if 'proxied' in record else False,
-                        cloudflare_record_id=record['id']
-                    )
-        except CloudflareAPIError as e:
-            # Erro silencioso
-            pass
-        except Exception as e:
-            # Erro silencioso
-            pass
 
+        if request_flag(self.request, 'background'):
+            # Importação pelo worker; o progresso é acompanhado pelo stream SSE
+            job = enqueue(SyncJob.KIND_TENANT_IMPORT, instance)
+            self.sync_report = background_job_data(self.request, job)
+            return instance
+
+        # Importa domínios e registros DNS da Cloudflare (zonas buscadas em paralelo)
+        self.sync_report = import_tenant_zones(instance)
         return instance
 
 class TenantListCreateView(generics.ListCreateAPIView):
@@ -80,10 +110,11 @@ class TenantListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
-            return Tenant.objects.all().order_by('name')
+            queryset = Tenant.objects.all().order_by('name')
         else:
             # Retorna apenas os tenants que o usuário gerencia
-            return user.managed_tenants.all().order_by('name')
+            queryset = Tenant.objects.filter(id__in=managed_tenant_ids(user)).order_by('name')
+        return TenantSerializer.setup_eager_loading(queryset)
 
     def create(self, request, *args, **kwargs):
         # Apenas admins podem criar tenants
@@ -95,23 +126,13 @@ class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, format=None):
-        user = request.user
-        if user.role == 'admin':
-            # Admins see all stats
-            total_tenants = Tenant.objects.count()
-            total_domains = Domain.objects.count()
-            total_users = User.objects.count()
-        else:
-            # Regular users see stats for tenants they manage
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
-            total_tenants = user.managed_tenants.count()
-            total_domains = Domain.objects.filter(tenant__id__in=managed_tenants_ids).count()
-            total_users = User.objects.filter(managed_tenants__id__in=managed_tenants_ids).count()
-
+        # Admins: contadores globais; demais usuários: soma dos tenants que gerenciam.
+        # Uma leitura pela chave primária de DashboardCounter (ver admin_api/stats.py).
+        counter = get_dashboard_counter(request.user)
         return Response({
-            'totalTenants': total_tenants,
-            'totalDomains': total_domains,
-            'totalUsers': total_users,
+            'totalTenants': counter.tenants,
+            'totalDomains': counter.domains,
+            'totalUsers': counter.users,
         })
 
 class RecentTenantsView(APIView):
@@ -119,7 +140,7 @@ class RecentTenantsView(APIView):
 
     def get(self, request, format=None):
         # Busca os 5 tenants mais recentes, ordenando pelo ID (assumindo que IDs maiores são mais recentes)
-        recent_tenants = Tenant.objects.all().order_by('-created_at')[:5]
+        recent_tenants = TenantSerializer.setup_eager_loading(Tenant.objects.all()).order_by('-created_at')[:5]
         serializer = TenantSerializer(recent_tenants, many=True)
         return Response(serializer.data)
 
@@ -133,13 +154,13 @@ class RecentSubdomainsView(APIView):
             recent_subdomains = DNSRecord.objects.filter(record_type='CNAME').order_by('-created_at')[:5]
         else:
             # Regular users see recent CNAME records for tenants they manage
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
+            managed_tenants_ids = managed_tenant_ids(user)
             recent_subdomains = DNSRecord.objects.filter(
                 record_type='CNAME',
                 domain__tenant__id__in=managed_tenants_ids
             ).order_by('-created_at')[:5]
 
-        serializer = RecentSubdomainSerializer(recent_subdomains, many=True)
+        serializer = RecentSubdomainSerializer(RecentSubdomainSerializer.setup_eager_loading(recent_subdomains), many=True)
         return Response(serializer.data)
 
 class UserListCreateView(generics.ListCreateAPIView):
@@ -148,26 +169,9 @@ class UserListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def create(self, request, *args, **kwargs):
-        import logging
-        logger = logging.getLogger('django')
-        
-        # Logs detalhados para debug
-        logger.info(f'[UserListCreateView:create] Content-Type: {request.content_type}')
-        logger.info(f'[UserListCreateView:create] request.data: {request.data}')
-        logger.info(f'[UserListCreateView:create] request.POST: {request.POST}')
-        logger.info(f'[UserListCreateView:create] request.FILES: {request.FILES}')
-        
-        # Logs adicionais para debug do FormData
-        logger.info(f'[UserListCreateView:create] request.data type: {type(request.data)}')
-        logger.info(f'[UserListCreateView:create] request.data keys: {list(request.data.keys()) if hasattr(request.data, "keys") else "No keys"}')
-        
-        # Se for FormData, verificar campos específicos
-        if 'multipart/form-data' in request.content_type:
-            logger.info(f'[UserListCreateView:create] email from POST: {request.POST.get("email")}')
-            logger.info(f'[UserListCreateView:create] email from data: {request.data.get("email")}')
-            logger.info(f'[UserListCreateView:create] first_name from POST: {request.POST.get("first_name")}')
-            logger.info(f'[UserListCreateView:create] first_name from data: {request.data.get("first_name")}')
-        
+        # Apenas os nomes dos campos: o corpo traz a senha do novo usuário
+        logger.debug('user.create_request', content_type=request.content_type,
+                     fields=lambda: sorted(request.data.keys()))
         return super().create(request, *args, **kwargs)
 
 class UserRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
@@ -190,7 +194,7 @@ class DNSRecordView(generics.ListCreateAPIView):
             return DNSRecord.objects.all().order_by('name')
         else:
             # Usuários comuns podem ver apenas registros dos tenants que gerenciam
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
+            managed_tenants_ids = managed_tenant_ids(user)
             queryset = DNSRecord.objects.filter(domain__tenant__id__in=managed_tenants_ids)
             
             if domain_id:
@@ -213,39 +217,20 @@ class DNSRecordView(generics.ListCreateAPIView):
         # Verificar permissão
         if user.role != 'admin':
             # Permite se for gerente do tenant
-            if domain.tenant not in user.managed_tenants.all():
+            if not get_tenant_scope(user).can_access_domain(domain):
                 return Response({'error': 'Você não tem permissão para ver os registros deste domínio.'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Sincronizar registros da Cloudflare
-        try:
-            service = CloudflareService(domain.tenant.cloudflare_api_key, domain.tenant.cloudflare_email)
-            cf_records = service.get_dns_records(domain.cloudflare_zone_id)
-            for record_data in cf_records:
-                # Apenas CNAMEs são de interesse para o usuário comum
-                if record_data['type'] == 'CNAME':
-                    DNSRecord.objects.update_or_create(
-                        cloudflare_record_id=record_data['id'],
-                        domain=domain,
-                        defaults={
-                            'name': record_data['name'],
-                            'record_type': record_data['type'],
-                            'content': record_data['content'],
-                            'ttl': record_data['ttl'],
-                            'proxied': record_data.get('proxied', False),
-                            'created_by': user, # Opcional: atribuir ao usuário que fez a sincronização
-                        }
-                    )
-        except CloudflareAPIError as e:
-            # Se falhar, continuar com os dados locais
-            pass
-        except Exception as e:
-            # Erro silencioso
-            pass
+        # Responde com os dados locais; a sincronização com a Cloudflare roda no worker
+        job = enqueue_domain_refresh_if_stale(domain)
 
         # Filtrar registros para o usuário
         queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return with_sync_headers(self.get_paginated_response(serializer.data), domain, job)
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return with_sync_headers(Response(serializer.data), domain, job)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -271,7 +256,7 @@ class DNSRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
             return DNSRecord.objects.all()
         else:
             # Usuários comuns podem ver apenas registros dos tenants que gerenciam
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
+            managed_tenants_ids = managed_tenant_ids(user)
             return DNSRecord.objects.filter(domain__tenant__id__in=managed_tenants_ids)
 
     def get_serializer_context(self):
@@ -310,11 +295,12 @@ class DomainListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
-            return Domain.objects.all().order_by('-created_at')
+            queryset = Domain.objects.all().order_by('-created_at')
         else:
             # Retorna apenas os domínios dos tenants que o usuário gerencia
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
-            return Domain.objects.filter(tenant__id__in=managed_tenants_ids).order_by('-created_at')
+            managed_tenants_ids = managed_tenant_ids(user)
+            queryset = Domain.objects.filter(tenant__id__in=managed_tenants_ids).order_by('-created_at')
+        return DomainSerializer.setup_eager_loading(queryset)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -341,7 +327,7 @@ class DomainRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         if user.role == 'admin':
             return Domain.objects.all()
         else:
-            managed_tenants_ids = user.managed_tenants.values_list('id', flat=True)
+            managed_tenants_ids = managed_tenant_ids(user)
             return Domain.objects.filter(tenant__id__in=managed_tenants_ids)
 
     def perform_update(self, serializer):
@@ -394,7 +380,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
                     pass
         
         # Caso contrário, retorna o próprio usuário
-        return self.request.user
+        return get_full_user(self.request.user)
 
 class TenantRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Tenant.objects.all()
@@ -405,7 +391,7 @@ class TenantRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tenant = self.get_object()
         user = request.user
         # Permite GET se for admin ou gerente do tenant
-        if user.role == 'admin' or tenant.managers.filter(id=user.id).exists():
+        if get_tenant_scope(user).can_access_tenant(tenant.pk):
             serializer = self.get_serializer(tenant)
             return Response(serializer.data)
         return Response({'detail': 'Você não tem permissão para acessar este cliente.'}, status=status.HTTP_403_FORBIDDEN)
@@ -458,13 +444,12 @@ class TenantDomainListView(generics.ListAPIView):
         user = self.request.user
 
         # Ensure the user has access to this tenant
-        if user.role == 'admin':
-            return Domain.objects.filter(tenant__pk=tenant_pk).order_by('-created_at')
-        else:
+        if user.role != 'admin':
             # Check if the user manages this specific tenant
-            if not user.managed_tenants.filter(pk=tenant_pk).exists():
+            if not get_tenant_scope(user).can_access_tenant(tenant_pk):
                 raise serializers.ValidationError("Você não tem permissão para acessar os domínios deste cliente.")
-            return Domain.objects.filter(tenant__pk=tenant_pk).order_by('-created_at')
+        queryset = Domain.objects.filter(tenant__pk=tenant_pk).order_by('-created_at')
+        return DomainSerializer.setup_eager_loading(queryset)
 
 class DomainSubdomainListView(generics.ListAPIView):
     serializer_class = RecentSubdomainSerializer # Reusing this serializer for now
@@ -477,10 +462,11 @@ class DomainSubdomainListView(generics.ListAPIView):
         domain = generics.get_object_or_404(Domain, pk=domain_pk)
 
         # Check if the user has access to this domain's tenant
-        if user.role != 'admin' and not user.managed_tenants.filter(pk=domain.tenant.pk).exists():
+        if not get_tenant_scope(user).can_access_domain(domain):
             raise serializers.ValidationError("Você não tem permissão para acessar os subdomínios deste domínio.")
 
-        return DNSRecord.objects.filter(domain=domain, record_type='CNAME').order_by('name')
+        queryset = DNSRecord.objects.filter(domain=domain, record_type='CNAME').order_by('name')
+        return RecentSubdomainSerializer.setup_eager_loading(queryset)
 
 class DomainSubdomainCreateView(generics.CreateAPIView):
     serializer_class = RecentSubdomainSerializer # Reusing this serializer for now
@@ -493,7 +479,7 @@ class DomainSubdomainCreateView(generics.CreateAPIView):
         domain = generics.get_object_or_404(Domain, pk=domain_pk)
 
         # Check if the user has access to this domain's tenant
-        if user.role != 'admin' and not user.managed_tenants.filter(pk=domain.tenant.pk).exists():
+        if not get_tenant_scope(user).can_access_domain(domain):
             raise serializers.ValidationError("Você não tem permissão para criar subdomínios neste domínio.")
 
         # Ensure it's a CNAME record
@@ -513,59 +499,82 @@ class TenantSyncDomainsView(APIView):
             return Response({'error': 'Tenant não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
         # Permitir apenas admins ou managers do tenant
-        if user.role != 'admin' and user not in tenant.managers.all():
+        if not get_tenant_scope(user).can_access_tenant(tenant.pk):
             return Response({'error': 'Permissão negada.'}, status=status.HTTP_403_FORBIDDEN)
 
+        if request_flag(request, 'background'):
+            # Roda no worker, sempre incremental: os registros das zonas novas ou
+            # alteradas são sincronizados e cada zona gera eventos no stream.
+            # Uma sincronização já ativa do tenant é reaproveitada
+            job = enqueue(SyncJob.KIND_TENANT_DOMAINS, tenant, options={'incremental': True})
+            return Response(background_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+
+        # 'incremental' pula zonas sem alteração e sincroniza os registros das alteradas
+        incremental = request_flag(request, 'incremental')
+
         try:
             service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
             zones = service.get_zones()
         except CloudflareAPIError as e:
-            return Response({'error': f'Erro ao conectar com a Cloudflare: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+            return cloudflare_error_response(e, f'Erro ao conectar com a Cloudflare: {e}')
         except Exception as e:
             return Response({'error': f'Erro inesperado: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Atualizar domínios locais: sobrescrever lista
-        existing_domains = {d.name: d for d in Domain.objects.filter(tenant=tenant)}
-        domains_created = 0
-        domains_updated = 0
-        cloudflare_domain_names = set()
-        for zone in zones:
-            name = zone['name']
-            status_val = zone.get('status', 'active')
-            cloudflare_domain_names.add(name)
-            if name in existing_domains:
-                domain = existing_domains[name]
-                updated = False
-                if domain.proxied != zone.get('proxied', False):
-                    domain.proxied = zone.get('proxied', False)
-                    updated = True
-                if domain.status != status_val:
-                    domain.status = status_val
-                    updated = True
-                if domain.cloudflare_zone_id != zone['id']:
-                    domain.cloudflare_zone_id = zone['id']
-                    updated = True
-                if updated:
-                    domain.save()
-                    domains_updated += 1
-            else:
-                Domain.objects.create(
-                    tenant=tenant,
-                    name=name,
-                    cloudflare_zone_id=zone['id'],
-                    proxied=zone.get('proxied', False),
-                    status=status_val
-                )
-                domains_created += 1
-        # Remover domínios locais que não existem mais na Cloudflare
-        for name, domain in existing_domains.items():
-            if name not in cloudflare_domain_names:
-                domain.delete()
+        result = sync_tenant_domains(tenant, zones=zones, incremental=incremental)
         return Response({
-            'message': f'Sincronização concluída. {domains_created} domínios criados, {domains_updated} atualizados.',
-            'total_domains': len(zones)
+            'message': f'Sincronização concluída. {result["created"]} domínios criados, {result["updated"]} atualizados.',
+            'total_domains': result['total'],
+            'result': result,
         })
 
+class SyncJobListView(generics.ListAPIView):
+    """Tarefas de sincronização com a Cloudflare, filtráveis por status, tenant e domínio."""
+    serializer_class = SyncJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StrictKeysetCursorPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = SyncJob.objects.select_related('domain').order_by('-created_at')
+        if user.role != 'admin':
+            managed_tenants_ids = managed_tenant_ids(user)
+            queryset = queryset.filter(tenant__id__in=managed_tenants_ids)
+        for param in ('status', 'tenant', 'domain', 'kind'):
+            value = self.request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+class DomainSyncView(APIView):
+    """Estado da sincronização dos registros de um domínio (GET) ou pedido de atualização imediata (POST)."""
+    permission_classes = [IsAuthenticated]
+
+    def _get_domain(self, request, domain_id):
+        domain = generics.get_object_or_404(Domain, pk=domain_id)
+        if not get_tenant_scope(request.user).can_access_domain(domain):
+            return None
+        return domain
+
+    def get(self, request, domain_id):
+        domain = self._get_domain(request, domain_id)
+        if domain is None:
+            return Response({'error': 'Permissão negada.'}, status=status.HTTP_403_FORBIDDEN)
+        job = domain.sync_jobs.order_by('-created_at').first()
+        return Response({
+            'last_synced_at': domain.last_synced_at,
+            'job': SyncJobSerializer(job).data if job else None,
+        })
+
+    def post(self, request, domain_id):
+        domain = self._get_domain(request, domain_id)
+        if domain is None:
+            return Response({'error': 'Permissão negada.'}, status=status.HTTP_403_FORBIDDEN)
+        if not domain.cloudflare_zone_id:
+            return Response({'error': 'Domínio não possui Zone ID da Cloudflare.'}, status=status.HTTP_400_BAD_REQUEST)
+        job = enqueue_domain_refresh(domain)
+        return Response(SyncJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
 class DNSRecordCloudflareView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -575,25 +584,15 @@ class DNSRecordCloudflareView(APIView):
             domain = Domain.objects.get(pk=domain_id)
             tenant = domain.tenant
             service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
-            records = service.get_dns_records(domain.cloudflare_zone_id)
-            # Atualiza o cache local (opcional: pode ser async ou otimizado)
-            for record in records:
-                DNSRecord.objects.update_or_create(
-                    cloudflare_record_id=record['id'],
-                    domain=domain,
-                    defaults={
-                        'name': record['name'],
-                        'record_type': record['type'],
-                        'content': record['content'],
-                        'ttl': record['ttl'],
-                        'proxied': record.get('proxied', False),
-                    }
-                )
+            # Sem o cache de zonas: a lista apaga os registros locais ausentes, e o
+            # cache de outro processo pode não ter visto uma escrita recente
+            records = service.get_dns_records(domain.cloudflare_zone_id, fresh=True)
+            reconcile_dns_records(domain, records)
             return Response(records)
         except Domain.DoesNotExist:
             return Response({'error': 'Domínio não encontrado.'}, status=404)
         except CloudflareAPIError as e:
-            return Response({'error': str(e)}, status=400)
+            return cloudflare_error_response(e)
 
     def post(self, request, domain_id):
         """Cria um registro DNS na Cloudflare e salva no banco local."""
@@ -608,20 +607,12 @@ class DNSRecordCloudflareView(APIView):
             service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
             record = service.create_dns_record(domain.cloudflare_zone_id, data)
             # Salva no banco local
-            DNSRecord.objects.create(
-                domain=domain,
-                name=record['name'],
-                record_type=record['type'],
-                content=record['content'],
-                ttl=record['ttl'],
-                proxied=record.get('proxied', False),
-                cloudflare_record_id=record['id']
-            )
+            record_from_cloudflare(domain, record).save()
             return Response(record, status=201)
         except Domain.DoesNotExist:
             return Response({'error': 'Domínio não encontrado.'}, status=404)
         except CloudflareAPIError as e:
-            return Response({'error': str(e)}, status=400)
+            return cloudflare_error_response(e)
 
     def put(self, request, domain_id, record_id):
         """Atualiza um registro DNS na Cloudflare e no banco local."""
@@ -631,19 +622,13 @@ class DNSRecordCloudflareView(APIView):
             data = request.data
             service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
             record = service.update_dns_record(domain.cloudflare_zone_id, record_id, data)
-            # Atualiza no banco local
-            DNSRecord.objects.filter(domain=domain, cloudflare_record_id=record_id).update(
-                name=record['name'],
-                record_type=record['type'],
-                content=record['content'],
-                ttl=record['ttl'],
-                proxied=record.get('proxied', False)
-            )
+            # Atualiza no banco local (e a árvore de hashes da zona)
+            update_record_from_cloudflare(domain, record)
             return Response(record)
         except Domain.DoesNotExist:
             return Response({'error': 'Domínio não encontrado.'}, status=404)
         except CloudflareAPIError as e:
-            return Response({'error': str(e)}, status=400)
+            return cloudflare_error_response(e)
 
     def delete(self, request, domain_id, record_id):
         """Remove um registro DNS da Cloudflare e do banco local."""
@@ -661,52 +646,191 @@ class DNSRecordCloudflareView(APIView):
         except DNSRecord.DoesNotExist:
             return Response({'error': 'Registro DNS não encontrado.'}, status=404)
         except CloudflareAPIError as e:
-            return Response({'error': str(e)}, status=400)
+            return cloudflare_error_response(e)
+
+class DNSRecordBatchView(APIView):
+    """
+    Cria, altera e remove vários registros DNS de um domínio em uma requisição.
+
+    Corpo: ``{"operations": [{"op": "create", "type": "CNAME", "name": ..., "content": ...},
+    {"op": "update", "record_id": ..., "content": ...}, {"op": "delete", "record_id": ...}]}``.
+    Todas as operações são validadas antes de qualquer chamada à Cloudflare;
+    responde 200 se todas forem aplicadas ou 207 com o resultado de cada uma.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, domain_id):
+        try:
+            domain = Domain.objects.select_related('tenant').get(pk=domain_id)
+        except Domain.DoesNotExist:
+            return Response({'error': 'Domínio não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
+        if not get_tenant_scope(user).can_access_domain(domain):
+            return Response({'error': 'Permissão negada.'}, status=status.HTTP_403_FORBIDDEN)
+        if not domain.cloudflare_zone_id:
+            return Response({'error': 'Domínio não possui Zone ID da Cloudflare.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = DNSBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Usuários comuns só podem gerenciar registros CNAME
+        allowed_types = None if user.role == 'admin' else {'CNAME'}
+        prepared, errors = prepare_dns_batch(domain, serializer.validated_data['operations'], allowed_types)
+        if errors:
+            return Response({'operations': {str(index): [message] for index, message in errors.items()}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = apply_dns_batch(domain, prepared)
+        failed = sum(1 for result in results if not result['success'])
+        return Response({
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': [
+                {key: result[key] for key in ('index', 'op', 'record_id', 'success', 'record', 'error')}
+                for result in results
+            ],
+        }, status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK)
+
+class DomainZoneFileView(APIView):
+    """
+    Exporta (GET) ou importa (POST) os registros DNS do domínio em fluxo.
+
+    ``?zone_format=bind`` (padrão) ou ``ndjson``. A importação aceita o
+    arquivo no corpo da requisição ou como ``file`` em multipart e é restrita
+    a administradores. Arquivos maiores que ``IMPORT_BACKGROUND_BYTES`` (ou
+    com ``?background=true``) são gravados e importados pelo worker: a
+    resposta é 202 com a tarefa e a URL do stream de progresso.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _get_domain(self, request, domain_id):
+        domain = Domain.objects.select_related('tenant').filter(pk=domain_id).first()
+        if domain is not None and not get_tenant_scope(request.user).can_access_domain(domain):
+            return None
+        return domain
+
+    def _zone_format(self, request):
+        zone_format = request.query_params.get('zone_format', 'bind').lower()
+        return zone_format if zone_format in FORMATS else None
+
+    def get(self, request, domain_id):
+        domain = self._get_domain(request, domain_id)
+        if domain is None:
+            return Response({'error': 'Domínio não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        zone_format = self._zone_format(request)
+        if zone_format is None:
+            return Response({'error': 'Formato inválido (use bind ou ndjson).'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_zone(domain, zone_format), content_type=CONTENT_TYPES[zone_format])
+        extension = 'zone' if zone_format == 'bind' else 'ndjson'
+        response['Content-Disposition'] = f'attachment; filename="{domain.name}.{extension}"'
+        return response
+
+    def post(self, request, domain_id):
+        if request.user.role != 'admin':
+            return Response({'error': 'Apenas administradores podem importar zonas.'}, status=status.HTTP_403_FORBIDDEN)
+        domain = self._get_domain(request, domain_id)
+        if domain is None:
+            return Response({'error': 'Domínio não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        if not domain.cloudflare_zone_id:
+            return Response({'error': 'Domínio não possui Zone ID da Cloudflare.'}, status=status.HTTP_400_BAD_REQUEST)
+        zone_format = self._zone_format(request)
+        if zone_format is None:
+            return Response({'error': 'Formato inválido (use bind ou ndjson).'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Lê o arquivo linha a linha: multipart vai para um arquivo temporário,
+        # o corpo cru é lido direto do socket
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'Envie o arquivo no campo "file".'}, status=status.HTTP_400_BAD_REQUEST)
+            lines, size = upload, upload.size
+        else:
+            lines = request.stream or []
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+
+        # request.data não é lido aqui: o corpo cru não tem parser no DRF
+        background = request.query_params.get('background', '').lower() in ('1', 'true')
+        if background or size > get_sync_settings()['IMPORT_BACKGROUND_BYTES']:
+            path = save_import_file(domain, lines)
+            job = enqueue(SyncJob.KIND_ZONE_IMPORT, domain.tenant, domain=domain,
+                          options={'path': path, 'zone_format': zone_format})
+            if job.options.get('path') != path:
+                default_storage.delete(path)
+                return Response({'error': 'Já existe uma importação em andamento para este domínio.',
+                                 **background_job_data(request, job)}, status=status.HTTP_409_CONFLICT)
+            return Response(background_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+
+        summary = import_zone(domain, lines, zone_format)
+        return Response(summary, status=status.HTTP_400_BAD_REQUEST if summary['error'] else status.HTTP_200_OK)
+
+def analytics_response(domain_ids, tenants, params, extra=None):
+    """Série e totais lidos de ``ZoneAnalytics``; agenda a coleta dos tenants com dados velhos."""
+    series, totals = query_series(
+        domain_ids, params['since_at'], params['until_at'], params['granularity'],
+        by_domain=params.get('group') == 'domain',
+    )
+    jobs = enqueue_analytics_refresh_if_stale(tenants)
+    last = last_analytics_refresh([tenant.pk for tenant in tenants])
+    data = dict(extra or {})
+    data.update({
+        'granularity': params['granularity'],
+        'since': params['since'],
+        'until': params['until'],
+        'updated_at': min(last.values()) if len(last) == len(tenants) and last else None,
+        'series': series,
+        'totals': totals,
+    })
+    response = Response(data)
+    if jobs:
+        response['X-Sync-Job'] = ','.join(str(job.pk) for job in jobs)
+        response['X-Sync-Status'] = ','.join(sorted({job.status for job in jobs}))
+    return response
+
 
 class DomainAnalyticsView(APIView):
+    """Tráfego de um domínio (série local, ver ``domains/analytics.py``); não chama a Cloudflare."""
     permission_classes = [IsAuthenticated]
 
     def get(self, request, domain_id):
-        try:
-            domain = Domain.objects.get(pk=domain_id)
-            # Supondo que você armazene o zone_id da Cloudflare no modelo Domain
-            zone_id = getattr(domain, 'cloudflare_zone_id', None)
-            if not zone_id:
-                return Response({'error': 'Zone ID não encontrado para este domínio.'}, status=400)
-            api_token = "SEU_TOKEN_CLOUDFLARE"  # Troque pelo token correto
-            date = datetime.date.today().isoformat()
-
-            query = '''
-            query {
-              viewer {
-                zones(filter: { zoneTag: "%s" }) {
-                  httpRequests1dGroups(filter: { date: "%s" }, limit: 1) {
-                    uniq {
-                      uniques
-                    }
-                  }
-                }
-              }
-            }
-            ''' % (zone_id, date)
-
-            headers = {
-                "Authorization": f"Bearer {api_token}",
-                "Content-Type": "application/json"
-            }
-            response = requests.post(
-                "https://api.cloudflare.com/client/v4/graphql",
-                json={"query": query},
-                headers=headers
-            )
-            data = response.json()
-            uniques = (
-                data["data"]["viewer"]["zones"][0]["httpRequests1dGroups"][0]["uniq"]["uniques"]
-                if data.get("data") else 0
-            )
-            return Response({"uniques": uniques})
-        except Exception as e:
-            return Response({"error": str(e)}, status=400)
+        domain = generics.get_object_or_404(Domain.objects.select_related('tenant'), pk=domain_id)
+        scope = get_tenant_scope(request.user)
+        if not (scope.can_access_domain(domain) or domain.pk in scope.domain_ids):
+            return Response({'error': 'Permissão negada.'}, status=status.HTTP_403_FORBIDDEN)
+        params = AnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        response = analytics_response([domain.pk], [domain.tenant], params.validated_data, {'domain': domain.pk})
+        # Compatibilidade: visitantes únicos do período mais recente
+        series = response.data['series']
+        response.data['uniques'] = series[-1]['uniques'] if series else 0
+        return response
+
+
+class AnalyticsView(APIView):
+    """
+    Tráfego agregado dos domínios visíveis ao usuário (dashboards).
+
+    Filtros: ``tenant``, ``domains`` (IDs separados por vírgula), ``since``/
+    ``until`` e ``granularity`` (hour, day, week, month); ``group=domain``
+    separa a série por domínio.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = AnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        scope = get_tenant_scope(request.user)
+        domains = Domain.objects.all()
+        if not scope.is_admin:
+            domains = domains.filter(Q(tenant_id__in=scope.tenant_ids) | Q(pk__in=scope.domain_ids))
+        if params.get('tenant'):
+            domains = domains.filter(tenant_id=params['tenant'])
+        if params.get('domains'):
+            domains = domains.filter(pk__in=params['domains'])
+        pairs = list(domains.values_list('pk', 'tenant_id'))
+        tenants = list(Tenant.objects.filter(pk__in={tenant_id for _, tenant_id in pairs}))
+        return analytics_response([pk for pk, _ in pairs], tenants, params, {'domains': len(pairs)})
 
 
 class ARecordListView(APIView):
@@ -715,30 +839,14 @@ class ARecordListView(APIView):
     def get(self, request, domain_id):
         try:
             domain = Domain.objects.get(pk=domain_id)
-            tenant = domain.tenant
             if not domain.cloudflare_zone_id:
                 return Response({'error': 'Domínio não possui Zone ID da Cloudflare.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Sincroniza registros A/AAAA da Cloudflare com o banco local
-            service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
-            cf_records = service.get_a_aaaa_records(domain.cloudflare_zone_id)
-            for record in cf_records:
-                DNSRecord.objects.update_or_create(
-                    cloudflare_record_id=record['id'],
-                    domain=domain,
-                    defaults={
-                        'name': record['name'],
-                        'record_type': record['type'],
-                        'content': record['content'],
-                        'ttl': record['ttl'],
-                        'proxied': record.get('proxied', False),
-                    }
-                )
-            # Agora retorna os registros do banco local
+            # Responde com os dados locais; a sincronização com a Cloudflare roda no worker
+            job = enqueue_domain_refresh_if_stale(domain)
             a_aaaa_records = DNSRecord.objects.filter(domain=domain, record_type__in=["A", "AAAA"])
-            from .serializers import DNSRecordSerializer
             serializer = DNSRecordSerializer(a_aaaa_records, many=True)
-            return Response(serializer.data)
+            return with_sync_headers(Response(serializer.data), domain, job)
         except Domain.DoesNotExist:
             return Response({'error': 'Domínio não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -762,31 +870,12 @@ class DNSRecordCustomListView(APIView):
             return Response(serializer.data)
 
         # Lógica para usuários não-administradores
-        # 1. Sincroniza os registros da Cloudflare para garantir que os dados locais estejam atualizados.
-        if domain.cloudflare_zone_id:
-            try:
-                tenant = domain.tenant
-                service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
-                cf_records = service.get_dns_records(domain.cloudflare_zone_id)
-                for record in cf_records:
-                    DNSRecord.objects.update_or_create(
-                        cloudflare_record_id=record['id'],
-                        domain=domain,
-                        defaults={
-                            'name': record['name'],
-                            'record_type': record['type'],
-                            'content': record['content'],
-                            'ttl': record['ttl'],
-                            'proxied': record.get('proxied', False),
-                        }
-                    )
-            except Exception as e:
-                # Erro silencioso
-                pass
+        # 1. Pede a atualização dos registros locais ao worker, se estiverem desatualizados.
+        enqueue_domain_refresh_if_stale(domain)
 
         # 2. Busca a permissão específica do usuário para o registro A/AAAA neste domínio.
         try:
-            permission = UserDomainPermission.objects.get(user=user, domain=domain)
+            permission = UserDomainPermission.objects.select_related('allowed_a_record').get(user=user, domain=domain)
             allowed_a_record = permission.allowed_a_record
         except UserDomainPermission.DoesNotExist:
             # Se o usuário não tem permissão, retorna uma lista vazia.
@@ -795,25 +884,15 @@ class DNSRecordCustomListView(APIView):
         if not allowed_a_record:
             return Response([], status=status.HTTP_200_OK)
 
-        # 3. Filtra os CNAMEs que apontam para o registro A/AAAA permitido.
-        target_fqdn = allowed_a_record.name
+        # 3. Filtra os CNAMEs que apontam para o registro A/AAAA permitido
+        #    (coluna content_target normalizada e indexada por domínio/tipo).
+        related_cnames = DNSRecord.objects.filter(
+            domain_id=domain_id,
+            record_type='CNAME',
+            content_target=normalize_dns_name(allowed_a_record.name),
+        )
 
-        def normalize_name(name):
-            return name.lower().rstrip('.')
-
-        normalized_target = normalize_name(target_fqdn)
-        
-        all_cnames_for_domain = DNSRecord.objects.filter(domain_id=domain_id, record_type='CNAME')
-        
-        related_cnames = [
-            cname for cname in all_cnames_for_domain 
-            if normalize_name(cname.content) == normalized_target
-        ]
-
-        # 4. Monta a lista final apenas com os CNAMEs relacionados.
-        final_records = related_cnames
-        
-        serializer = DNSRecordSerializer(final_records, many=True)
+        serializer = DNSRecordSerializer(related_cnames, many=True)
         return Response(serializer.data)
 
 class UserDomainPermissionListCreateView(generics.ListCreateAPIView):
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CloudflareApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cloudflare_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,218 @@
+"""
+Cliente assíncrono (asyncio + httpx) da API da Cloudflare.
+
+Espelha os métodos de ``CloudflareService`` para uso em views assíncronas
+servidas por ``core/asgi.py``. Cada event loop mantém um ``httpx.AsyncClient``
+por credencial (pool de conexões compartilhado) e um semáforo que limita a
+quantidade de chamadas simultâneas.
+"""
+import asyncio
+import weakref
+
+import httpx
+
+from core.instrumentation import span
+from . import services
+from .cache import get_record_cache
+from .pool import PoolStats, credential_key, get_http_settings
+from .ratelimit import RateLimitExceeded, get_rate_limiter, parse_retry_after
+from .services import CloudflareAPIError, CloudflareRateLimitError
+
+
+class AsyncSessionPool:
+    """Cliente httpx compartilhado de uma credencial dentro de um event loop."""
+
+    def __init__(self, config):
+        self.stats = PoolStats()
+        self.semaphore = asyncio.Semaphore(config['ASYNC_MAX_CONCURRENCY'])
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config['POOL_MAXSIZE'],
+                max_keepalive_connections=config['POOL_MAXSIZE'] if config['KEEP_ALIVE'] else 0,
+            ),
+            timeout=httpx.Timeout(config['READ_TIMEOUT'], connect=config['CONNECT_TIMEOUT']),
+            transport=httpx.AsyncHTTPTransport(retries=config['MAX_RETRIES']),
+        )
+
+    async def request(self, method, url, **kwargs):
+        async with self.semaphore:
+            self.stats.request_sent()
+            return await self.client.request(method, url, **kwargs)
+
+
+# event loop -> {chave da credencial: AsyncSessionPool}
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_session_pool(api_key, email):
+    loop = asyncio.get_running_loop()
+    pools = _async_pools.setdefault(loop, {})
+    key = credential_key(api_key, email)
+    pool = pools.get(key)
+    if pool is None:
+        pool = AsyncSessionPool(get_http_settings())
+        pools[key] = pool
+    return pool
+
+
+async def close_async_pools():
+    """Fecha os clientes do event loop atual (chamar no shutdown do servidor ASGI)."""
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.client.aclose()
+
+
+class AsyncCloudflareService:
+    def __init__(self, api_key, email):
+        self.api_key = api_key
+        self.email = email
+        self.pool = get_async_session_pool(api_key, email)
+        self.config = get_http_settings()
+        self.rate_limiter = get_rate_limiter(api_key, email)
+
+    async def _make_request(self, method, endpoint, data=None):
+        envelope = await self._send(method, endpoint, data)
+        return envelope["result"]
+
+    async def _send(self, method, endpoint, data=None):
+        headers = {
+            "X-Auth-Email": self.email,
+            "X-Auth-Key": self.api_key,
+            "Content-Type": "application/json",
+        }
+        url = f"{services.get_api_base_url()}{endpoint}"
+
+        try:
+            if method == "GET":
+                kwargs = {"params": data}
+            elif method in ("POST", "PUT", "DELETE"):
+                kwargs = {"json": data}
+            else:
+                raise ValueError("Método HTTP não suportado.")
+
+            attempt = 0
+            while True:
+                with span('throttle'):
+                    await self.rate_limiter.aacquire()
+                with span('cloudflare'):
+                    response = await self.pool.request(method, url, headers=headers, **kwargs)
+                if response.status_code != 429:
+                    break
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if await self.rate_limiter.arate_limited(attempt, retry_after) is None:
+                    break
+                attempt += 1
+
+            response.raise_for_status()
+            result = response.json()
+
+            if not result["success"]:
+                errors = "; ".join([err["message"] for err in result["errors"]])
+                raise CloudflareAPIError(f"Erro da API Cloudflare: {errors}")
+
+            return result
+
+        except CloudflareAPIError:
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                raise CloudflareRateLimitError(
+                    "Limite de requisições da API Cloudflare (HTTP 429).", retry_after or self.rate_limiter.config['BACKOFF_MAX'],
+                ) from e
+            try:
+                error_response = e.response.json()
+                errors = "; ".join([err["message"] for err in error_response["errors"]])
+                raise CloudflareAPIError(f"Erro da API Cloudflare (HTTP {e.response.status_code}): {errors}") from e
+            except (ValueError, KeyError, TypeError):
+                raise CloudflareAPIError(f"Erro da API Cloudflare (HTTP {e.response.status_code}): {e.response.text}") from e
+        except RateLimitExceeded as e:
+            raise CloudflareRateLimitError(f"Limite de requisições da API Cloudflare: {e}", e.retry_after) from e
+        except httpx.TimeoutException as e:
+            raise CloudflareAPIError(f"Tempo limite excedido ao conectar com a API Cloudflare: {e}") from e
+        except httpx.TransportError as e:
+            raise CloudflareAPIError(f"Erro de conexão com a API Cloudflare: {e}") from e
+        except Exception as e:
+            raise CloudflareAPIError(f"Erro inesperado ao chamar a API Cloudflare: {e}") from e
+
+    async def _paginate(self, endpoint, per_page, params=None, prefetch=None):
+        """Versão assíncrona de ``CloudflareService._paginate``."""
+        if prefetch is None:
+            prefetch = self.config['PREFETCH_PAGES']
+        params = dict(params or {})
+        params['per_page'] = per_page
+
+        def fetch(page):
+            return self._send("GET", endpoint, dict(params, page=page))
+
+        next_page = None
+        try:
+            page = 1
+            envelope = await fetch(page)
+            while True:
+                results = envelope.get("result") or []
+                info = envelope.get("result_info") or {}
+                total_pages = info.get("total_pages")
+                if total_pages is not None:
+                    has_next = page < total_pages
+                else:
+                    has_next = len(results) >= per_page
+
+                next_page = asyncio.ensure_future(fetch(page + 1)) if has_next and prefetch else None
+                for item in results:
+                    yield item
+
+                if not has_next:
+                    return
+                page += 1
+                envelope = await next_page if next_page else await fetch(page)
+                next_page = None
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    def iter_zones(self, per_page=None, prefetch=None):
+        return self._paginate("zones", per_page or self.config['ZONES_PER_PAGE'], prefetch=prefetch)
+
+    def iter_dns_records(self, zone_id, per_page=None, prefetch=None, params=None):
+        return self._paginate(
+            f"zones/{zone_id}/dns_records",
+            per_page or self.config['DNS_RECORDS_PER_PAGE'],
+            params=params,
+            prefetch=prefetch,
+        )
+
+    async def get_zones(self, per_page=None):
+        return [zone async for zone in self.iter_zones(per_page=per_page)]
+
+    async def get_dns_records(self, zone_id, per_page=None):
+        """Lista completa de registros DNS da zona, sempre lida da API (sem o cache de zonas)."""
+        return [record async for record in self.iter_dns_records(zone_id, per_page=per_page)]
+
+    def invalidate_zone(self, zone_id):
+        # Mantém o cache de leitura do cliente síncrono coerente com as escritas feitas aqui
+        get_record_cache().invalidate((credential_key(self.api_key, self.email), zone_id))
+
+    async def create_dns_record(self, zone_id, record_data):
+        try:
+            return await self._make_request("POST", f"zones/{zone_id}/dns_records", data=record_data)
+        finally:
+            self.invalidate_zone(zone_id)
+
+    async def delete_dns_record(self, zone_id, record_id):
+        try:
+            return await self._make_request("DELETE", f"zones/{zone_id}/dns_records/{record_id}")
+        finally:
+            self.invalidate_zone(zone_id)
+
+    async def update_dns_record(self, zone_id, record_id, record_data):
+        try:
+            return await self._make_request("PUT", f"zones/{zone_id}/dns_records/{record_id}", data=record_data)
+        finally:
+            self.invalidate_zone(zone_id)
+
+    async def get_a_aaaa_records(self, zone_id):
+        return [
+            record async for record in self.iter_dns_records(zone_id)
+            if record['type'] in ['A', 'AAAA']
+        ]
@@ -0,0 +1,153 @@
+"""
+Cache em memória (por processo) dos registros DNS de cada zona.
+
+``CloudflareService.get_dns_records`` lê através deste cache: entradas expiram
+após ``TTL`` segundos, as menos usadas são descartadas acima de
+``MAX_ENTRIES`` e requisições simultâneas para a mesma zona compartilham uma
+única chamada à Cloudflare (single-flight). As escritas de registros DNS
+invalidam a zona afetada, mas só neste processo: o cache serve apenas leituras
+de exibição, e quem grava a lista no banco (reconciliação, sincronização) lê
+com ``fresh=True``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_CACHE_SETTINGS = {
+    'TTL': 30,            # segundos; 0 desativa o cache
+    'MAX_ENTRIES': 1024,  # zonas mantidas em memória
+}
+
+
+def get_cache_settings():
+    config = dict(DEFAULT_CACHE_SETTINGS)
+    config.update(getattr(settings, 'CLOUDFLARE_CACHE', {}))
+    return config
+
+
+class _Flight:
+    """Carga em andamento de uma chave, aguardada pelas requisições concorrentes."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+
+class ZoneRecordCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get_or_load(self, key, loader, fresh=False):
+        """
+        Retorna o valor em cache ou executa ``loader`` (uma única vez por chave em paralelo).
+
+        Com ``fresh`` a entrada atual é descartada e uma carga já em andamento
+        não é aproveitada (pode ter começado antes de uma escrita): uma nova é
+        iniciada e passa a ser a aguardada pelas próximas requisições.
+        """
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            if fresh:
+                self._entries.pop(key, None)
+                stale = self._flights.pop(key, None)
+                if stale is not None:
+                    stale.invalidated = True
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                if not flight.invalidated:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            return flight.value
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            flight = self._flights.get(key)
+            if flight is not None:
+                # A carga em andamento pode ter lido o estado anterior à escrita
+                flight.invalidated = True
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_record_cache = None
+_record_cache_lock = threading.Lock()
+
+
+def get_record_cache():
+    global _record_cache
+    if _record_cache is None:
+        with _record_cache_lock:
+            if _record_cache is None:
+                config = get_cache_settings()
+                _record_cache = ZoneRecordCache(config['TTL'], config['MAX_ENTRIES'])
+    return _record_cache
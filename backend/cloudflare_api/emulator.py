@@ -0,0 +1,404 @@
+"""
+Emulador local da API da Cloudflare (zonas e registros DNS) para testes e benchmarks.
+
+Servidor HTTP em memória que responde nos mesmos caminhos de
+``https://api.cloudflare.com/client/v4/`` usados por ``CloudflareService``:
+
+- ``GET zones`` e ``GET zones/<id>``
+- ``GET/POST zones/<id>/dns_records`` e ``GET/PUT/PATCH/DELETE zones/<id>/dns_records/<id>``
+- ``POST graphql`` com as consultas de analytics de ``domains/analytics.py``
+  (``httpRequests1dGroups``/``httpRequests1hGroups``; números sintéticos e
+  determinísticos por zona e período)
+
+com paginação (``page``/``per_page`` e ``result_info``), envelopes
+``success``/``errors``/``messages``, latência configurável, injeção de erros
+5xx e limite de requisições por segundo (respostas 429 com ``Retry-After``).
+
+Uso: ``python manage.py run_cloudflare_emulator`` e
+``CLOUDFLARE_API_BASE_URL=http://127.0.0.1:8787/client/v4/``; ou, em código,
+``EmulatorServer(...).start()`` (ver ``benchmark_cloudflare``).
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/client/v4/'
+MAX_PER_PAGE = {'zones': 50, 'dns_records': 5000}
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _new_id():
+    return uuid.uuid4().hex
+
+
+@dataclass
+class EmulatorConfig:
+    latency_ms: float = 0.0         # latência fixa por requisição
+    jitter_ms: float = 0.0          # latência aleatória adicional (0..jitter)
+    error_rate: float = 0.0         # fração das requisições que falham com 500
+    rate_limit: int = 0             # requisições por segundo por credencial; 0 desativa
+    retry_after: int = 1            # valor do header Retry-After nas respostas 429
+    require_auth: bool = True       # exige X-Auth-Email/X-Auth-Key
+    seed: int = None                # semente para latência/erros reproduzíveis
+
+
+@dataclass
+class EmulatorStats:
+    requests: int = 0
+    errors_injected: int = 0
+    rate_limited: int = 0
+    by_route: dict = field(default_factory=dict)
+
+
+class ZoneStore:
+    """Zonas e registros DNS em memória (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zones = {}    # id -> zona
+        self.records = {}  # zone_id -> {record_id: registro}
+
+    def add_zone(self, name, status='active', zone_id=None):
+        zone_id = zone_id or _new_id()
+        now = _now()
+        zone = {
+            'id': zone_id, 'name': name, 'status': status, 'paused': False, 'type': 'full',
+            'created_on': now, 'modified_on': now,
+        }
+        with self._lock:
+            self.zones[zone_id] = zone
+            self.records[zone_id] = {}
+        return zone
+
+    def add_record(self, zone_id, data):
+        zone = self.zones[zone_id]
+        record = {
+            'id': data.get('id') or _new_id(),
+            'zone_id': zone_id,
+            'zone_name': zone['name'],
+            'type': data.get('type', 'A'),
+            'name': data.get('name', zone['name']),
+            'content': data.get('content', ''),
+            'ttl': data.get('ttl', 1),
+            'proxied': bool(data.get('proxied', False)),
+            'proxiable': True,
+            'created_on': _now(),
+            'modified_on': _now(),
+        }
+        if data.get('priority') is not None:
+            record['priority'] = data['priority']
+        with self._lock:
+            self.records[zone_id][record['id']] = record
+            zone['modified_on'] = record['modified_on']
+        return record
+
+    def update_record(self, zone_id, record_id, data, replace=True):
+        with self._lock:
+            record = self.records[zone_id][record_id]
+            fields = ('type', 'name', 'content', 'ttl', 'proxied', 'priority')
+            for name in fields:
+                if name in data:
+                    record[name] = data[name]
+                elif replace and name == 'priority':
+                    record.pop('priority', None)
+            record['modified_on'] = _now()
+            self.zones[zone_id]['modified_on'] = record['modified_on']
+            return record
+
+    def delete_record(self, zone_id, record_id):
+        with self._lock:
+            del self.records[zone_id][record_id]
+            self.zones[zone_id]['modified_on'] = _now()
+        return {'id': record_id}
+
+    def seed(self, zones=1, records_per_zone=10, prefix='zona'):
+        """Cria ``zones`` zonas com ``records_per_zone`` registros (metade A, metade CNAME)."""
+        created = []
+        for z in range(zones):
+            zone = self.add_zone(f'{prefix}{z}.example.com')
+            for r in range(records_per_zone):
+                if r % 2:
+                    data = {'type': 'CNAME', 'name': f'app{r}.{zone["name"]}', 'content': f'www0.{zone["name"]}'}
+                else:
+                    data = {'type': 'A', 'name': f'www{r}.{zone["name"]}', 'content': f'192.0.2.{r % 250 + 1}'}
+                self.add_record(zone['id'], data)
+            created.append(zone)
+        return created
+
+
+class _RateLimiter:
+    """Janela fixa de um segundo por credencial."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def allow(self, key):
+        if not self.limit:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window, count = self._windows.get(key, (second, 0))
+            if window != second:
+                window, count = second, 0
+            count += 1
+            self._windows[key] = (window, count)
+            return count <= self.limit
+
+
+def _envelope(result=None, errors=None, result_info=None):
+    body = {'success': not errors, 'errors': errors or [], 'messages': [], 'result': result}
+    if result_info is not None:
+        body['result_info'] = result_info
+    return body
+
+
+def _analytics_row(zone_id, bucket, hourly):
+    rng = random.Random(f'{zone_id}:{bucket}')
+    requests = rng.randint(100, 5000) if hourly else rng.randint(5000, 100000)
+    cached = int(requests * rng.uniform(0.2, 0.9))
+    return {
+        'dimensions': {'bucket': bucket},
+        'sum': {
+            'requests': requests,
+            'cachedRequests': cached,
+            'bytes': requests * rng.randint(1000, 20000),
+            'cachedBytes': cached * rng.randint(1000, 20000),
+            'threats': rng.randint(0, requests // 100),
+            'pageViews': int(requests * rng.uniform(0.1, 0.5)),
+        },
+        'uniq': {'uniques': int(requests * rng.uniform(0.05, 0.3))},
+    }
+
+
+def _analytics_series(zone_id, variables, hourly):
+    """Linhas de ``since`` a ``until`` (dias inclusivo; horas com ``until`` exclusivo)."""
+    if hourly:
+        current = datetime.fromisoformat(variables['since'].replace('Z', '+00:00'))
+        until = datetime.fromisoformat(variables['until'].replace('Z', '+00:00'))
+        step, buckets = timedelta(hours=1), []
+        while current < until:
+            buckets.append(current.strftime('%Y-%m-%dT%H:%M:%SZ'))
+            current += step
+    else:
+        current, until = date.fromisoformat(variables['since']), date.fromisoformat(variables['until'])
+        buckets = []
+        while current <= until:
+            buckets.append(current.isoformat())
+            current += timedelta(days=1)
+    return [_analytics_row(zone_id, bucket, hourly) for bucket in buckets[:int(variables.get('limit', 10000))]]
+
+
+def _paginate(items, query, resource):
+    try:
+        page = max(1, int(query.get('page', ['1'])[0]))
+        per_page = int(query.get('per_page', ['20'])[0])
+    except ValueError:
+        page, per_page = 1, 20
+    per_page = max(5, min(per_page, MAX_PER_PAGE[resource]))
+    total = len(items)
+    chunk = items[(page - 1) * per_page:page * per_page]
+    info = {
+        'page': page,
+        'per_page': per_page,
+        'count': len(chunk),
+        'total_count': total,
+        'total_pages': max(1, -(-total // per_page)),
+    }
+    return chunk, info
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'cloudflare-emulator'
+    disable_nagle_algorithm = True  # cabeçalhos e corpo saem em escritas separadas
+
+    def log_message(self, format, *args):
+        if self.server.emulator.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, code, message, headers=None):
+        self._send(status, _envelope(errors=[{'code': code, 'message': message}]), headers)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _dispatch(self, method):
+        emulator = self.server.emulator
+        config = emulator.config
+        url = urlparse(self.path)
+        if not url.path.startswith(API_PREFIX):
+            return self._error(404, 7000, 'No route for that URI')
+        parts = [part for part in url.path[len(API_PREFIX):].split('/') if part]
+        query = parse_qs(url.query)
+        route = '/'.join(part if position % 2 == 0 else ':id' for position, part in enumerate(parts))
+        emulator.count(route)
+
+        if config.latency_ms or config.jitter_ms:
+            time.sleep((config.latency_ms + emulator.random.uniform(0, config.jitter_ms)) / 1000)
+
+        email, key = self.headers.get('X-Auth-Email'), self.headers.get('X-Auth-Key')
+        if config.require_auth and not (email and key):
+            return self._error(400, 6003, 'Invalid request headers')
+        if not emulator.rate_limiter.allow(key or self.client_address[0]):
+            emulator.stats.rate_limited += 1
+            return self._error(429, 10000, 'Rate limited. Please wait and consider throttling your request speed',
+                               {'Retry-After': config.retry_after})
+        if config.error_rate and emulator.random.random() < config.error_rate:
+            emulator.stats.errors_injected += 1
+            return self._error(500, 10000, 'Internal server error (injetado pelo emulador)')
+
+        store = emulator.store
+        try:
+            if parts == ['graphql'] and method == 'POST':
+                return self._graphql()
+
+            if parts == ['zones'] and method == 'GET':
+                zones = list(store.zones.values())
+                if 'name' in query:
+                    zones = [zone for zone in zones if zone['name'] == query['name'][0]]
+                chunk, info = _paginate(zones, query, 'zones')
+                return self._send(200, _envelope(chunk, result_info=info))
+
+            if len(parts) >= 2 and parts[0] == 'zones':
+                zone_id = parts[1]
+                if zone_id not in store.zones:
+                    return self._error(404, 1001, 'Invalid zone identifier')
+                if len(parts) == 2 and method == 'GET':
+                    return self._send(200, _envelope(store.zones[zone_id]))
+                if len(parts) >= 3 and parts[2] == 'dns_records':
+                    return self._dns_records(method, zone_id, parts[3] if len(parts) > 3 else None, query)
+            return self._error(404, 7000, 'No route for that URI')
+        except KeyError:
+            return self._error(404, 81044, 'Record does not exist.')
+
+    def _dns_records(self, method, zone_id, record_id, query):
+        store = self.server.emulator.store
+        if record_id is None:
+            if method == 'GET':
+                records = list(store.records[zone_id].values())
+                for name in ('type', 'name', 'content'):
+                    if name in query:
+                        records = [record for record in records if record[name] == query[name][0]]
+                chunk, info = _paginate(records, query, 'dns_records')
+                return self._send(200, _envelope(chunk, result_info=info))
+            if method == 'POST':
+                data = self._body()
+                if not data or not data.get('type') or not data.get('name') or 'content' not in data:
+                    return self._error(400, 9000, 'DNS name, type and content are required')
+                data.pop('id', None)
+                return self._send(200, _envelope(store.add_record(zone_id, data)))
+            return self._error(405, 10000, 'Method not allowed')
+
+        if method == 'GET':
+            return self._send(200, _envelope(store.records[zone_id][record_id]))
+        if method in ('PUT', 'PATCH'):
+            data = self._body()
+            if data is None:
+                return self._error(400, 9207, 'Request body is invalid')
+            return self._send(200, _envelope(store.update_record(zone_id, record_id, data, replace=method == 'PUT')))
+        if method == 'DELETE':
+            return self._send(200, _envelope(store.delete_record(zone_id, record_id)))
+        return self._error(405, 10000, 'Method not allowed')
+
+    def _graphql(self):
+        body = self._body()
+        if not body or 'query' not in body:
+            return self._send(400, {'data': None, 'errors': [{'message': 'failed to parse request body'}]})
+        variables = body.get('variables') or {}
+        hourly = 'httpRequests1hGroups' in body['query']
+        zones = self.server.emulator.store.zones
+        try:
+            result = [
+                {'zoneTag': zone_id, 'series': _analytics_series(zone_id, variables, hourly)}
+                for zone_id in variables.get('zoneTags', []) if zone_id in zones
+            ]
+        except (KeyError, ValueError) as e:
+            return self._send(200, {'data': None, 'errors': [{'message': f'invalid variables: {e}'}]})
+        return self._send(200, {'data': {'viewer': {'zones': result}}, 'errors': None})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class EmulatorServer:
+    """Servidor do emulador; ``start()`` roda em uma thread, ``serve_forever()`` bloqueia."""
+
+    def __init__(self, host='127.0.0.1', port=0, config=None, store=None, verbose=False):
+        self.config = config or EmulatorConfig()
+        self.store = store or ZoneStore()
+        self.stats = EmulatorStats()
+        self.random = random.Random(self.config.seed)
+        self.rate_limiter = _RateLimiter(self.config.rate_limit)
+        self.verbose = verbose
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.emulator = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}{API_PREFIX}'
+
+    def count(self, route):
+        with self._stats_lock:
+            self.stats.requests += 1
+            self.stats.by_route[route] = self.stats.by_route.get(route, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='cloudflare-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
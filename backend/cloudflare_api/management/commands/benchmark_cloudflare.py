@@ -0,0 +1,226 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.test.runner import DiscoverRunner
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from cloudflare_api.cache import get_record_cache
+from cloudflare_api.emulator import EmulatorConfig, EmulatorServer
+from cloudflare_api.ratelimit import get_rate_limit_settings, reset_rate_limiters
+from domains.models import Domain
+from tenants.models import Tenant
+
+SMALL_ZONES = 4         # zonas pequenas que acompanham a zona grande em cada conta
+SMALL_ZONE_RECORDS = 10
+
+# Métricas comparadas com --compare (menor é melhor)
+COMPARED_METRICS = ('p50_ms', 'p99_ms', 'queries')
+
+
+def percentile(values, fraction):
+    """Percentil pelo método nearest-rank."""
+    ordered = sorted(values)
+    # round() evita que 0.99 * 100 = 99.00000000000001 suba para o próximo rank
+    index = max(0, min(len(ordered) - 1, math.ceil(round(fraction * len(ordered), 9)) - 1))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark ponta a ponta das views de tenant e registros DNS contra o emulador local '
+        'da Cloudflare, em um banco de testes descartável. Mede vazão, latência p50/p99 e '
+        'consultas SQL por requisição; --json grava o resultado e --compare mostra a '
+        'diferença para um resultado anterior (por exemplo, de outro commit).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,1000,50000', help='Registros DNS da zona principal, separados por vírgula.')
+        parser.add_argument('--iterations', type=int, default=5, help='Repetições de cada cenário.')
+        parser.add_argument('--latency-ms', type=float, default=0.0, help='Latência simulada da Cloudflare por requisição.')
+        parser.add_argument(
+            '--rate-limit', action='store_true',
+            help='Mantém o limite de requisições por credencial (CLOUDFLARE_RATE_LIMIT); por padrão é desativado.',
+        )
+        parser.add_argument('--json', dest='json_path', default=None, help='Arquivo para gravar o resultado em JSON.')
+        parser.add_argument('--compare', default=None, help='Resultado JSON anterior para comparação.')
+        parser.add_argument('--keepdb', action='store_true', help='Reaproveita o banco de testes.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes deve ser uma lista de inteiros separados por vírgula.')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations deve ser maior que zero.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fp:
+                baseline = json.load(fp)
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        old_config = runner.setup_databases()
+        rate_limit = dict(get_rate_limit_settings(), ENABLED=options['rate_limit'])
+        try:
+            with override_settings(CLOUDFLARE_RATE_LIMIT=rate_limit):
+                reset_rate_limiters()
+                results = []
+                for size in sizes:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'== Zona com {size} registros'))
+                    results.extend(self._run_size(size, options['iterations'], options['latency_ms']))
+        finally:
+            reset_rate_limiters()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        report = {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'latency_ms': options['latency_ms'],
+            'rate_limit': options['rate_limit'],
+            'results': results,
+        }
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as fp:
+                json.dump(report, fp, indent=2)
+            self.stdout.write(f"Resultado gravado em {options['json_path']}")
+        if baseline:
+            self._compare(baseline, report)
+
+    def _run_size(self, size, iterations, latency_ms):
+        server = EmulatorServer(config=EmulatorConfig(latency_ms=latency_ms))
+        large_zone = server.store.seed(1, size, prefix=f'bench{size}-')[0]
+        server.store.seed(SMALL_ZONES, SMALL_ZONE_RECORDS, prefix=f'small{size}-')
+
+        admin = User.objects.create_user(
+            username=f'bench{size}', email=f'bench{size}@example.com', password='bench',
+            first_name='Bench', last_name=str(size), role='admin',
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        payload = {'name': f'Bench {size}', 'cloudflare_api_key': f'key-{size}', 'cloudflare_email': f'cf{size}@example.com'}
+
+        results = []
+        with server, override_settings(CLOUDFLARE_API_BASE_URL=server.base_url):
+            tenant_ids = []
+
+            def create_tenant():
+                response = client.post('/api/admin/tenants/create/', payload, format='json')
+                tenant_ids.append(response.data.get('id'))
+                return response
+
+            def drop_tenant():
+                # Mantém só o último tenant criado para os cenários seguintes
+                Tenant.objects.filter(pk__in=tenant_ids[:-1]).delete()
+                del tenant_ids[:-1]
+
+            results.append(self._measure(size, 'tenant_create', iterations, server, create_tenant, after=drop_tenant))
+            tenant = Tenant.objects.get(pk=tenant_ids[-1])
+            domain = Domain.objects.get(tenant=tenant, cloudflare_zone_id=large_zone['id'])
+            sync_url = f'/api/admin/tenants/{tenant.pk}/sync-domains/'
+            cloudflare_url = f'/api/admin/domains/{domain.pk}/dns-records/cloudflare/'
+            local_url = f'/api/admin/domains/{domain.pk}/dns-records/'
+
+            results.append(self._measure(
+                size, 'tenant_sync_full', iterations, server,
+                lambda: client.post(sync_url, {}, format='json'),
+            ))
+            results.append(self._measure(
+                size, 'tenant_sync_incremental', iterations, server,
+                lambda: client.post(sync_url, {'incremental': True}, format='json'),
+            ))
+            results.append(self._measure(
+                size, 'cloudflare_records_list', iterations, server,
+                lambda: client.get(cloudflare_url), before=get_record_cache().clear,
+            ))
+            results.append(self._measure(size, 'local_records_list', iterations, server, lambda: client.get(local_url)))
+            results.append(self._measure(
+                size, 'local_records_page', iterations, server, lambda: client.get(local_url, {'page_size': 100}),
+            ))
+            counter = iter(range(iterations))
+            results.append(self._measure(
+                size, 'record_create', iterations, server,
+                lambda: client.post(cloudflare_url, {
+                    'type': 'CNAME', 'name': f'bench{next(counter)}.{domain.name}', 'content': domain.name,
+                }, format='json'),
+            ))
+        return results
+
+    def _measure(self, size, scenario, iterations, server, request, before=None, after=None):
+        durations, queries = [], []
+        requests_before = server.stats.requests
+        for _ in range(iterations):
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                durations.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(f'{scenario}: HTTP {response.status_code} {getattr(response, "data", "")}')
+            queries.append(len(captured))
+            if after:
+                after()
+
+        total = sum(durations)
+        result = {
+            'size': size,
+            'scenario': scenario,
+            'iterations': iterations,
+            'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+            'mean_ms': round(statistics.mean(durations) * 1000, 2),
+            'ops_per_s': round(iterations / total, 2) if total else None,
+            'queries': max(queries),
+            'cloudflare_requests': round((server.stats.requests - requests_before) / iterations, 1),
+        }
+        self.stdout.write(
+            f"{scenario:<26} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+            f"{result['ops_per_s'] or 0:>8.2f} op/s  {result['queries']:>5} consultas  "
+            f"{result['cloudflare_requests']:>6} req. Cloudflare"
+        )
+        return result
+
+    def _compare(self, baseline, report):
+        previous = {(item['size'], item['scenario']): item for item in baseline.get('results', [])}
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"== Comparação: {baseline.get('commit') or '?'} -> {report['commit'] or '?'}"
+        ))
+        for item in report['results']:
+            old = previous.get((item['size'], item['scenario']))
+            if old is None:
+                continue
+            deltas = []
+            for metric in COMPARED_METRICS:
+                before, after = old.get(metric), item.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                text = f'{metric} {before} -> {after} ({change:+.1f}%)'
+                if change > 10:
+                    text = self.style.ERROR(text)
+                elif change < -10:
+                    text = self.style.SUCCESS(text)
+                deltas.append(text)
+            self.stdout.write(f"{item['size']:>6} {item['scenario']:<26} " + '  '.join(deltas))
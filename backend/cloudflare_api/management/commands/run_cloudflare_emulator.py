@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from cloudflare_api.emulator import EmulatorConfig, EmulatorServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Inicia o emulador local da API da Cloudflare (zonas e registros DNS). '
+        'Aponte CLOUDFLARE_API_BASE_URL para a URL exibida.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8787)
+        parser.add_argument('--zones', type=int, default=3, help='Zonas criadas na inicialização.')
+        parser.add_argument('--records', type=int, default=10, help='Registros DNS por zona.')
+        parser.add_argument('--latency-ms', type=float, default=0.0, help='Latência fixa por requisição.')
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latência aleatória adicional.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fração das requisições respondidas com 500.')
+        parser.add_argument('--rate-limit', type=int, default=0, help='Requisições por segundo por credencial (429 acima disso).')
+        parser.add_argument('--no-auth', action='store_true', help='Não exige X-Auth-Email/X-Auth-Key.')
+        parser.add_argument('--verbose-requests', action='store_true', help='Registra cada requisição.')
+
+    def handle(self, *args, **options):
+        config = EmulatorConfig(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            require_auth=not options['no_auth'],
+        )
+        server = EmulatorServer(options['host'], options['port'], config, verbose=options['verbose_requests'])
+        for zone in server.store.seed(options['zones'], options['records']):
+            self.stdout.write(f"Zona {zone['name']} ({zone['id']}) com {options['records']} registros")
+        self.stdout.write(self.style.SUCCESS(f'Emulador da Cloudflare em {server.base_url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(f'Emulador encerrado ({server.stats.requests} requisições).')
+        finally:
+            server.httpd.server_close()
@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class RateLimitBucket(models.Model):
+    """Estado do token bucket de uma credencial da Cloudflare (ver ratelimit.py, ``SHARED``)."""
+    key = models.CharField(max_length=64, primary_key=True)  # credential_key(api_key, email)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()      # timestamp (time.time()) da última reposição
+    blocked_until = models.FloatField(default=0.0)  # pausa após um 429
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f} tokens"
@@ -0,0 +1,229 @@
+"""
+Pool de sessões HTTP reutilizáveis para a API da Cloudflare.
+
+Cada credencial (email + API key) recebe uma única ``requests.Session`` por
+processo, com conexões keep-alive e retry automático nos verbos idempotentes.
+Os contadores de cada pool (conexões novas x reutilizadas, tempo de handshake)
+podem ser consultados com ``pool_stats()``.
+"""
+import hashlib
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+from urllib3.util.retry import Retry
+
+DEFAULT_HTTP_SETTINGS = {
+    'POOL_CONNECTIONS': 10,     # quantidade de hosts distintos mantidos no pool
+    'POOL_MAXSIZE': 20,         # conexões simultâneas por host
+    'POOL_BLOCK': False,        # bloquear quando o pool estiver cheio
+    'KEEP_ALIVE': True,
+    'CONNECT_TIMEOUT': 5.0,     # segundos
+    'READ_TIMEOUT': 30.0,       # segundos
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF_FACTOR': 0.5,
+    'RETRY_STATUS_CODES': (500, 502, 503, 504),
+    'ZONES_PER_PAGE': 50,       # máximo aceito pela Cloudflare em /zones
+    'DNS_RECORDS_PER_PAGE': 500,
+    'PREFETCH_PAGES': True,     # busca a próxima página enquanto a atual é processada
+    'ASYNC_MAX_CONCURRENCY': 10,  # chamadas simultâneas por credencial no cliente assíncrono
+}
+
+# Apenas verbos idempotentes são reenviados automaticamente.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+def get_http_settings():
+    """Retorna a configuração HTTP efetiva (padrões + ``settings.CLOUDFLARE_HTTP``)."""
+    config = dict(DEFAULT_HTTP_SETTINGS)
+    config.update(getattr(settings, 'CLOUDFLARE_HTTP', {}))
+    return config
+
+
+def credential_key(api_key, email):
+    """Chave estável da credencial, sem expor a API key em memória de diagnóstico."""
+    digest = hashlib.sha256(f'{email}:{api_key}'.encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+class PoolStats:
+    """Contadores thread-safe de um pool de conexões."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def handshake_completed(self, seconds):
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            avg_handshake = self.handshake_seconds / self.handshakes if self.handshakes else 0.0
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(self.requests - self.new_connections, 0),
+                'handshake_ms_total': round(self.handshake_seconds * 1000, 3),
+                'handshake_ms_avg': round(avg_handshake * 1000, 3),
+            }
+
+
+class _InstrumentedPoolMixin:
+    stats = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        stats = self.stats
+        if stats is not None:
+            stats.connection_opened()
+            connect = conn.connect
+
+            def timed_connect():
+                started = time.perf_counter()
+                connect()
+                stats.handshake_completed(time.perf_counter() - started)
+
+            conn.connect = timed_connect
+        return conn
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _InstrumentedPoolManager(PoolManager):
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.pool_classes_by_scheme = {
+            'http': _InstrumentedHTTPConnectionPool,
+            'https': _InstrumentedHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """``HTTPAdapter`` que contabiliza conexões abertas e reutilizadas."""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _InstrumentedPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            stats=self.stats,
+            **pool_kwargs,
+        )
+
+    def send(self, request, **kwargs):
+        self.stats.request_sent()
+        return super().send(request, **kwargs)
+
+
+class CloudflareSessionPool:
+    """Sessão HTTP compartilhada de uma credencial."""
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = PoolStats()
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.session = self._build_session()
+
+    def _build_session(self):
+        config = self.config
+        retry = Retry(
+            total=config['MAX_RETRIES'],
+            connect=config['MAX_RETRIES'],
+            read=config['MAX_RETRIES'],
+            status=config['MAX_RETRIES'],
+            backoff_factor=config['RETRY_BACKOFF_FACTOR'],
+            status_forcelist=config['RETRY_STATUS_CODES'],
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+            # 429 é tratado pelo limitador de CloudflareService (ratelimit.py)
+            respect_retry_after_header=False,
+        )
+        adapter = InstrumentedHTTPAdapter(
+            self.stats,
+            pool_connections=config['POOL_CONNECTIONS'],
+            pool_maxsize=config['POOL_MAXSIZE'],
+            pool_block=config['POOL_BLOCK'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not config['KEEP_ALIVE']:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(api_key, email):
+    """Retorna (criando se necessário) o pool de sessão da credencial."""
+    key = credential_key(api_key, email)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = CloudflareSessionPool(get_http_settings())
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    """Contadores de todos os pools do processo, indexados pela chave da credencial."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {key: pool.stats.snapshot() for key, pool in pools}
+
+
+def close_all_pools():
+    """Fecha e descarta todos os pools (útil em testes e no shutdown do worker)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
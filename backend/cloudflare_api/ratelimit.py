@@ -0,0 +1,381 @@
+"""
+Limite de requisições à API da Cloudflare por credencial (token bucket).
+
+A Cloudflare aplica uma cota por conta (1200 requisições a cada 5 minutos) e
+responde 429 quando ela é excedida. Cada credencial recebe um bucket com
+``RATE`` tokens por segundo e capacidade ``BURST``, compartilhado por todas as
+threads do processo. Cada chamada reserva um token e, se o bucket estiver
+vazio, espera o tempo necessário para ele ser reposto. Em qualquer janela de
+5 minutos passam no máximo ``BURST + RATE * 300`` chamadas, por isso os
+padrões (20 + 3,9/s = 1190) ficam abaixo da cota.
+
+Os limitadores são criados uma vez por credencial e descartados quando
+``CLOUDFLARE_RATE_LIMIT`` muda (sinal ``setting_changed``, em
+``cloudflare_api/signals.py``).
+
+A espera por um token é limitada a ``MAX_WAIT`` (curta, para não prender o
+servidor web); acima disso a chamada falha com ``RateLimitExceeded``, que as
+views respondem com 503 e ``Retry-After``. Os processos em segundo plano
+(worker, comandos de auditoria) chamam ``use_background_waits()`` e esperam
+até ``WORKER_MAX_WAIT``.
+
+Com ``SHARED`` ativo o estado do bucket fica na tabela ``RateLimitBucket`` e é
+atualizado com ``SELECT ... FOR UPDATE``, coordenando vários processos
+(workers e servidores web) que usam a mesma credencial. A linha é travada em
+uma transação curta e própria: dentro de um ``atomic()`` do chamador a reserva
+roda em outra thread (outra conexão), para que a trava não dure a transação
+inteira do chamador.
+
+Ao receber 429, ``CloudflareService`` pausa o bucket pelo ``Retry-After`` (ou
+por um backoff exponencial com jitter, na falta dele), de modo que as demais
+threads também aguardem, e repete a chamada até ``MAX_RETRIES`` vezes. O
+tempo gasto esperando é contabilizado em ``rate_limit_stats()``.
+"""
+import asyncio
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from core.db import release_connections
+
+from .pool import credential_key
+
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    'ENABLED': True,
+    'RATE': 3.9,            # tokens por segundo; BURST + RATE * 300 <= 1200
+    'BURST': 20,            # capacidade do bucket
+    'SHARED': False,        # coordena os processos pelo banco (RateLimitBucket)
+    'MAX_RETRIES': 5,       # novas tentativas após um 429
+    'BACKOFF_BASE': 1.0,    # segundos; backoff exponencial sem Retry-After
+    'BACKOFF_MAX': 60.0,    # teto de cada espera
+    'MAX_WAIT': 5.0,        # espera máxima por um token nas requisições web
+    'WORKER_MAX_WAIT': 300.0,  # espera máxima no worker (use_background_waits)
+}
+
+_background_waits = False
+
+
+def use_background_waits():
+    """Processos em segundo plano (worker) esperam até ``WORKER_MAX_WAIT`` por um token."""
+    global _background_waits
+    _background_waits = True
+
+
+def get_rate_limit_settings():
+    config = dict(DEFAULT_RATE_LIMIT_SETTINGS)
+    config.update(getattr(settings, 'CLOUDFLARE_RATE_LIMIT', {}))
+    return config
+
+
+class RateLimitExceeded(Exception):
+    """A espera por um token excederia ``MAX_WAIT``; ``retry_after`` é a espera estimada, em segundos."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt, config, retry_after=None):
+    """
+    Espera antes da tentativa ``attempt`` (0 = primeira repetição).
+
+    Com ``Retry-After`` espera o valor informado mais um pequeno jitter (para
+    que as threads não voltem todas juntas); sem ele usa "full jitter" sobre
+    ``BACKOFF_BASE * 2**attempt``, limitado a ``BACKOFF_MAX``.
+    """
+    if retry_after is not None:
+        return min(retry_after, config['BACKOFF_MAX']) + random.uniform(0, config['BACKOFF_BASE'])
+    return random.uniform(0, min(config['BACKOFF_MAX'], config['BACKOFF_BASE'] * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    """Segundos do header ``Retry-After`` (apenas o formato numérico usado pela Cloudflare)."""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitStats:
+    """Contadores thread-safe do limitador de uma credencial."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+
+    def token_acquired(self, waited):
+        with self._lock:
+            self.acquired += 1
+            if waited > 0:
+                self.throttled += 1
+                self.throttled_seconds += waited
+
+    def token_acquired_late(self, waited):
+        with self._lock:
+            self.throttled_seconds += waited
+
+    def rate_limited_response(self, delay, retried):
+        with self._lock:
+            self.rate_limited += 1
+            self.backoff_seconds += delay
+            if retried:
+                self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'acquired': self.acquired,
+                'throttled': self.throttled,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'rate_limited_responses': self.rate_limited,
+                'retries': self.retries,
+                'backoff_seconds': round(self.backoff_seconds, 3),
+            }
+
+
+def _reserve(tokens, updated_at, blocked_until, now, rate, burst):
+    """
+    Calcula a reserva de um token e retorna ``(espera, tokens, updated_at)``.
+
+    Os tokens podem ficar negativos: cada chamada concorrente reserva o seu e
+    espera proporcionalmente, sem disputar o mesmo token. Nada é gravado aqui;
+    o bucket só aplica o novo estado se a espera for aceita.
+    """
+    start = max(now, blocked_until)
+    tokens = min(burst, tokens + max(start - updated_at, 0.0) * rate) - 1
+    wait = start - now
+    if tokens < 0:
+        wait += -tokens / rate
+    return wait, tokens, start
+
+
+class TokenBucket:
+    """Bucket em memória, compartilhado pelas threads do processo."""
+
+    shared = False
+
+    def __init__(self, key, rate, burst):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _clock(self):
+        return time.monotonic()
+
+    def reserve(self, max_wait=None):
+        """
+        Reserva um token e retorna quantos segundos esperar antes de usá-lo.
+
+        Se a espera passar de ``max_wait`` o token não é reservado (o bucket
+        fica intacto) e a espera é retornada mesmo assim.
+        """
+        with self._lock:
+            wait, tokens, updated_at = _reserve(
+                self.tokens, self.updated_at, self.blocked_until, self._clock(), self.rate, self.burst,
+            )
+            if max_wait is None or wait <= max_wait:
+                self.tokens, self.updated_at = tokens, updated_at
+        return wait
+
+    def blocked_for(self):
+        """Segundos restantes de uma pausa aplicada após um 429."""
+        with self._lock:
+            return max(self.blocked_until - self._clock(), 0.0)
+
+    def pause(self, seconds):
+        """Suspende a emissão de tokens (após um 429) e zera o bucket."""
+        with self._lock:
+            now = self._clock()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class DatabaseTokenBucket(TokenBucket):
+    """Bucket persistido em ``RateLimitBucket``, coordenando vários processos."""
+
+    shared = True
+
+    def _clock(self):
+        return time.time()  # relógio comum aos processos
+
+    def _locked_row(self):
+        from .models import RateLimitBucket
+
+        now = self._clock()
+        RateLimitBucket.objects.get_or_create(
+            key=self.key, defaults={'tokens': self.burst, 'updated_at': now, 'blocked_until': 0.0},
+        )
+        return RateLimitBucket.objects.select_for_update().get(key=self.key)
+
+    def _own_transaction(self, func, *args):
+        """
+        Executa ``func`` na própria transação. Dentro de um ``atomic()`` do
+        chamador, roda em outra thread (outra conexão): senão a trava da linha
+        só seria liberada no commit do chamador, serializando os processos.
+        """
+        if not transaction.get_connection().in_atomic_block:
+            return func(*args)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(release_connections(func), *args).result()
+
+    def _reserve_row(self, max_wait):
+        with transaction.atomic():
+            row = self._locked_row()
+            wait, tokens, updated_at = _reserve(
+                row.tokens, row.updated_at, row.blocked_until, self._clock(), self.rate, self.burst,
+            )
+            if max_wait is None or wait <= max_wait:
+                row.tokens, row.updated_at = tokens, updated_at
+                row.save(update_fields=['tokens', 'updated_at'])
+        return wait
+
+    def reserve(self, max_wait=None):
+        return self._own_transaction(self._reserve_row, max_wait)
+
+    def blocked_for(self):
+        from .models import RateLimitBucket
+
+        blocked_until = RateLimitBucket.objects.filter(key=self.key).values_list('blocked_until', flat=True).first()
+        return max((blocked_until or 0.0) - self._clock(), 0.0)
+
+    def _pause_row(self, seconds):
+        with transaction.atomic():
+            row = self._locked_row()
+            row.blocked_until = max(row.blocked_until, self._clock() + seconds)
+            row.tokens = min(row.tokens, 0.0)
+            row.save(update_fields=['tokens', 'blocked_until'])
+
+    def pause(self, seconds):
+        self._own_transaction(self._pause_row, seconds)
+
+
+class RateLimiter:
+    """Limitador de uma credencial: bucket + contadores."""
+
+    def __init__(self, key, config):
+        self.key = key
+        self.config = config
+        self.enabled = config['ENABLED'] and config['RATE'] > 0
+        bucket_class = DatabaseTokenBucket if config['SHARED'] else TokenBucket
+        self.bucket = bucket_class(key, float(config['RATE']), max(int(config['BURST']), 1))
+        self.stats = RateLimitStats()
+
+    @property
+    def max_wait(self):
+        return self.config['WORKER_MAX_WAIT'] if _background_waits else self.config['MAX_WAIT']
+
+    def _exceeded(self, wait):
+        return RateLimitExceeded(f'Espera de {wait:.0f}s pelo limite de requisições da Cloudflare.', wait)
+
+    def reserve(self):
+        """
+        Reserva um token; levanta ``RateLimitExceeded`` se a espera passar de
+        ``max_wait`` (nesse caso nenhum token é consumido).
+        """
+        if not self.enabled:
+            return 0.0
+        max_wait = self.max_wait
+        wait = max(self.bucket.reserve(max_wait), 0.0)
+        if wait > max_wait:
+            raise self._exceeded(wait)
+        self.stats.token_acquired(wait)
+        return wait
+
+    def _check_pause(self, wait, paused):
+        # A pausa também conta para ``max_wait``: o token já reservado é descartado
+        if wait + paused > self.max_wait:
+            raise self._exceeded(paused)
+        self.stats.token_acquired_late(paused)
+
+    def acquire(self):
+        """Bloqueia a thread até haver um token disponível; retorna o tempo esperado."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+            # Um 429 recebido por outra thread durante a espera pausa o bucket
+            paused = self.bucket.blocked_for()
+            if paused > 0:
+                self._check_pause(wait, paused)
+                time.sleep(paused)
+                wait += paused
+        return wait
+
+    async def _call(self, func, *args):
+        # O bucket compartilhado consulta o banco, o que não pode ocorrer no event loop
+        if self.bucket.shared:
+            return await sync_to_async(release_connections(func), thread_sensitive=False)(*args)
+        return func(*args)
+
+    async def aacquire(self):
+        """Versão assíncrona de ``acquire`` (não bloqueia o event loop)."""
+        wait = await self._call(self.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            paused = await self._call(self.bucket.blocked_for)
+            if paused > 0:
+                self._check_pause(wait, paused)
+                await asyncio.sleep(paused)
+                wait += paused
+        return wait
+
+    async def arate_limited(self, attempt, retry_after=None):
+        return await self._call(self.rate_limited, attempt, retry_after)
+
+    def rate_limited(self, attempt, retry_after=None):
+        """
+        Registra uma resposta 429 e pausa o bucket.
+
+        Retorna a espera aplicada, ou ``None`` quando as tentativas se esgotaram.
+        """
+        delay = backoff_delay(attempt, self.config, retry_after)
+        retry = attempt < self.config['MAX_RETRIES']
+        self.stats.rate_limited_response(delay if retry else 0.0, retry)
+        if not retry:
+            return None
+        self.bucket.pause(delay)
+        return delay
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key, email):
+    """Retorna (criando se necessário) o limitador da credencial."""
+    key = credential_key(api_key, email)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(key, get_rate_limit_settings())
+                _limiters[key] = limiter
+    return limiter
+
+
+def rate_limit_stats():
+    """Contadores de todos os limitadores do processo, indexados pela chave da credencial."""
+    with _limiters_lock:
+        limiters = list(_limiters.items())
+    return {key: limiter.stats.snapshot() for key, limiter in limiters}
+
+
+def reset_rate_limiters():
+    """Descarta os limitadores (útil em testes e ao mudar a configuração)."""
+    with _limiters_lock:
+        _limiters.clear()
@@ -1,51 +1,126 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from django.conf import settings
+
+from core.db import release_connections
+from core.instrumentation import propagate, span
+from .cache import get_record_cache
+from .pool import credential_key, get_http_settings, get_session_pool
+from .ratelimit import RateLimitExceeded, get_rate_limiter, parse_retry_after
 
 CLOUDFLARE_API_BASE_URL = "https://api.cloudflare.com/client/v4/"
 
+
+def get_api_base_url():
+    """URL base da API; ``settings.CLOUDFLARE_API_BASE_URL`` permite apontar para o emulador local."""
+    return getattr(settings, 'CLOUDFLARE_API_BASE_URL', None) or CLOUDFLARE_API_BASE_URL
+
+
+def copy_record(record):
+    """Cópia de um registro da API (os valores aninhados, como ``meta`` e ``tags``, também são copiados)."""
+    return {
+        key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for key, value in record.items()
+    }
+
+
 class CloudflareAPIError(Exception):
     pass
 
+
+class CloudflareRateLimitError(CloudflareAPIError):
+    """Cota de requisições da credencial esgotada; ``retry_after`` em segundos."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 class CloudflareService:
     def __init__(self, api_key, email):
         self.api_key = api_key
         self.email = email
+        self.pool = get_session_pool(api_key, email)
+        self.config = get_http_settings()
+        self.record_cache = get_record_cache()
+        self.rate_limiter = get_rate_limiter(api_key, email)
+
+    def _zone_cache_key(self, zone_id):
+        return (credential_key(self.api_key, self.email), zone_id)
+
+    def invalidate_zone(self, zone_id):
+        self.record_cache.invalidate(self._zone_cache_key(zone_id))
 
     def _make_request(self, method, endpoint, data=None):
+        return self._send(method, endpoint, data)["result"]
+
+    def _send(self, method, endpoint, data=None):
+        """Executa a chamada e retorna o envelope completo (result, result_info...)."""
+        result = self._call(method, endpoint, data)
+        if not result["success"]:
+            errors = "; ".join([err["message"] for err in result["errors"]])
+            raise CloudflareAPIError(f"Erro da API Cloudflare: {errors}")
+        return result
+
+    def graphql(self, query, variables=None):
+        """Consulta a API GraphQL (analytics) e retorna ``data``."""
+        result = self._call("POST", "graphql", {"query": query, "variables": variables or {}})
+        if result.get("errors"):
+            errors = "; ".join([err["message"] for err in result["errors"]])
+            raise CloudflareAPIError(f"Erro da API GraphQL da Cloudflare: {errors}")
+        return result["data"]
+
+    def _call(self, method, endpoint, data=None):
+        """Envia a requisição (limite de requisições, repetição após 429) e retorna o JSON da resposta."""
         headers = {
             "X-Auth-Email": self.email,
             "X-Auth-Key": self.api_key,
             "Content-Type": "application/json",
         }
-        url = f"{CLOUDFLARE_API_BASE_URL}{endpoint}"
+        url = f"{get_api_base_url()}{endpoint}"
 
         try:
             if method == "GET":
-                response = requests.get(url, headers=headers, params=data)
-            elif method == "POST":
-                response = requests.post(url, headers=headers, json=data)
-            elif method == "PUT":
-                response = requests.put(url, headers=headers, json=data)
-            elif method == "DELETE":
-                response = requests.delete(url, headers=headers, json=data)
+                kwargs = {"params": data}
+            elif method in ("POST", "PUT", "DELETE"):
+                kwargs = {"json": data}
             else:
                 raise ValueError("Método HTTP não suportado.")
 
-            response.raise_for_status()
-            result = response.json()
+            # Respeita a cota da credencial; um 429 pausa o bucket e a chamada é repetida
+            # (a Cloudflare não processa requisições limitadas, então repetir é seguro)
+            attempt = 0
+            while True:
+                with span('throttle'):
+                    self.rate_limiter.acquire()
+                with span('cloudflare'):
+                    response = self.pool.request(method, url, headers=headers, **kwargs)
+                if response.status_code != 429:
+                    break
+                delay = self.rate_limiter.rate_limited(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                if delay is None:
+                    break
+                attempt += 1
 
-            if not result["success"]:
-                errors = "; ".join([err["message"] for err in result["errors"]])
-                raise CloudflareAPIError(f"Erro da API Cloudflare: {errors}")
-
-            return result["result"]
+            response.raise_for_status()
+            return response.json()
 
         except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429:
+                # Tentativas esgotadas após respostas 429 da Cloudflare
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                raise CloudflareRateLimitError(
+                    "Limite de requisições da API Cloudflare (HTTP 429).", retry_after or self.rate_limiter.config['BACKOFF_MAX'],
+                ) from e
             try:
                 error_response = e.response.json()
                 errors = "; ".join([err["message"] for err in error_response["errors"]])
                 raise CloudflareAPIError(f"Erro da API Cloudflare (HTTP {e.response.status_code}): {errors}") from e
             except (ValueError, requests.exceptions.JSONDecodeError):
                 raise CloudflareAPIError(f"Erro da API Cloudflare (HTTP {e.response.status_code}): {e.response.text}") from e
+        except RateLimitExceeded as e:
+            raise CloudflareRateLimitError(f"Limite de requisições da API Cloudflare: {e}", e.retry_after) from e
         except requests.exceptions.ConnectionError as e:
             raise CloudflareAPIError(f"Erro de conexão com a API Cloudflare: {e}") from e
         except requests.exceptions.Timeout as e:
@@ -53,20 +128,93 @@ class CloudflareService:
         except Exception as e:
             raise CloudflareAPIError(f"Erro inesperado ao chamar a API Cloudflare: {e}") from e
 
-    def get_zones(self):
-        return self._make_request("GET", "zones")
+    def _paginate(self, endpoint, per_page, params=None, prefetch=None):
+        """
+        Percorre todas as páginas de um endpoint de listagem seguindo ``result_info``.
+
+        Os itens são entregues um a um (gerador), então zonas grandes são processadas
+        com memória constante. Com ``prefetch`` a próxima página é buscada em paralelo
+        enquanto a atual é consumida.
+        """
+        if prefetch is None:
+            prefetch = self.config['PREFETCH_PAGES']
+        params = dict(params or {})
+        params['per_page'] = per_page
+
+        def fetch(page):
+            return self._send("GET", endpoint, dict(params, page=page))
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = 1
+            envelope = fetch(page)
+            while True:
+                results = envelope.get("result") or []
+                info = envelope.get("result_info") or {}
+                total_pages = info.get("total_pages")
+                if total_pages is not None:
+                    has_next = page < total_pages
+                else:
+                    has_next = len(results) >= per_page
+
+                next_page = executor.submit(propagate(release_connections(fetch)), page + 1) if has_next and executor else None
+                yield from results
+
+                if not has_next:
+                    return
+                page += 1
+                envelope = next_page.result() if next_page else fetch(page)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
 
-    def get_dns_records(self, zone_id):
-        return self._make_request("GET", f"zones/{zone_id}/dns_records")
+    def iter_zones(self, per_page=None, prefetch=None):
+        return self._paginate("zones", per_page or self.config['ZONES_PER_PAGE'], prefetch=prefetch)
+
+    def iter_dns_records(self, zone_id, per_page=None, prefetch=None, params=None):
+        return self._paginate(
+            f"zones/{zone_id}/dns_records",
+            per_page or self.config['DNS_RECORDS_PER_PAGE'],
+            params=params,
+            prefetch=prefetch,
+        )
+
+    def get_zones(self, per_page=None):
+        """Lista completa de zonas (todas as páginas)."""
+        return list(self.iter_zones(per_page=per_page))
+
+    def get_dns_records(self, zone_id, per_page=None, fresh=False):
+        """
+        Lista completa de registros DNS da zona (todas as páginas).
+
+        Lê através do cache de zonas; ``fresh=True`` descarta a entrada atual e
+        força uma nova busca (que volta a popular o cache). Os registros
+        retornados são cópias: o chamador pode alterá-los sem afetar o cache.
+        """
+        records = self.record_cache.get_or_load(
+            self._zone_cache_key(zone_id),
+            lambda: list(self.iter_dns_records(zone_id, per_page=per_page)),
+            fresh=fresh,
+        )
+        return [copy_record(record) for record in records]
 
     def create_dns_record(self, zone_id, record_data):
-        return self._make_request("POST", f"zones/{zone_id}/dns_records", data=record_data)
+        try:
+            return self._make_request("POST", f"zones/{zone_id}/dns_records", data=record_data)
+        finally:
+            self.invalidate_zone(zone_id)
 
     def delete_dns_record(self, zone_id, record_id):
-        return self._make_request("DELETE", f"zones/{zone_id}/dns_records/{record_id}")
+        try:
+            return self._make_request("DELETE", f"zones/{zone_id}/dns_records/{record_id}")
+        finally:
+            self.invalidate_zone(zone_id)
 
     def update_dns_record(self, zone_id, record_id, record_data):
-        return self._make_request("PUT", f"zones/{zone_id}/dns_records/{record_id}", data=record_data)
+        try:
+            return self._make_request("PUT", f"zones/{zone_id}/dns_records/{record_id}", data=record_data)
+        finally:
+            self.invalidate_zone(zone_id)
 
     def get_a_aaaa_records(self, zone_id):
         all_records = self.get_dns_records(zone_id)
@@ -0,0 +1,12 @@
+"""Descarte dos limitadores de requisições quando a configuração muda."""
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .ratelimit import reset_rate_limiters
+
+
+@receiver(setting_changed)
+def rate_limit_setting_changed(sender, setting, **kwargs):
+    # Os limitadores guardam a configuração lida na criação (ver ratelimit.py)
+    if setting == 'CLOUDFLARE_RATE_LIMIT':
+        reset_rate_limiters()
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ValidateCloudflareEmailView
+from .views import ValidateCloudflareEmailView, CloudflarePoolStatsView
 
 urlpatterns = [
     path('validate-email/', ValidateCloudflareEmailView.as_view(), name='validate-cloudflare-email'),
+    path('pool-stats/', CloudflarePoolStatsView.as_view(), name='cloudflare-pool-stats'),
 ] 
\ No newline at end of file
@@ -1,8 +1,14 @@
+import math
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .services import CloudflareService, CloudflareAPIError
+from admin_api.permissions import IsAdminUser
+from .cache import get_record_cache
+from .pool import pool_stats
+from .ratelimit import rate_limit_stats
+from .services import CloudflareService, CloudflareAPIError, CloudflareRateLimitError
 
 class ValidateCloudflareEmailView(APIView):
     permission_classes = [IsAuthenticated]
@@ -14,9 +20,25 @@ class ValidateCloudflareEmailView(APIView):
         try:
             # Tenta buscar zonas para validar credenciais
             service = CloudflareService(api_key, email)
-            service.get_zones()
+            # Basta a primeira página para validar
+            next(iter(service.iter_zones(per_page=5, prefetch=False)), None)
             return Response({'valid': True})
+        except CloudflareRateLimitError as e:
+            # Cota esgotada não diz nada sobre a validade da credencial
+            return Response({'valid': None, 'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(math.ceil(e.retry_after))})
         except CloudflareAPIError as e:
             return Response({'valid': False, 'error': str(e)}, status=status.HTTP_200_OK)
         except Exception as e:
-            return Response({'valid': False, 'error': 'Erro inesperado: ' + str(e)}, status=status.HTTP_200_OK) 
\ No newline at end of file
+            return Response({'valid': False, 'error': 'Erro inesperado: ' + str(e)}, status=status.HTTP_200_OK)
+
+class CloudflarePoolStatsView(APIView):
+    """Contadores dos pools de conexão HTTP, do limite de requisições e do cache de zonas da Cloudflare neste processo."""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'pools': pool_stats(),
+            'rate_limits': rate_limit_stats(),
+            'record_cache': get_record_cache().stats(),
+        })
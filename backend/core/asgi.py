@@ -5,6 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Com CLOUDFLARE_ASYNC_VIEWS=True as rotas de registros DNS da Cloudflare usam
+as views assíncronas de admin_api/async_views.py, que não bloqueiam o event
+loop durante as chamadas à API.
+
+O progresso das sincronizações em segundo plano é transmitido por SSE em
+/api/admin/sync-jobs/<id>/events/ (SyncJobEventsView), por isso a aplicação é
+servida por aqui (``uvicorn core.asgi:application``, como no Dockerfile). Sob
+WSGI (inclusive ``manage.py runserver``) o Django consome o iterador assíncrono
+inteiro antes de enviar a resposta, e os eventos só chegariam com a tarefa
+encerrada.
 """
 
 import os
@@ -0,0 +1,58 @@
+"""
+Backend PostgreSQL do projeto (``ENGINE: 'core.db'``).
+
+É o backend do Django com métricas do pool de conexões (``DATABASE_POOL`` em
+``core/settings.py``): o tempo esperando por uma conexão entra na requisição
+como o span ``db_pool`` (``Server-Timing: db-wait``) e o esgotamento do pool
+gera o evento ``db.pool_exhausted``. ``database_pool_stats()`` devolve os
+contadores do pool deste processo.
+"""
+import os
+from functools import wraps
+
+from django.db import connections
+
+
+def database_pool_stats():
+    """Contadores dos pools abertos neste processo, indexados pelo alias do banco."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], '_connection_pools', {}).get(alias)
+        if pool is None:
+            continue
+        data = {
+            # Contadores que ainda não ocorreram não aparecem em get_stats()
+            'requests_num': 0, 'requests_queued': 0, 'requests_wait_ms': 0, 'requests_errors': 0,
+            'connections_lost': 0, 'returns_bad': 0,
+        }
+        data.update(pool.get_stats())
+        data['pid'] = os.getpid()
+        data['exhausted'] = data['requests_errors']
+        data['wait_ms_avg'] = round(data['requests_wait_ms'] / data['requests_queued'], 2) if data['requests_queued'] else 0.0
+        stats[alias] = data
+    return stats
+
+
+def _open_aliases():
+    return {conn.alias for conn in connections.all(initialized_only=True) if conn.connection is not None}
+
+
+def release_connections(func):
+    """
+    Devolve ao final de ``func`` as conexões que ela abriu na thread atual.
+
+    Para funções executadas em threads auxiliares (``ThreadPoolExecutor``):
+    o Django só fecha as conexões da thread da requisição, e uma conexão
+    esquecida em outra thread nunca volta ao pool. Conexões que já estavam
+    abertas antes da chamada (por exemplo, com uma transação em andamento)
+    não são tocadas.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        already_open = _open_aliases()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for alias in _open_aliases() - already_open:
+                connections[alias].close()
+    return wrapper
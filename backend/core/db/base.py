@@ -0,0 +1,29 @@
+from django.db.backends.postgresql import base
+
+from core.instrumentation import get_logger, span
+
+try:
+    from psycopg_pool import PoolTimeout
+except ImportError:  # sem psycopg_pool o pool não pode ser ativado
+    PoolTimeout = None
+
+logger = get_logger('core.db')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        if not self.pool:
+            return super().get_new_connection(conn_params)
+        try:
+            with span('db_pool'):
+                return super().get_new_connection(conn_params)
+        except PoolTimeout:
+            from . import database_pool_stats
+
+            stats = database_pool_stats().get(self.alias, {})
+            logger.warning(
+                'db.pool_exhausted', alias=self.alias, pid=stats.get('pid'),
+                size=stats.get('pool_size'), max_size=stats.get('pool_max'),
+                waiting=stats.get('requests_waiting'), exhausted=stats.get('exhausted'),
+            )
+            raise
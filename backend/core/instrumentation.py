@@ -0,0 +1,308 @@
+"""
+Instrumentação: eventos de log estruturados e medição de tempo por requisição.
+
+Eventos
+    ``get_logger(__name__)`` devolve um ``EventLogger``; ``logger.debug('evento',
+    campo=valor)`` só monta a mensagem se o nível estiver habilitado para o
+    módulo (níveis por módulo em ``LOGGING``, ver ``LOG_LEVELS`` em
+    ``core/settings.py``) e, para DEBUG, se a requisição foi sorteada pela
+    amostragem (``INSTRUMENTATION['SAMPLE_RATE']``). Valores podem ser
+    funções, avaliadas só na formatação, e campos sensíveis (senha, chave de
+    API, token) nunca são escritos.
+
+Tempos
+    ``InstrumentationMiddleware`` mede cada requisição e acumula o tempo gasto
+    no banco (todas as consultas e a espera por uma conexão do pool), em
+    chamadas à Cloudflare, esperando o limite de requisições e serializando
+    respostas (``span('nome')``). O
+    resultado é registrado no logger ``core.instrumentation``: em INFO para
+    requisições lentas e em DEBUG (amostrado) para as demais. Com
+    ``SERVER_TIMING_HEADER`` ativo também vai no cabeçalho ``Server-Timing``,
+    só para usuários autenticados da equipe (``is_staff`` ou papel admin): os
+    tempos de banco e da Cloudflare não são expostos a qualquer cliente. Trechos em threads auxiliares contam para a
+    requisição quando a função é embrulhada com ``propagate``.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+DEFAULT_INSTRUMENTATION_SETTINGS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,           # fração das requisições com eventos DEBUG
+    'SLOW_REQUEST_MS': 1000,      # requisições mais lentas são registradas em INFO
+    'SERVER_TIMING_HEADER': False,  # cabeçalho Server-Timing para a equipe (ver _exposes_timings)
+}
+
+SENSITIVE_FIELDS = frozenset(['password', 'senha', 'api_key', 'cloudflare_api_key', 'token', 'secret', 'authorization'])
+
+SPAN_LABELS = {'db': 'db', 'db_pool': 'db-wait', 'cloudflare': 'cf', 'throttle': 'cf-wait', 'serialize': 'ser'}
+
+
+def get_instrumentation_settings():
+    config = dict(DEFAULT_INSTRUMENTATION_SETTINGS)
+    config.update(getattr(settings, 'INSTRUMENTATION', {}))
+    return config
+
+
+class RequestTimings:
+    """Tempos acumulados de uma requisição (compartilhado com as threads auxiliares)."""
+
+    def __init__(self, sampled=True):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.totals = {}   # span -> segundos
+        self.counts = {}   # span -> chamadas
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self):
+        with self._lock:
+            data = {f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.totals.items()}
+            data.update({f'{name}_count': count for name, count in self.counts.items()})
+        return data
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_open_spans = contextvars.ContextVar('open_spans', default=())
+
+
+def current_timings():
+    return _current.get()
+
+
+def is_sampled():
+    """Eventos DEBUG desta requisição devem ser registrados? (fora de requisições, sempre)."""
+    timings = _current.get()
+    return timings is None or timings.sampled
+
+
+class span:
+    """
+    Mede um trecho e soma o tempo à requisição atual.
+
+    Custa uma leitura de ``ContextVar`` fora de requisições instrumentadas.
+    Spans com o mesmo nome aninhados (ex.: serializers aninhados) contam só
+    o externo.
+    """
+    __slots__ = ('name', 'timings', 'started', 'token')
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        timings = _current.get()
+        if timings is not None:
+            open_spans = _open_spans.get()
+            if self.name not in open_spans:
+                self.timings = timings
+                self.token = _open_spans.set(open_spans + (self.name,))
+                self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.started)
+            _open_spans.reset(self.token)
+            self.timings = None
+        return False
+
+
+def propagate(func):
+    """Faz ``func``, executada em outra thread, contar para a requisição atual."""
+    timings = _current.get()
+    if timings is None:
+        return func
+
+    def wrapper(*args, **kwargs):
+        token = _current.set(timings)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+class TimedSerializerMixin:
+    """Soma o tempo de ``to_representation`` ao span ``serialize`` (serializers do DRF)."""
+
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+# ---------------------------------------------------------------------------
+# Eventos de log
+
+def _format_value(key, value):
+    if key.lower() in SENSITIVE_FIELDS:
+        return '***'
+    if callable(value):
+        value = value()
+    text = str(value)
+    if not text or any(char.isspace() or char in '"=' for char in text):
+        text = '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return text
+
+
+class LazyEvent:
+    """Mensagem no formato ``evento chave=valor``, montada apenas se for emitida."""
+    __slots__ = ('event', 'fields')
+
+    def __init__(self, event, fields):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        if not self.fields:
+            return self.event
+        pairs = ' '.join(f'{key}={_format_value(key, value)}' for key, value in self.fields.items())
+        return f'{self.event} {pairs}'
+
+
+class EventLogger:
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, event, fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.INFO and not is_sampled():
+            return
+        self.logger.log(level, LazyEvent(event, fields), extra={'event': event}, stacklevel=3)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+logger = get_logger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+
+def _add_db_wrapper(wrapper):
+    # A conexão é da thread atual: chamar via sync_to_async na thread da requisição
+    connection.execute_wrappers.append(wrapper)
+
+
+def _remove_db_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+def _exposes_timings(request):
+    """Os tempos só vão no cabeçalho para usuários autenticados da equipe."""
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and (user.is_staff or getattr(user, 'role', None) == 'admin'))
+
+
+class InstrumentationMiddleware:
+    """
+    Mede a requisição; funciona nas pilhas WSGI e ASGI.
+
+    No modo assíncrono o ORM roda em ``sync_to_async`` (na thread dedicada à
+    requisição pelo ``ASGIHandler``), por isso o medidor de consultas é
+    instalado e removido na conexão daquela thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_instrumentation_settings()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        config = self.config
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        timings = RequestTimings(sampled=random.random() < config['SAMPLE_RATE'])
+        token = _current.set(timings)
+        try:
+            with connection.execute_wrapper(timings.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        config = self.config
+        if not config['ENABLED']:
+            return await self.get_response(request)
+
+        timings = RequestTimings(sampled=random.random() < config['SAMPLE_RATE'])
+        token = _current.set(timings)
+        try:
+            await sync_to_async(_add_db_wrapper)(timings.db_wrapper)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(_remove_db_wrapper)(timings.db_wrapper)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        config = self.config
+        total_ms = timings.elapsed_ms()
+        if config['SERVER_TIMING_HEADER'] and _exposes_timings(request):
+            metrics = [
+                f'{SPAN_LABELS.get(name, name)};dur={seconds * 1000:.1f}'
+                for name, seconds in sorted(timings.totals.items())
+            ]
+            metrics.append(f'total;dur={total_ms:.1f}')
+            response['Server-Timing'] = ', '.join(metrics)
+
+        if total_ms >= config['SLOW_REQUEST_MS']:
+            level = logging.INFO
+        elif timings.sampled:
+            level = logging.DEBUG
+        else:
+            return response
+        if logger.logger.isEnabledFor(level):
+            logger.logger.log(level, LazyEvent('request', dict(
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+                total_ms=round(total_ms, 2),
+                **timings.summary(),
+            )), extra={'event': 'request'})
+        return response
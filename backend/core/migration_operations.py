@@ -0,0 +1,61 @@
+"""
+Operações de migração para criar índices sem bloquear tabelas grandes.
+
+No PostgreSQL os índices são criados com ``CREATE INDEX CONCURRENTLY`` (a
+migração que as usa precisa de ``atomic = False``); nos demais bancos caem no
+comportamento padrão de ``AddIndex``/``AddConstraint``.
+"""
+from django.db import migrations
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """``AddIndex`` que usa ``CONCURRENTLY`` no PostgreSQL."""
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """
+    ``AddConstraint`` para ``UniqueConstraint`` simples (só campos, sem condição).
+
+    No PostgreSQL cria primeiro o índice único com ``CONCURRENTLY`` e depois o
+    promove a constraint com ``ADD CONSTRAINT ... UNIQUE USING INDEX``, que só
+    altera o catálogo. Um índice inválido deixado por uma tentativa anterior
+    que falhou é removido antes.
+    """
+
+    def describe(self):
+        return f'Concurrently create constraint {self.constraint.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        name = self.constraint.name
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in self.constraint.fields)
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}')
+        schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {quote(name)} ON {quote(table)} ({columns})')
+        schema_editor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} UNIQUE USING INDEX {quote(name)}')
@@ -0,0 +1,169 @@
+"""
+Paginação por cursor (keyset) usada como padrão nas listagens da API.
+
+O cursor guarda os valores de todas as chaves de ordenação do último item da
+página (ex.: ``created_at`` e ``pk``) e a página seguinte é lida com uma
+comparação composta (``WHERE (created_at, pk) < (posição) LIMIT n``, escrita
+como ``created_at < x OR (created_at = x AND pk < y)``), sem ``OFFSET``, mesmo
+com valores repetidos na primeira chave: a página N custa o mesmo que a
+primeira. A ordenação vem do atributo ``ordering`` da view ou, na falta dele,
+do ``order_by`` do queryset; a chave primária é sempre acrescentada como
+desempate. As chaves de ordenação não podem ser nulas.
+
+Enquanto ``API_PAGINATION['OPT_IN']`` estiver ativo, apenas requisições com
+``cursor`` ou ``page_size`` na query string recebem o envelope paginado; as
+demais continuam recebendo uma lista (compatibilidade com o frontend atual),
+mas limitada a ``UNPAGINATED_MAX`` itens. Quando há mais itens, o header
+``Link: <...>; rel="next"`` aponta para a continuação (já paginada).
+"""
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from functools import reduce
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+DEFAULT_PAGINATION_SETTINGS = {
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 500,
+    'OPT_IN': True,
+    'UNPAGINATED_MAX': 1000,  # itens de uma listagem sem ?cursor= / ?page_size= (OPT_IN)
+}
+
+
+def get_pagination_settings():
+    config = dict(DEFAULT_PAGINATION_SETTINGS)
+    config.update(getattr(settings, 'API_PAGINATION', {}))
+    return config
+
+
+class KeysetCursorPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    ordering = '-pk'
+    opt_in = None  # None = usa API_PAGINATION['OPT_IN']
+
+    def __init__(self):
+        config = get_pagination_settings()
+        self.page_size = config['PAGE_SIZE']
+        self.max_page_size = config['MAX_PAGE_SIZE']
+        self.unpaginated_max = config['UNPAGINATED_MAX']
+        if self.opt_in is None:
+            self.opt_in = config['OPT_IN']
+        self.bare = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        # Sem parâmetros de paginação (OPT_IN): lista simples, mas com limite
+        self.bare = self.opt_in and not (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+        self.page_size = self.unpaginated_max if self.bare else self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = tuple(_invert(field) for field in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.bare:
+            return super().get_paginated_response(data)
+        next_link = self.get_next_link()
+        return Response(data, headers={'Link': f'<{next_link}>; rel="next"'} if next_link else None)
+
+    def decode_cursor(self, request):
+        """``(posição, reverso)`` do cursor da requisição (``(None, False)`` na primeira página)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = data['p'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        encoded = b64encode(json.dumps({'p': position, 'r': int(reverse)}).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _position(self, item):
+        return [_cursor_value(_field_value(item, field.lstrip('-'))) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or queryset.query.order_by or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering += ('-pk' if ordering[0].startswith('-') else 'pk',)
+        return ordering
+
+
+class StrictKeysetCursorPagination(KeysetCursorPagination):
+    """Sempre pagina (endpoints novos, sem consumidores que esperam a lista completa)."""
+    opt_in = False
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _after(ordering, position):
+    """Itens depois de ``position`` na ordem ``ordering`` (comparação lexicográfica das chaves)."""
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {other.lstrip('-'): value for other, value in zip(ordering[:index], position[:index])}
+        condition |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+    return condition
+
+
+def _field_value(item, name):
+    if name == 'pk':
+        return item.pk
+    return reduce(getattr, name.split('__'), item)
+
+
+def _cursor_value(value):
+    # isoformat mantém os microssegundos (o DjangoJSONEncoder os truncaria)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
@@ -64,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,11 +77,22 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Paginação por cursor (keyset) em todas as listagens; ver core/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetCursorPagination',
+}
+
+API_PAGINATION = {
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '100')),
+    'MAX_PAGE_SIZE': int(os.getenv('API_MAX_PAGE_SIZE', '500')),
+    # Enquanto ativo, só devolve o envelope paginado a quem envia ?cursor= ou ?page_size=
+    'OPT_IN': os.getenv('API_PAGINATION_OPT_IN', 'True') == 'True',
+    # Sem paginação pedida, a lista é cortada nesse limite (header Link com a continuação)
+    'UNPAGINATED_MAX': int(os.getenv('API_UNPAGINATED_MAX', '1000')),
 }
 
 SIMPLE_JWT = {
@@ -89,6 +101,16 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.CustomTokenRefreshSerializer',
+}
+
+# Usuário autenticado a partir dos claims do JWT, sem carregá-lo do banco (accounts/authentication.py)
+JWT_PRINCIPAL = {
+    'ENABLED': os.getenv('JWT_PRINCIPAL_ENABLED', 'True') == 'True',
+    # Só usado com um cache compartilhado (CACHES); com o cache local a versão é lida do banco
+    'VERSION_CACHE_TIMEOUT': int(os.getenv('JWT_TOKEN_VERSION_CACHE_TIMEOUT', '60')),
+    'SCOPE_MAX_IDS': int(os.getenv('JWT_SCOPE_MAX_IDS', '100')),
 }
 
 # CORS para desenvolvimento
@@ -135,14 +157,38 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Pool de conexões do psycopg 3, um por processo (o total no PostgreSQL é
+# workers x MAX_SIZE). Sem pool, as conexões são persistentes (CONN_MAX_AGE).
+DATABASE_POOL = {
+    'ENABLED': os.getenv('DB_POOL_ENABLED', 'True') == 'True',
+    'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),            # espera máxima por uma conexão livre
+    'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', '300')),         # conexões ociosas acima de MIN_SIZE são fechadas
+    'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db',
         'NAME': os.getenv('POSTGRES_DB', 'cloudflare_db'),
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # Testa a conexão antes de entregá-la (no pool, ao retirá-la)
+        'CONN_HEALTH_CHECKS': True,
+        'CONN_MAX_AGE': 0 if DATABASE_POOL['ENABLED'] else int(os.getenv('CONN_MAX_AGE', '60')),
+        'OPTIONS': {
+            'pool': {
+                'name': 'default',
+                'min_size': DATABASE_POOL['MIN_SIZE'],
+                'max_size': DATABASE_POOL['MAX_SIZE'],
+                'timeout': DATABASE_POOL['TIMEOUT'],
+                'max_idle': DATABASE_POOL['MAX_IDLE'],
+                'max_lifetime': DATABASE_POOL['MAX_LIFETIME'],
+            },
+        } if DATABASE_POOL['ENABLED'] else {},
     }
 }
 # Password validation
@@ -181,11 +227,109 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Arquivos enviados (ex.: zonas grandes à espera do worker, ver domains/zonefile.py).
+# Com vários servidores, o diretório (ou o storage) precisa ser compartilhado com os workers.
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# URL base da API da Cloudflare (aponte para o emulador local para testes e benchmarks)
+CLOUDFLARE_API_BASE_URL = os.getenv('CLOUDFLARE_API_BASE_URL', 'https://api.cloudflare.com/client/v4/')
+
+# Pool de conexões HTTP com a API da Cloudflare (ver cloudflare_api/pool.py)
+CLOUDFLARE_HTTP = {
+    'POOL_CONNECTIONS': int(os.getenv('CLOUDFLARE_POOL_CONNECTIONS', '10')),
+    'POOL_MAXSIZE': int(os.getenv('CLOUDFLARE_POOL_MAXSIZE', '20')),
+    'KEEP_ALIVE': os.getenv('CLOUDFLARE_KEEP_ALIVE', 'True') == 'True',
+    'CONNECT_TIMEOUT': float(os.getenv('CLOUDFLARE_CONNECT_TIMEOUT', '5')),
+    'READ_TIMEOUT': float(os.getenv('CLOUDFLARE_READ_TIMEOUT', '30')),
+    'MAX_RETRIES': int(os.getenv('CLOUDFLARE_MAX_RETRIES', '3')),
+    'DNS_RECORDS_PER_PAGE': int(os.getenv('CLOUDFLARE_DNS_RECORDS_PER_PAGE', '500')),
+}
+
+# Cache em memória dos registros DNS por zona (ver cloudflare_api/cache.py)
+CLOUDFLARE_CACHE = {
+    'TTL': int(os.getenv('CLOUDFLARE_CACHE_TTL', '30')),
+    'MAX_ENTRIES': int(os.getenv('CLOUDFLARE_CACHE_MAX_ENTRIES', '1024')),
+}
+
+# Limite de requisições por credencial da Cloudflare (ver cloudflare_api/ratelimit.py)
+CLOUDFLARE_RATE_LIMIT = {
+    'ENABLED': os.getenv('CLOUDFLARE_RATE_LIMIT_ENABLED', 'True') == 'True',
+    'RATE': float(os.getenv('CLOUDFLARE_RATE_LIMIT_RATE', '3.9')),
+    'BURST': int(os.getenv('CLOUDFLARE_RATE_LIMIT_BURST', '20')),
+    'SHARED': os.getenv('CLOUDFLARE_RATE_LIMIT_SHARED', 'False') == 'True',
+    'MAX_RETRIES': int(os.getenv('CLOUDFLARE_RATE_LIMIT_MAX_RETRIES', '5')),
+    'MAX_WAIT': float(os.getenv('CLOUDFLARE_RATE_LIMIT_MAX_WAIT', '5')),
+    'WORKER_MAX_WAIT': float(os.getenv('CLOUDFLARE_RATE_LIMIT_WORKER_MAX_WAIT', '300')),
+}
+
+# Sincronização Cloudflare -> banco local (ver domains/sync.py)
+CLOUDFLARE_SYNC = {
+    'MAX_WORKERS': int(os.getenv('CLOUDFLARE_SYNC_MAX_WORKERS', '8')),
+    'BATCH_SIZE': int(os.getenv('CLOUDFLARE_SYNC_BATCH_SIZE', '1000')),
+    'STALE_AFTER_SECONDS': int(os.getenv('CLOUDFLARE_SYNC_STALE_AFTER', '300')),
+    'WORKER_POLL_SECONDS': int(os.getenv('CLOUDFLARE_SYNC_POLL_SECONDS', '5')),
+    'MUTATION_MAX_WORKERS': int(os.getenv('CLOUDFLARE_MUTATION_MAX_WORKERS', '8')),
+    'MUTATION_MAX_OPERATIONS': int(os.getenv('CLOUDFLARE_MUTATION_MAX_OPERATIONS', '1000')),
+    'IMPORT_BATCH_SIZE': int(os.getenv('CLOUDFLARE_IMPORT_BATCH_SIZE', '500')),
+}
+
+# Analytics das zonas (domains/analytics.py), coletados pelo run_sync_worker
+CLOUDFLARE_ANALYTICS = {
+    'ZONES_PER_QUERY': int(os.getenv('CLOUDFLARE_ANALYTICS_ZONES_PER_QUERY', '10')),
+    'DAYS_PER_QUERY': int(os.getenv('CLOUDFLARE_ANALYTICS_DAYS_PER_QUERY', '31')),
+    'BACKFILL_DAYS': int(os.getenv('CLOUDFLARE_ANALYTICS_BACKFILL_DAYS', '90')),
+    'HOURLY_DAYS': int(os.getenv('CLOUDFLARE_ANALYTICS_HOURLY_DAYS', '3')),
+    'HOURLY_RETENTION_DAYS': int(os.getenv('CLOUDFLARE_ANALYTICS_HOURLY_RETENTION_DAYS', '30')),
+    'REFRESH_MINUTES': int(os.getenv('CLOUDFLARE_ANALYTICS_REFRESH_MINUTES', '60')),
+}
+
+# Usa as views assíncronas (admin_api/async_views.py) nas rotas que chamam a Cloudflare.
+# Ative apenas quando servido via ASGI (ex.: uvicorn core.asgi:application).
+CLOUDFLARE_ASYNC_VIEWS = os.getenv('CLOUDFLARE_ASYNC_VIEWS', 'False') == 'True'
+
+# Instrumentação por requisição (ver core/instrumentation.py)
+INSTRUMENTATION = {
+    'ENABLED': os.getenv('INSTRUMENTATION_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '1.0')),
+    'SLOW_REQUEST_MS': int(os.getenv('INSTRUMENTATION_SLOW_REQUEST_MS', '1000')),
+    # Cabeçalho Server-Timing, enviado só para usuários da equipe (is_staff ou admin)
+    'SERVER_TIMING_HEADER': os.getenv('INSTRUMENTATION_SERVER_TIMING', 'False') == 'True',
+}
+
+# Níveis de log: LOG_LEVEL para os apps do projeto e LOG_LEVELS para ajustar
+# módulos específicos, ex.: LOG_LEVELS="admin_api.serializers=DEBUG,core.instrumentation=DEBUG"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = {'core': LOG_LEVEL, 'accounts': LOG_LEVEL, 'admin_api': LOG_LEVEL, 'tenants': LOG_LEVEL,
+              'domains': LOG_LEVEL, 'cloudflare_api': LOG_LEVEL, 'cloudflare_keys': LOG_LEVEL}
+for item in filter(None, os.getenv('LOG_LEVELS', '').split(',')):
+    module, _, level = item.partition('=')
+    LOG_LEVELS[module.strip()] = level.strip().upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        module: {'handlers': ['console'], 'level': level, 'propagate': False}
+        for module, level in LOG_LEVELS.items()
+    },
+}
+
+# Escopo de tenants por usuário (accounts/scope.py); > 0 também guarda em cache entre requisições
+TENANT_SCOPE = {
+    'CACHE_TIMEOUT': int(os.getenv('TENANT_SCOPE_CACHE_TIMEOUT', '0')),
+}
+
 # DRF Spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Unigate API',
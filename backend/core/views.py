@@ -1,9 +1,12 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import connection
 
+from admin_api.permissions import IsAdminUser
+from .db import database_pool_stats
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
@@ -31,4 +34,11 @@ def health_check(request):
                 "message": f"Health check failed: {str(e)}"
             },
             status=status.HTTP_503_SERVICE_UNAVAILABLE
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def db_pool_stats(request):
+    """Contadores do pool de conexões do banco neste processo (worker)."""
+    return Response({'pools': database_pool_stats()})
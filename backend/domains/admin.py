@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Domain, DNSRecord
+from .models import Domain, DNSRecord, SyncJob
 
 admin.site.register(Domain)
 admin.site.register(DNSRecord)
+admin.site.register(SyncJob)
@@ -0,0 +1,304 @@
+"""
+Analytics de tráfego das zonas, guardados localmente (modelo ``ZoneAnalytics``).
+
+A coleta roda em segundo plano (tarefa ``tenant_analytics`` da fila do
+``run_sync_worker``): para cada tenant, ou seja, para cada credencial, uma
+consulta GraphQL cobre até ``ZONES_PER_QUERY`` zonas e ``DAYS_PER_QUERY``
+dias, e o resultado é gravado em lote (upsert). Cada domínio guarda até onde
+a coleta está completa (``analytics_day_through``/``analytics_hour_through``):
+a marca só avança pelas janelas consecutivas que funcionaram, então uma
+janela com erro é buscada de novo na coleta seguinte, e zonas sem tráfego
+(sem linhas) não voltam ao histórico completo. Domínios novos recebem
+``BACKFILL_DAYS`` dias de histórico; os demais, só os períodos a partir da
+marca. Dados horários cobrem as últimas ``HOURLY_DAYS`` e são descartados
+após ``HOURLY_RETENTION_DAYS``.
+
+Dashboards leem apenas a tabela (``query_series``), com agregação por hora,
+dia, semana ou mês, sem chamadas à Cloudflare. ``uniques`` não é aditivo: em
+agregações de vários dias ou domínios é a soma dos visitantes únicos de cada
+período (um limite superior).
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from cloudflare_api.services import CloudflareService, CloudflareAPIError
+from core.db import release_connections
+from core.instrumentation import get_logger, propagate
+from .models import Domain, SyncJob, ZoneAnalytics
+from .sync import get_sync_settings
+
+logger = get_logger(__name__)
+
+DEFAULT_ANALYTICS_SETTINGS = {
+    'ZONES_PER_QUERY': 10,         # zonas por consulta GraphQL
+    'DAYS_PER_QUERY': 31,          # dias por consulta (dados diários)
+    'BACKFILL_DAYS': 90,           # histórico buscado para domínios novos
+    'HOURLY_DAYS': 3,              # janela dos dados horários
+    'HOURLY_RETENTION_DAYS': 30,
+    'REFRESH_MINUTES': 60,         # intervalo da coleta periódica; 0 desativa
+    'MAX_RANGE_DAYS': 366,         # maior intervalo aceito nas consultas da API
+}
+
+METRICS = ('requests', 'cached_requests', 'bytes', 'cached_bytes', 'threats', 'page_views', 'uniques')
+
+# Campo local -> (grupo, campo) na resposta GraphQL
+GRAPHQL_FIELDS = {
+    'requests': ('sum', 'requests'),
+    'cached_requests': ('sum', 'cachedRequests'),
+    'bytes': ('sum', 'bytes'),
+    'cached_bytes': ('sum', 'cachedBytes'),
+    'threats': ('sum', 'threats'),
+    'page_views': ('sum', 'pageViews'),
+    'uniques': ('uniq', 'uniques'),
+}
+
+_QUERY = '''
+query ZoneAnalytics($zoneTags: [string!], $since: %(type)s!, $until: %(type)s!, $limit: uint64!) {
+  viewer {
+    zones(filter: {zoneTag_in: $zoneTags}) {
+      zoneTag
+      series: %(dataset)s(limit: $limit, filter: {%(field)s_geq: $since, %(field)s_%(until_op)s: $until}) {
+        dimensions { bucket: %(field)s }
+        sum { requests cachedRequests bytes cachedBytes threats pageViews }
+        uniq { uniques }
+      }
+    }
+  }
+}
+'''
+DAILY_QUERY = _QUERY % {'type': 'Date', 'dataset': 'httpRequests1dGroups', 'field': 'date', 'until_op': 'leq'}
+HOURLY_QUERY = _QUERY % {'type': 'Time', 'dataset': 'httpRequests1hGroups', 'field': 'datetime', 'until_op': 'lt'}
+
+# Marca de coleta completa de cada granularidade (campos de Domain)
+WATERMARK_FIELDS = {
+    ZoneAnalytics.GRANULARITY_DAY: 'analytics_day_through',
+    ZoneAnalytics.GRANULARITY_HOUR: 'analytics_hour_through',
+}
+
+ROLLUPS = {
+    'hour': ZoneAnalytics.GRANULARITY_HOUR,
+    'day': ZoneAnalytics.GRANULARITY_DAY,
+    'week': ZoneAnalytics.GRANULARITY_DAY,
+    'month': ZoneAnalytics.GRANULARITY_DAY,
+}
+
+
+def get_analytics_settings():
+    config = dict(DEFAULT_ANALYTICS_SETTINGS)
+    config.update(getattr(settings, 'CLOUDFLARE_ANALYTICS', {}))
+    return config
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _parse_bucket(value, granularity):
+    if granularity == ZoneAnalytics.GRANULARITY_DAY:
+        return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min, tzinfo=dt_timezone.utc)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _windows(granularity, since, until, days_per_query):
+    """
+    Intervalos de cada consulta: ``(since, until, limite de linhas por zona,
+    último período)``. O último período pode estar incompleto e é a marca
+    gravada quando a janela funciona.
+    """
+    if granularity == ZoneAnalytics.GRANULARITY_HOUR:
+        # A janela horária é curta (HOURLY_DAYS): uma consulta por lote de zonas
+        hours = int((until - since).total_seconds() // 3600)
+        yield (since.strftime('%Y-%m-%dT%H:%M:%SZ'), until.strftime('%Y-%m-%dT%H:%M:%SZ'), max(hours, 1),
+               until - timedelta(hours=1))
+        return
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=days_per_query - 1), until)
+        yield start.isoformat(), end.isoformat(), (end - start).days + 1, datetime.combine(end, time.min, tzinfo=dt_timezone.utc)
+        start = end + timedelta(days=1)
+
+
+def fetch_zone_analytics(service, zone_ids, granularity, since, until, config=None):
+    """
+    Busca a série das zonas com o menor número de consultas GraphQL (em paralelo).
+
+    Dados diários: ``since``/``until`` são datas (inclusivas). Horários:
+    datetimes UTC (``until`` exclusivo). Retorna ``(linhas, consultas, erros,
+    completas)``, com linhas ``(zone_id, bucket, métricas)`` e, em
+    ``completas``, o último período de cada zona coberto por janelas
+    consecutivas sem erro desde ``since`` (zonas cuja primeira janela falhou
+    ficam de fora).
+    """
+    config = config or get_analytics_settings()
+    query = DAILY_QUERY if granularity == ZoneAnalytics.GRANULARITY_DAY else HOURLY_QUERY
+    batches = list(_chunks(list(zone_ids), config['ZONES_PER_QUERY']))
+    windows = list(_windows(granularity, since, until, config['DAYS_PER_QUERY']))
+    variables = [
+        {'zoneTags': batch, 'since': window_since, 'until': window_until, 'limit': limit}
+        for batch in batches
+        for window_since, window_until, limit, _ in windows
+    ]
+
+    def fetch(item):
+        try:
+            return service.graphql(query, item), None
+        except CloudflareAPIError as e:
+            return None, str(e)
+
+    rows, errors, collected = [], [], {}
+    if not variables:
+        return rows, 0, errors, collected
+    # Consultas em paralelo, sujeitas ao limite de requisições da credencial
+    with ThreadPoolExecutor(max_workers=min(get_sync_settings()['MAX_WORKERS'], len(variables))) as executor:
+        results = list(executor.map(propagate(release_connections(fetch)), variables))
+    for position, batch in enumerate(batches):
+        through, complete = None, True
+        for (_, _, _, last_period), (data, error) in zip(windows, results[position * len(windows):(position + 1) * len(windows)]):
+            if error:
+                errors.append(error)
+                complete = False
+                continue
+            if complete:
+                through = last_period
+            for zone in (data.get('viewer') or {}).get('zones') or []:
+                for item in zone.get('series') or []:
+                    metrics = {
+                        field: int((item.get(group) or {}).get(name) or 0)
+                        for field, (group, name) in GRAPHQL_FIELDS.items()
+                    }
+                    rows.append((zone['zoneTag'], _parse_bucket(item['dimensions']['bucket'], granularity), metrics))
+        if through is not None:
+            collected.update(dict.fromkeys(batch, through))
+    return rows, len(variables), errors, collected
+
+
+def store_zone_analytics(domains, granularity, rows):
+    """Grava as linhas (upsert por domínio, granularidade e período)."""
+    by_zone = {domain.cloudflare_zone_id: domain for domain in domains}
+    objects = [
+        ZoneAnalytics(domain=by_zone[zone_id], granularity=granularity, bucket=bucket, **metrics)
+        for zone_id, bucket, metrics in rows if zone_id in by_zone
+    ]
+    ZoneAnalytics.objects.bulk_create(
+        objects,
+        batch_size=get_sync_settings()['BATCH_SIZE'],
+        update_conflicts=True,
+        unique_fields=['domain', 'granularity', 'bucket'],
+        update_fields=list(METRICS),
+    )
+    return len(objects)
+
+
+def refresh_tenant_analytics(tenant, full=False, days=None, hourly_days=None):
+    """
+    Coleta os analytics diários e horários dos domínios do tenant.
+
+    Incremental por padrão: cada domínio é buscado a partir da sua marca de
+    coleta completa (domínios com a mesma marca dividem as consultas); ``full``
+    busca de novo os ``days`` dias (``BACKFILL_DAYS``). Levanta
+    ``CloudflareAPIError`` se nenhuma consulta funcionar, para que a tarefa
+    seja repetida.
+    """
+    config = get_analytics_settings()
+    days = days or config['BACKFILL_DAYS']
+    hourly_days = config['HOURLY_DAYS'] if hourly_days is None else hourly_days
+    domains = list(
+        Domain.objects.filter(tenant=tenant, cloudflare_zone_id__isnull=False)
+        .exclude(cloudflare_zone_id='').only('id', 'cloudflare_zone_id', *WATERMARK_FIELDS.values())
+    )
+    summary = {'zones': len(domains), 'queries': 0, 'rows': 0, 'errors': []}
+    if not domains:
+        return summary
+
+    service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+    now = timezone.now().astimezone(dt_timezone.utc)
+
+    today = now.date()
+    ranges = [(ZoneAnalytics.GRANULARITY_DAY, today - timedelta(days=days - 1), today)]
+    if hourly_days > 0:
+        until = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        ranges.append((ZoneAnalytics.GRANULARITY_HOUR, until - timedelta(days=hourly_days), until))
+
+    for granularity, start, until in ranges:
+        field = WATERMARK_FIELDS[granularity]
+        groups = defaultdict(list)
+        for domain in domains:
+            through = getattr(domain, field)
+            if full or through is None:
+                groups[start].append(domain)
+            else:
+                groups[max(start, through.date() if granularity == ZoneAnalytics.GRANULARITY_DAY else through)].append(domain)
+
+        for since, group in groups.items():
+            rows, queries, errors, collected = fetch_zone_analytics(
+                service, [domain.cloudflare_zone_id for domain in group], granularity, since, until, config,
+            )
+            summary['queries'] += queries
+            summary['rows'] += store_zone_analytics(group, granularity, rows)
+            summary['errors'].extend(errors)
+            advanced = defaultdict(list)
+            for domain in group:
+                through = collected.get(domain.cloudflare_zone_id)
+                if through is not None:
+                    advanced[through].append(domain.pk)
+            for through, domain_ids in advanced.items():
+                Domain.objects.filter(pk__in=domain_ids).update(**{field: through})
+
+    ZoneAnalytics.objects.filter(
+        domain__in=domains, granularity=ZoneAnalytics.GRANULARITY_HOUR,
+        bucket__lt=now - timedelta(days=config['HOURLY_RETENTION_DAYS']),
+    ).delete()
+
+    if summary['errors']:
+        logger.warning('analytics.queries_failed', tenant=tenant.pk, failed=len(summary['errors']), queries=summary['queries'])
+        if len(summary['errors']) == summary['queries']:
+            raise CloudflareAPIError(summary['errors'][0])
+    return summary
+
+
+def last_analytics_refresh(tenant_ids):
+    """
+    Fim da última coleta concluída de cada tenant (idade dos dados exibida nos
+    dashboards; o agendamento usa ``jobs.last_job_finished``).
+    """
+    return dict(
+        SyncJob.objects.filter(kind=SyncJob.KIND_TENANT_ANALYTICS, status=SyncJob.STATUS_DONE, tenant_id__in=tenant_ids)
+        .values('tenant_id').annotate(last=Max('finished_at')).values_list('tenant_id', 'last')
+    )
+
+
+def query_series(domain_ids, since, until, granularity='day', by_domain=False):
+    """
+    Série agregada dos domínios entre ``since`` (inclusivo) e ``until`` (exclusivo).
+
+    ``granularity``: ``hour`` e ``day`` leem as linhas como estão; ``week`` e
+    ``month`` agregam as diárias. Com ``by_domain`` cada domínio tem a sua
+    série. Retorna ``(série, totais)``.
+    """
+    queryset = ZoneAnalytics.objects.filter(
+        domain_id__in=domain_ids, granularity=ROLLUPS[granularity], bucket__gte=since, bucket__lt=until,
+    )
+    if granularity == 'week':
+        queryset = queryset.annotate(period=TruncWeek('bucket', tzinfo=dt_timezone.utc))
+    elif granularity == 'month':
+        queryset = queryset.annotate(period=TruncMonth('bucket', tzinfo=dt_timezone.utc))
+    else:
+        queryset = queryset.annotate(period=F('bucket'))
+    keys = ['period', 'domain_id'] if by_domain else ['period']
+    sums = {metric: Sum(metric) for metric in METRICS}
+    series = []
+    for row in queryset.values(*keys).annotate(**sums).order_by(*keys):
+        item = {'bucket': row.pop('period')}
+        if by_domain:
+            item['domain'] = row.pop('domain_id')
+        item.update(row)
+        series.append(item)
+    totals = queryset.aggregate(**sums)
+    return series, {metric: totals[metric] or 0 for metric in METRICS}
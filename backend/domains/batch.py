@@ -0,0 +1,135 @@
+"""
+Alterações em lote nos registros DNS de uma zona (criar, alterar e remover).
+
+As operações são validadas todas antes de qualquer chamada à Cloudflare,
+enviadas em paralelo (pool de threads limitado a ``MUTATION_MAX_WORKERS``,
+sujeito ao limite de requisições da credencial) e as alterações bem-sucedidas
+são gravadas no banco local em uma única transação, junto com a árvore de
+hashes da zona.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+
+from cloudflare_api.services import CloudflareService, CloudflareAPIError
+from core.db import release_connections
+from core.instrumentation import propagate
+from .merkle import update_zone_buckets
+from .models import DNSRecord, record_bucket
+from .sync import SYNCED_FIELDS, get_sync_settings, record_from_cloudflare
+
+OPERATIONS = ('create', 'update', 'delete')
+
+# Campos aceitos pela API da Cloudflare em POST/PUT de dns_records
+PAYLOAD_FIELDS = ('type', 'name', 'content', 'ttl', 'proxied', 'priority')
+
+
+def _local_payload(row):
+    payload = {'type': row.record_type, 'name': row.name, 'content': row.content, 'ttl': row.ttl, 'proxied': row.proxied}
+    if row.priority is not None:
+        payload['priority'] = row.priority
+    return payload
+
+
+def prepare_dns_batch(domain, operations, allowed_types=None):
+    """
+    Valida as operações contra os registros locais do domínio (uma consulta).
+
+    ``operations`` são dicts com ``op`` e os campos do registro (já validados
+    individualmente pelo serializer). Em ``update`` os campos omitidos são
+    completados com os valores locais, já que a Cloudflare substitui o
+    registro inteiro no PUT. Com ``allowed_types`` apenas registros desses
+    tipos podem ser criados, alterados ou removidos.
+
+    Retorna ``(preparadas, erros)``, onde ``erros`` é ``{índice: mensagem}``.
+    """
+    record_ids = [op['record_id'] for op in operations if op['op'] != 'create']
+    rows = {
+        row.cloudflare_record_id: row
+        for row in DNSRecord.objects.filter(domain=domain, cloudflare_record_id__in=record_ids)
+    }
+
+    prepared, errors, seen = [], {}, set()
+    for index, operation in enumerate(operations):
+        op = operation['op']
+        record_id = operation.get('record_id')
+        payload = {field: operation[field] for field in PAYLOAD_FIELDS if operation.get(field) is not None}
+
+        if op != 'create':
+            row = rows.get(record_id)
+            if row is None:
+                errors[index] = 'Registro DNS não encontrado neste domínio.'
+                continue
+            if record_id in seen:
+                errors[index] = 'O mesmo registro aparece em mais de uma operação.'
+                continue
+            seen.add(record_id)
+            if allowed_types is not None and row.record_type not in allowed_types:
+                errors[index] = f'Sem permissão para alterar registros do tipo {row.record_type}.'
+                continue
+            if op == 'update':
+                payload = dict(_local_payload(row), **payload)
+
+        if op != 'delete' and allowed_types is not None and payload['type'] not in allowed_types:
+            errors[index] = f"Sem permissão para gerenciar registros do tipo {payload['type']}."
+            continue
+        prepared.append({'index': index, 'op': op, 'record_id': record_id, 'payload': payload})
+    return prepared, errors
+
+
+def dispatch_dns_batch(service, zone_id, prepared, max_workers=None):
+    """Envia as operações à Cloudflare em paralelo; retorna o resultado de cada uma, na ordem."""
+    max_workers = max_workers or get_sync_settings()['MUTATION_MAX_WORKERS']
+
+    def send(operation):
+        try:
+            if operation['op'] == 'create':
+                record = service.create_dns_record(zone_id, operation['payload'])
+            elif operation['op'] == 'update':
+                record = service.update_dns_record(zone_id, operation['record_id'], operation['payload'])
+            else:
+                service.delete_dns_record(zone_id, operation['record_id'])
+                record = None
+            return dict(operation, success=True, record=record, error=None)
+        except CloudflareAPIError as e:
+            return dict(operation, success=False, record=None, error=str(e))
+        except Exception as e:
+            return dict(operation, success=False, record=None, error=f'Erro inesperado: {e}')
+
+    if not prepared:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prepared))) as executor:
+        return list(executor.map(propagate(release_connections(send)), prepared))
+
+
+def apply_dns_batch(domain, prepared, max_workers=None):
+    """
+    Executa operações já validadas por ``prepare_dns_batch`` e grava o resultado.
+
+    Criações e alterações bem-sucedidas viram um único upsert em lote e as
+    remoções um único ``DELETE``, na mesma transação. Operações que falharam
+    na Cloudflare não alteram o banco local.
+    """
+    tenant = domain.tenant
+    service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+    results = dispatch_dns_batch(service, domain.cloudflare_zone_id, prepared, max_workers)
+
+    upserts = [
+        record_from_cloudflare(domain, result['record'])
+        for result in results if result['success'] and result['op'] != 'delete'
+    ]
+    deleted = [result['record_id'] for result in results if result['success'] and result['op'] == 'delete']
+    with transaction.atomic():
+        if deleted:
+            DNSRecord.objects.filter(domain=domain, cloudflare_record_id__in=deleted).delete()
+        if upserts:
+            DNSRecord.objects.bulk_create(
+                upserts,
+                batch_size=get_sync_settings()['BATCH_SIZE'],
+                update_conflicts=True,
+                unique_fields=['domain', 'cloudflare_record_id'],
+                update_fields=SYNCED_FIELDS,
+            )
+        if deleted or upserts:
+            update_zone_buckets(domain.pk, {record_bucket(record_id) for record_id in deleted} | {row.bucket for row in upserts})
+    return results
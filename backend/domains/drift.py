@@ -0,0 +1,111 @@
+"""
+Detecção de divergência entre os registros DNS locais e a Cloudflare.
+
+``check_zone_drift`` lê a zona da Cloudflare página a página (sem o cache de
+zonas), guardando só o hash de cada registro, e monta a mesma árvore de
+``domains/merkle.py``: raiz igual à gravada em ``Domain.records_root``
+significa zona íntegra, sem ler nenhuma linha local; senão só os baldes
+divergentes são comparados registro a registro. Usado pelo comando
+``check_dns_drift``.
+"""
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudflare_api.services import CloudflareService, CloudflareAPIError
+from core.db import release_connections
+from core.instrumentation import get_logger, propagate
+from .merkle import bucket_of, build_tree, leaf_from_cloudflare, update_zone_trees
+from .models import DNSRecord
+from .sync import get_sync_settings
+
+logger = get_logger(__name__)
+
+
+def _diff_buckets(domain, remote, buckets):
+    """Compara registro a registro os baldes indicados; lê do banco só os hashes desses baldes."""
+    local = defaultdict(dict)
+    rows = DNSRecord.objects.filter(domain=domain, bucket__in=buckets)
+    for bucket, record_id, content_hash in rows.values_list('bucket', 'cloudflare_record_id', 'content_hash'):
+        local[bucket][record_id] = content_hash
+    remote_by_bucket = defaultdict(dict)
+    for record_id, content_hash in remote.items():
+        bucket = bucket_of(record_id)
+        if bucket in buckets:
+            remote_by_bucket[bucket][record_id] = content_hash
+
+    differences = []
+    for bucket in sorted(buckets):
+        ours, theirs = local[bucket], remote_by_bucket[bucket]
+        entry = {
+            'bucket': bucket,
+            'missing': sorted(theirs.keys() - ours.keys()),  # só na Cloudflare
+            'extra': sorted(ours.keys() - theirs.keys()),    # só no banco local
+            'changed': sorted(rid for rid in ours.keys() & theirs.keys() if ours[rid] != theirs[rid]),
+        }
+        if entry['missing'] or entry['extra'] or entry['changed']:
+            differences.append(entry)
+    return differences
+
+
+def check_zone_drift(domain, service=None):
+    """
+    Compara a zona na Cloudflare com a árvore gravada do domínio.
+
+    Retorna um relatório com ``drift`` (bool), ``records`` (registros na
+    Cloudflare), ``buckets`` (baldes divergentes com os ids ``missing``,
+    ``extra`` e ``changed``), ``elapsed_ms`` e ``error``. Se a raiz difere mas
+    nenhum registro diverge, a árvore gravada estava desatualizada e é
+    recalculada (``tree_rebuilt``).
+    """
+    started = time.perf_counter()
+    report = {'domain': domain.name, 'domain_id': domain.pk, 'drift': False, 'records': 0, 'buckets': [], 'error': None}
+    if service is None:
+        tenant = domain.tenant
+        service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+    try:
+        remote = dict(leaf_from_cloudflare(record) for record in service.iter_dns_records(domain.cloudflare_zone_id))
+    except CloudflareAPIError as e:
+        report['error'] = str(e)
+    except Exception as e:
+        report['error'] = f'Erro inesperado: {e}'
+    else:
+        report['records'] = len(remote)
+        root, tree = build_tree(remote.items())
+        if root != domain.records_root:
+            stored = domain.records_tree or {}
+            buckets = {int(bucket) for bucket in tree.keys() | stored.keys() if tree.get(bucket) != stored.get(bucket)}
+            report['buckets'] = _diff_buckets(domain, remote, buckets)
+            report['drift'] = bool(report['buckets'])
+            if not report['drift']:
+                update_zone_trees([domain.pk])
+                report['tree_rebuilt'] = True
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def check_drift(domains, max_workers=None):
+    """
+    Verifica várias zonas em paralelo (pool de threads limitado a ``MAX_WORKERS``,
+    sujeito ao limite de requisições de cada credencial). Retorna os relatórios
+    na ordem de ``domains``.
+    """
+    domains = [domain for domain in domains if domain.cloudflare_zone_id]
+    if not domains:
+        return []
+    max_workers = max_workers or get_sync_settings()['MAX_WORKERS']
+    services = {}
+    for domain in domains:
+        key = (domain.tenant.cloudflare_api_key, domain.tenant.cloudflare_email)
+        if key not in services:
+            services[key] = CloudflareService(*key)
+
+    def check(domain):
+        service = services[(domain.tenant.cloudflare_api_key, domain.tenant.cloudflare_email)]
+        report = check_zone_drift(domain, service)
+        if report['error']:
+            logger.warning('drift.check_failed', domain=domain.name, zone=domain.cloudflare_zone_id, error=report['error'])
+        return report
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(domains))) as executor:
+        return list(executor.map(propagate(release_connections(check)), domains))
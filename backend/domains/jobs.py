@@ -0,0 +1,275 @@
+"""
+Fila de sincronização com a Cloudflare armazenada no banco (modelo ``SyncJob``).
+
+As views de leitura respondem com os dados locais e chamam
+``enqueue_domain_refresh_if_stale``; o comando ``run_sync_worker`` consome a
+fila. Há no máximo uma tarefa ativa (pendente ou em execução) por domínio ou
+tenant, garantida pela constraint ``unique_active_sync_job``.
+
+O progresso de cada tarefa é gravado em ``SyncJobEvent`` (``JobProgress``) e
+transmitido por SSE em ``admin_api/async_views.py``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from cloudflare_api.services import CloudflareAPIError
+from tenants.models import Tenant
+from .analytics import get_analytics_settings, refresh_tenant_analytics
+from .models import SyncJob, SyncJobEvent
+from .sync import get_sync_settings, import_tenant_zones, sync_domain_records, sync_tenant_domains
+from .zonefile import import_stored_zone
+
+logger = logging.getLogger(__name__)
+
+
+def _dedup_key(kind, tenant, domain):
+    if domain is not None:
+        return f'{kind}:domain:{domain.pk}'
+    return f'{kind}:tenant:{tenant.pk}'
+
+
+def enqueue(kind, tenant, domain=None, delay=0, options=None):
+    """
+    Enfileira uma tarefa; se já houver uma ativa para o mesmo alvo, retorna a
+    existente (com as opções dela).
+    """
+    dedup_key = _dedup_key(kind, tenant, domain)
+    existing = SyncJob.objects.filter(dedup_key=dedup_key, status__in=SyncJob.ACTIVE_STATUSES).first()
+    if existing:
+        return existing
+    try:
+        with transaction.atomic():
+            return SyncJob.objects.create(
+                kind=kind,
+                tenant=tenant,
+                domain=domain,
+                dedup_key=dedup_key,
+                run_after=timezone.now() + timedelta(seconds=delay),
+                options=options or {},
+            )
+    except IntegrityError:
+        # Outra requisição enfileirou a mesma tarefa ao mesmo tempo
+        return SyncJob.objects.filter(dedup_key=dedup_key, status__in=SyncJob.ACTIVE_STATUSES).first()
+
+
+def enqueue_domain_refresh(domain):
+    return enqueue(SyncJob.KIND_DOMAIN_RECORDS, domain.tenant, domain=domain)
+
+
+def is_stale(domain):
+    stale_after = timedelta(seconds=get_sync_settings()['STALE_AFTER_SECONDS'])
+    return domain.last_synced_at is None or domain.last_synced_at < timezone.now() - stale_after
+
+
+def enqueue_domain_refresh_if_stale(domain):
+    """Enfileira a atualização dos registros do domínio se os dados locais estiverem velhos."""
+    if not domain.cloudflare_zone_id or not is_stale(domain):
+        return None
+    return enqueue_domain_refresh(domain)
+
+
+def last_job_finished(kind, tenant_ids):
+    """Fim da última execução (concluída ou com falha) das tarefas ``kind`` de cada tenant."""
+    return dict(
+        SyncJob.objects.filter(kind=kind, tenant_id__in=tenant_ids, domain__isnull=True, finished_at__isnull=False)
+        .values('tenant_id').annotate(last=Max('finished_at')).values_list('tenant_id', 'last')
+    )
+
+
+def schedule_tenant_syncs():
+    """
+    Enfileira a sincronização dos tenants cujo intervalo (``sync_interval_minutes``) venceu.
+
+    O intervalo conta da última sincronização ou da última tarefa encerrada,
+    o que for mais recente: um tenant cuja sincronização falhou espera o
+    intervalo antes de uma nova tentativa, em vez de voltar à fila a cada ciclo.
+    """
+    now = timezone.now()
+    tenants = list(Tenant.objects.filter(sync_interval_minutes__gt=0).only('id', 'sync_interval_minutes', 'last_synced_at'))
+    finished = last_job_finished(SyncJob.KIND_TENANT_DOMAINS, [tenant.pk for tenant in tenants])
+    due = []
+    for tenant in tenants:
+        last_run = max(filter(None, (tenant.last_synced_at, finished.get(tenant.pk))), default=None)
+        if last_run is None or last_run < now - timedelta(minutes=tenant.sync_interval_minutes):
+            due.append(tenant)
+    return [enqueue(SyncJob.KIND_TENANT_DOMAINS, tenant) for tenant in due]
+
+
+def enqueue_analytics_refresh_if_stale(tenants):
+    """
+    Enfileira a coleta de analytics dos tenants sem coleta ou cuja última
+    tarefa terminou há mais de ``REFRESH_MINUTES``. Conta também as tarefas
+    que falharam: a nova tentativa espera o intervalo, em vez de voltar à
+    fila a cada leitura do dashboard.
+    """
+    minutes = get_analytics_settings()['REFRESH_MINUTES']
+    last = last_job_finished(SyncJob.KIND_TENANT_ANALYTICS, [tenant.pk for tenant in tenants])
+    threshold = timezone.now() - timedelta(minutes=minutes)
+    return [
+        enqueue(SyncJob.KIND_TENANT_ANALYTICS, tenant) for tenant in tenants
+        if last.get(tenant.pk) is None or (minutes > 0 and last[tenant.pk] < threshold)
+    ]
+
+
+def schedule_analytics_refresh():
+    """Coleta periódica de analytics dos tenants com domínios na Cloudflare."""
+    if get_analytics_settings()['REFRESH_MINUTES'] <= 0:
+        return []
+    tenants = Tenant.objects.filter(domains__cloudflare_zone_id__isnull=False).distinct()
+    return enqueue_analytics_refresh_if_stale(list(tenants))
+
+
+def prune_job_events():
+    """Apaga os eventos de tarefas encerradas há mais de ``EVENTS_RETENTION_HOURS``."""
+    threshold = timezone.now() - timedelta(hours=get_sync_settings()['EVENTS_RETENTION_HOURS'])
+    deleted, _ = SyncJobEvent.objects.filter(
+        job__status__in=[SyncJob.STATUS_DONE, SyncJob.STATUS_FAILED],
+        job__finished_at__lt=threshold,
+    ).delete()
+    return deleted
+
+
+def requeue_stuck_jobs():
+    """
+    Devolve à fila tarefas 'running' cujo worker morreu: sem sinal de vida
+    (``heartbeat_at``, gravado pelos eventos de progresso) há mais de
+    ``JOB_TIMEOUT_SECONDS``. Tarefas longas que continuam emitindo progresso
+    não são tomadas por outro worker.
+    """
+    threshold = timezone.now() - timedelta(seconds=get_sync_settings()['JOB_TIMEOUT_SECONDS'])
+    return SyncJob.objects.filter(
+        Q(heartbeat_at__lt=threshold) | Q(heartbeat_at__isnull=True, started_at__lt=threshold),
+        status=SyncJob.STATUS_RUNNING,
+    ).update(status=SyncJob.STATUS_PENDING, run_after=timezone.now())
+
+
+def claim_next_job():
+    """Reserva a próxima tarefa pendente (``SKIP LOCKED``, seguro com vários workers)."""
+    with transaction.atomic():
+        job = (
+            SyncJob.objects.select_for_update(skip_locked=True)
+            .filter(status=SyncJob.STATUS_PENDING, run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = SyncJob.STATUS_RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+class JobProgress:
+    """
+    Grava os eventos de progresso de uma tarefa (``progress`` de ``domains/sync.py``).
+
+    Cada evento é um INSERT em autocommit, visível na hora para o stream SSE;
+    eventos emitidos dentro de uma transação aparecem no commit dela. Os
+    eventos também renovam o ``heartbeat_at`` da tarefa (no máximo a cada
+    ``HEARTBEAT_SECONDS``), que ``requeue_stuck_jobs`` usa para saber se o
+    worker ainda está vivo.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.heartbeat_every = get_sync_settings()['HEARTBEAT_SECONDS']
+        self._last_beat = time.monotonic()
+
+    def __call__(self, kind, zone='', **data):
+        SyncJobEvent.objects.create(job=self.job, kind=kind, zone=zone, data=data)
+        if time.monotonic() - self._last_beat >= self.heartbeat_every:
+            self.beat()
+
+    def beat(self):
+        self._last_beat = time.monotonic()
+        self.job.heartbeat_at = timezone.now()
+        SyncJob.objects.filter(pk=self.job.pk, status=SyncJob.STATUS_RUNNING).update(heartbeat_at=self.job.heartbeat_at)
+
+
+def _import_zone_file(job, progress):
+    """Importa o arquivo enviado pela view; ele é apagado ao concluir ou na última tentativa."""
+    path = job.options['path']
+    try:
+        result = import_stored_zone(job.domain, path, job.options['zone_format'], progress=progress)
+    except Exception:
+        if job.attempts >= get_sync_settings()['MAX_ATTEMPTS']:
+            default_storage.delete(path)
+        raise
+    default_storage.delete(path)
+    return result
+
+
+def _execute(job, progress):
+    if job.kind == SyncJob.KIND_DOMAIN_RECORDS:
+        return sync_domain_records(job.domain, progress=progress)
+    if job.kind == SyncJob.KIND_TENANT_DOMAINS:
+        # Incremental por padrão: só zonas novas ou alteradas têm os registros buscados
+        incremental = job.options.get('incremental', True)
+        return sync_tenant_domains(job.tenant, incremental=incremental, progress=progress)
+    if job.kind == SyncJob.KIND_TENANT_IMPORT:
+        report = import_tenant_zones(job.tenant, progress=progress)
+        if report.get('error'):
+            # Falha ao listar as zonas: nada foi importado, a tarefa é repetida
+            raise CloudflareAPIError(report['error'])
+        return report
+    if job.kind == SyncJob.KIND_TENANT_ANALYTICS:
+        return refresh_tenant_analytics(job.tenant)
+    if job.kind == SyncJob.KIND_ZONE_IMPORT:
+        return _import_zone_file(job, progress)
+    raise ValueError(f'Tipo de tarefa desconhecido: {job.kind}')
+
+
+def run_job(job):
+    """
+    Executa a tarefa e registra o resultado; falhas são reagendadas com backoff.
+
+    Emite ``started`` e, ao final, ``finished`` ou ``failed`` (com ``retry``
+    indicando se a tarefa voltou para a fila). O evento final é gravado antes
+    do status, para que o stream, ao ver a tarefa encerrada, já o tenha lido.
+    """
+    config = get_sync_settings()
+    progress = JobProgress(job)
+    progress('started', attempt=job.attempts)
+    try:
+        result = _execute(job, progress)
+    except Exception as e:
+        logger.warning('Tarefa de sincronização %s (%s) falhou: %s', job.pk, job.dedup_key, e)
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        if job.attempts < config['MAX_ATTEMPTS']:
+            job.status = SyncJob.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=config['RETRY_DELAY_SECONDS'] * 2 ** (job.attempts - 1))
+        else:
+            job.status = SyncJob.STATUS_FAILED
+        retry = job.status == SyncJob.STATUS_PENDING
+        progress('failed', error=job.error, retry=retry, run_after=job.run_after.isoformat() if retry else None)
+        job.save(update_fields=['status', 'error', 'finished_at', 'run_after'])
+        return job
+
+    progress('finished', result=result)
+    job.status = SyncJob.STATUS_DONE
+    job.result = result
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    return job
+
+
+def run_pending_jobs(max_jobs=None):
+    """Processa tarefas até a fila esvaziar (ou ``max_jobs``). Retorna quantas rodaram."""
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
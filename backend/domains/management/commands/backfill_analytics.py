@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cloudflare_api.ratelimit import use_background_waits
+
+from domains.analytics import refresh_tenant_analytics
+from domains.jobs import enqueue
+from domains.models import SyncJob
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        'Busca o histórico de analytics das zonas (uma consulta GraphQL por lote de zonas de cada '
+        'credencial) e grava em ZoneAnalytics. Com --enqueue só agenda a coleta para o run_sync_worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', help='ID do cliente (repetível; padrão: todos).')
+        parser.add_argument('--days', type=int, default=None, help='Dias de histórico (padrão: BACKFILL_DAYS).')
+        parser.add_argument('--hourly-days', type=int, default=None, help='Dias de dados horários (padrão: HOURLY_DAYS).')
+        parser.add_argument('--full', action='store_true', help='Busca de novo todo o intervalo, mesmo o já gravado.')
+        parser.add_argument('--enqueue', action='store_true', help='Apenas enfileira a coleta (execução em segundo plano).')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.filter(domains__cloudflare_zone_id__isnull=False).distinct().order_by('pk')
+        if options['tenant']:
+            tenants = tenants.filter(pk__in=options['tenant'])
+        if not tenants:
+            raise CommandError('Nenhum cliente com domínios na Cloudflare.')
+
+        use_background_waits()
+        for tenant in tenants:
+            if options['enqueue']:
+                job = enqueue(SyncJob.KIND_TENANT_ANALYTICS, tenant)
+                self.stdout.write(f'{tenant.name}: tarefa {job.pk} ({job.status})')
+                continue
+            summary = refresh_tenant_analytics(
+                tenant, full=options['full'], days=options['days'], hourly_days=options['hourly_days'],
+            )
+            line = f"{tenant.name}: {summary['zones']} zona(s), {summary['queries']} consulta(s), {summary['rows']} linha(s)"
+            if summary['errors']:
+                self.stdout.write(self.style.WARNING(f"{line}, {len(summary['errors'])} erro(s): {summary['errors'][0]}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
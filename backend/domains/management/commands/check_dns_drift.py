@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cloudflare_api.pool import close_all_pools
+from cloudflare_api.ratelimit import use_background_waits
+from domains.drift import check_drift
+from domains.jobs import enqueue_domain_refresh
+from domains.merkle import update_zone_trees
+from domains.models import Domain
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara os registros DNS locais com a Cloudflare pela árvore de hashes de cada zona e lista só '
+        'os baldes e registros divergentes. Pensado para auditoria diária (cron) de todas as contas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', help='ID do cliente (repetível; padrão: todos).')
+        parser.add_argument('--domain', type=int, action='append', help='ID do domínio (repetível).')
+        parser.add_argument('--workers', type=int, default=None, help='Zonas verificadas em paralelo (padrão: MAX_WORKERS).')
+        parser.add_argument('--repair', action='store_true', help='Enfileira a sincronização das zonas divergentes.')
+        parser.add_argument('--rebuild', action='store_true', help='Só recalcula as árvores locais, sem consultar a Cloudflare.')
+
+    def handle(self, *args, **options):
+        domains = Domain.objects.filter(cloudflare_zone_id__isnull=False).exclude(cloudflare_zone_id='')
+        if options['tenant']:
+            domains = domains.filter(tenant_id__in=options['tenant'])
+        if options['domain']:
+            domains = domains.filter(pk__in=options['domain'])
+        domains = list(domains.select_related('tenant').order_by('tenant_id', 'name'))
+        if not domains:
+            raise CommandError('Nenhum domínio com zona na Cloudflare.')
+
+        if options['rebuild']:
+            update_zone_trees([domain.pk for domain in domains])
+            self.stdout.write(self.style.SUCCESS(f'{len(domains)} árvore(s) recalculada(s).'))
+            return
+
+        use_background_waits()
+        started = time.perf_counter()
+        try:
+            reports = check_drift(domains, max_workers=options['workers'])
+        finally:
+            close_all_pools()
+
+        drifted = errors = 0
+        for domain, report in zip(domains, reports):
+            if report['error']:
+                errors += 1
+                self.stdout.write(self.style.WARNING(f"{report['domain']}: erro: {report['error']}"))
+                continue
+            if not report['drift']:
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{report['domain']}: OK ({report['records']} registros, {report['elapsed_ms']} ms)")
+                continue
+            drifted += 1
+            counts = {key: sum(len(bucket[key]) for bucket in report['buckets']) for key in ('missing', 'extra', 'changed')}
+            self.stdout.write(self.style.ERROR(
+                f"{report['domain']}: {len(report['buckets'])} balde(s) divergente(s): "
+                f"{counts['missing']} só na Cloudflare, {counts['extra']} só no banco, {counts['changed']} alterado(s)"
+            ))
+            for bucket in report['buckets']:
+                for key in ('missing', 'extra', 'changed'):
+                    for record_id in bucket[key]:
+                        self.stdout.write(f"  [{bucket['bucket']}] {key} {record_id}")
+            if options['repair']:
+                job = enqueue_domain_refresh(domain)
+                self.stdout.write(f'  sincronização enfileirada (tarefa {job.pk})')
+
+        elapsed = time.perf_counter() - started
+        line = f'{len(reports)} zona(s) verificada(s) em {elapsed:.1f}s: {drifted} divergente(s), {errors} erro(s).'
+        self.stdout.write(self.style.SUCCESS(line) if not drifted and not errors else line)
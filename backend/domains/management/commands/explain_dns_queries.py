@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from domains.models import DNSRecord, Domain
+
+# Índices/constraints de DNSRecord usados pelas consultas abaixo
+HOT_PATH_INDEXES = [
+    'dnsrecord_domain_type_name_idx',
+    'dnsrecord_type_created_idx',
+    'dnsrecord_content_target_idx',
+]
+HOT_PATH_CONSTRAINTS = ['unique_dnsrecord_cloudflare_id']
+
+
+def hot_queries(domain):
+    """Consultas mais frequentes sobre DNSRecord (views e sincronização)."""
+    sample = DNSRecord.objects.filter(domain=domain, cloudflare_record_id__isnull=False).first()
+    record_id = sample.cloudflare_record_id if sample else ''
+    return [
+        ('Sincronização: registros do domínio com ID da Cloudflare',
+         DNSRecord.objects.filter(domain=domain, cloudflare_record_id__isnull=False)),
+        ('Busca por ID da Cloudflare',
+         DNSRecord.objects.filter(domain=domain, cloudflare_record_id=record_id)),
+        ('Registros A/AAAA do domínio',
+         DNSRecord.objects.filter(domain=domain, record_type__in=['A', 'AAAA'])),
+        ('Subdomínios (CNAME) do domínio por nome',
+         DNSRecord.objects.filter(domain=domain, record_type='CNAME').order_by('name')),
+        ('CNAMEs que apontam para um registro A',
+         DNSRecord.objects.filter(domain=domain, record_type='CNAME', content_target=f'www.{domain.name}')),
+        ('Subdomínios recentes (todos os clientes)',
+         DNSRecord.objects.filter(record_type='CNAME').order_by('-created_at')[:5]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mostra o plano de execução (EXPLAIN) das consultas mais usadas sobre DNSRecord. '
+        'Com --compare (PostgreSQL) também mostra o plano sem os índices, removidos '
+        'dentro de uma transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--domain', type=int, default=None, help='ID do domínio (padrão: o com mais registros).')
+        parser.add_argument('--analyze', action='store_true', help='Executa as consultas (EXPLAIN ANALYZE, PostgreSQL).')
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Compara com o plano sem os índices (PostgreSQL; bloqueia a tabela durante a execução, '
+                 'use apenas fora do horário de pico).',
+        )
+
+    def handle(self, *args, **options):
+        postgresql = connection.vendor == 'postgresql'
+        if (options['analyze'] or options['compare']) and not postgresql:
+            raise CommandError('--analyze e --compare só estão disponíveis no PostgreSQL.')
+
+        if options['domain']:
+            domain = Domain.objects.filter(pk=options['domain']).first()
+        else:
+            domain = Domain.objects.annotate(total=Count('dns_records')).order_by('-total').first()
+        if domain is None:
+            raise CommandError('Nenhum domínio encontrado.')
+
+        total = DNSRecord.objects.count()
+        self.stdout.write(f'Domínio: {domain.name} (id {domain.pk}) — {domain.dns_records.count()} de {total} registros DNS\n')
+
+        explain_options = {'analyze': True, 'buffers': True} if options['analyze'] else {}
+        if options['compare']:
+            with transaction.atomic():
+                self._drop_indexes()
+                without = self._explain(domain, explain_options)
+                transaction.set_rollback(True)
+        with_indexes = self._explain(domain, explain_options)
+
+        for position, (label, plan, elapsed) in enumerate(with_indexes):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {label}'))
+            if options['compare']:
+                _, old_plan, old_elapsed = without[position]
+                self.stdout.write(f'-- sem índices ({old_elapsed:.1f} ms)')
+                self.stdout.write(old_plan)
+                self.stdout.write(f'-- com índices ({elapsed:.1f} ms)')
+            self.stdout.write(plan + '\n')
+
+    def _explain(self, domain, explain_options):
+        results = []
+        for label, queryset in hot_queries(domain):
+            started = time.perf_counter()
+            plan = queryset.explain(**explain_options)
+            results.append((label, plan, (time.perf_counter() - started) * 1000))
+        return results
+
+    def _drop_indexes(self):
+        table = connection.ops.quote_name(DNSRecord._meta.db_table)
+        with connection.cursor() as cursor:
+            for name in HOT_PATH_CONSTRAINTS:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {connection.ops.quote_name(name)}')
+            for name in HOT_PATH_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domains.models import Domain
+from domains.zonefile import FORMATS, export_zone
+
+
+class Command(BaseCommand):
+    help = 'Exporta os registros DNS de um domínio em BIND ou NDJSON (em fluxo, memória constante).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain', help='ID ou nome do domínio.')
+        parser.add_argument('--zone-format', choices=FORMATS, default='bind')
+        parser.add_argument('--output', '-o', default=None, help='Arquivo de saída (padrão: saída padrão).')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['domain']} if options['domain'].isdigit() else {'name': options['domain']}
+        domains = list(Domain.objects.filter(**lookup)[:2])
+        if len(domains) != 1:
+            raise CommandError('Domínio não encontrado ou ambíguo (use o ID).')
+
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for line in export_zone(domains[0], options['zone_format']):
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cloudflare_api.ratelimit import use_background_waits
+
+from domains.models import Domain
+from domains.zonefile import FORMATS, import_zone
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa um arquivo de zona (BIND ou NDJSON) para a Cloudflare e o banco local, '
+        'em lotes; registros já existentes são ignorados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain', help='ID ou nome do domínio.')
+        parser.add_argument('path', help='Arquivo de zona.')
+        parser.add_argument('--zone-format', choices=FORMATS, default=None, help='Padrão: pela extensão (.ndjson/.jsonl ou BIND).')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-workers', type=int, default=None, help='Chamadas paralelas à Cloudflare.')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['domain']} if options['domain'].isdigit() else {'name': options['domain']}
+        domains = list(Domain.objects.select_related('tenant').filter(**lookup)[:2])
+        if len(domains) != 1:
+            raise CommandError('Domínio não encontrado ou ambíguo (use o ID).')
+        domain = domains[0]
+        if not domain.cloudflare_zone_id:
+            raise CommandError('Domínio não possui Zone ID da Cloudflare.')
+
+        zone_format = options['zone_format']
+        if zone_format is None:
+            zone_format = 'ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'bind'
+        use_background_waits()
+        with open(options['path'], encoding='utf-8') as lines:
+            summary = import_zone(domain, lines, zone_format, options['batch_size'], options['max_workers'])
+
+        for error in summary['errors']:
+            self.stderr.write(error)
+        self.stdout.write(
+            f"{summary['created']} criado(s), {summary['existing']} já existente(s), "
+            f"{summary['skipped']} de tipo não suportado, {summary['failed']} com erro."
+        )
+        if summary['error']:
+            raise CommandError(f"Importação interrompida: {summary['error']}")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cloudflare_api.pool import close_all_pools
+from cloudflare_api.ratelimit import use_background_waits
+from domains.jobs import (
+    prune_job_events, requeue_stuck_jobs, run_pending_jobs, schedule_analytics_refresh, schedule_tenant_syncs,
+)
+from domains.sync import get_sync_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de sincronização com a Cloudflare (SyncJob) e agenda a sincronização '
+        'periódica dos clientes e a coleta de analytics.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Processa a fila uma vez e encerra.')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Máximo de tarefas por ciclo.')
+        parser.add_argument('--poll', type=float, default=None, help='Intervalo (s) entre verificações da fila.')
+
+    def handle(self, *args, **options):
+        poll = options['poll'] or get_sync_settings()['WORKER_POLL_SECONDS']
+        use_background_waits()
+        self.stdout.write(f'Worker de sincronização iniciado (intervalo {poll}s).')
+        try:
+            while True:
+                requeue_stuck_jobs()
+                prune_job_events()
+                schedule_tenant_syncs()
+                schedule_analytics_refresh()
+                processed = run_pending_jobs(max_jobs=options['max_jobs'])
+                if processed:
+                    self.stdout.write(f'{processed} tarefa(s) processada(s).')
+                if options['once']:
+                    break
+                if not processed:
+                    time.sleep(poll)
+        except KeyboardInterrupt:
+            self.stdout.write('Worker encerrado.')
+        finally:
+            close_all_pools()
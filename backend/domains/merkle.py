@@ -0,0 +1,103 @@
+"""
+Árvore de hashes dos registros DNS de cada zona (usada por ``domains/drift.py``).
+
+Cada ``DNSRecord`` guarda ``content_hash`` (hash dos campos sincronizados e do
+id na Cloudflare) e ``bucket``. Os registros de uma zona formam uma árvore de
+dois níveis: as folhas são distribuídas em ``BUCKETS`` baldes pelo hash do id
+(o balde de um registro não muda quando o conteúdo muda), cada balde tem o
+hash das suas folhas e a raiz é o hash dos baldes. A raiz e os baldes ficam
+em ``Domain.records_root``/``records_tree``.
+
+Cada escrita (``DNSRecord.save``/``delete``, sincronização, lotes) chama
+``update_zone_buckets`` na própria transação, com os baldes que tocou: só
+esses baldes são relidos (índice ``domain, bucket``) e a linha do domínio é
+travada (``SELECT ... FOR UPDATE``), de modo que escritas concorrentes na
+mesma zona recalculam a árvore uma de cada vez. ``update_zone_trees``
+recalcula zonas inteiras (``check_dns_drift --rebuild``).
+"""
+import hashlib
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import DNSRecord, Domain, TREE_BUCKETS, record_bucket, record_content_hash
+
+BUCKETS = TREE_BUCKETS
+# Zonas por consulta em update_zone_trees
+CHUNK_SIZE = 500
+
+bucket_of = record_bucket
+
+
+def _digest(items):
+    digest = hashlib.blake2b(digest_size=16)
+    for item in items:
+        digest.update(item.encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def _root(tree):
+    return _digest(f'{bucket}:{tree[bucket]}' for bucket in sorted(tree, key=int))
+
+
+def leaf_from_cloudflare(record):
+    """``(id, content_hash)`` de um registro da API da Cloudflare."""
+    return record['id'], record_content_hash(
+        record['id'], record['type'], record['name'], record['content'], record['ttl'],
+        record.get('proxied', False), record.get('priority'),
+    )
+
+
+def build_tree(leaves):
+    """
+    Árvore de uma zona a partir de pares ``(id, content_hash)``.
+
+    Retorna ``(raiz, {balde: hash})``, só com os baldes não vazios (chaves em
+    texto, como no JSON gravado).
+    """
+    buckets = defaultdict(list)
+    for record_id, content_hash in leaves:
+        buckets[bucket_of(record_id)].append(content_hash)
+    tree = {str(bucket): _digest(sorted(hashes)) for bucket, hashes in buckets.items()}
+    return _root(tree), tree
+
+
+def update_zone_buckets(domain_id, buckets):
+    """
+    Recalcula os baldes indicados e a raiz da zona, lendo só as folhas deles.
+
+    Deve rodar na transação da escrita: trava o domínio até o commit.
+    """
+    buckets = {bucket for bucket in buckets if bucket is not None}
+    if not buckets:
+        return
+    with transaction.atomic():
+        tree = Domain.objects.select_for_update().values_list('records_tree', flat=True).get(pk=domain_id)
+        tree = dict(tree or {})
+        hashes = defaultdict(list)
+        rows = DNSRecord.objects.filter(domain_id=domain_id, bucket__in=buckets)
+        for bucket, content_hash in rows.values_list('bucket', 'content_hash'):
+            hashes[bucket].append(content_hash)
+        for bucket in buckets:
+            if hashes[bucket]:
+                tree[str(bucket)] = _digest(sorted(hashes[bucket]))
+            else:
+                tree.pop(str(bucket), None)
+        Domain.objects.filter(pk=domain_id).update(records_root=_root(tree), records_tree=tree)
+
+
+def update_zone_trees(domain_ids):
+    """Recalcula a árvore inteira das zonas a partir dos hashes gravados (uma consulta por lote de zonas)."""
+    domain_ids = sorted(set(domain_ids))
+    for start in range(0, len(domain_ids), CHUNK_SIZE):
+        chunk = domain_ids[start:start + CHUNK_SIZE]
+        leaves = defaultdict(list)
+        rows = DNSRecord.objects.filter(domain_id__in=chunk, cloudflare_record_id__isnull=False)
+        for domain_id, record_id, content_hash in rows.values_list('domain_id', 'cloudflare_record_id', 'content_hash'):
+            leaves[domain_id].append((record_id, content_hash))
+        domains = []
+        for domain_id in chunk:
+            root, tree = build_tree(leaves[domain_id])
+            domains.append(Domain(pk=domain_id, records_root=root, records_tree=tree))
+        Domain.objects.bulk_update(domains, ['records_root', 'records_tree'])
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0006_domain_last_synced_at_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='domain',
+            name='cloudflare_modified_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='domain',
+            name='records_fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
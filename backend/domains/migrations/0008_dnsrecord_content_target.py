@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+def backfill_content_target(apps, schema_editor):
+    """Preenche o alvo normalizado dos CNAMEs existentes, em lotes."""
+    DNSRecord = apps.get_model('domains', 'DNSRecord')
+    batch = []
+    for record in DNSRecord.objects.filter(record_type='CNAME').only('pk', 'content').iterator(chunk_size=2000):
+        record.content_target = (record.content or '').strip().lower().rstrip('.')[:255]
+        batch.append(record)
+        if len(batch) >= 2000:
+            DNSRecord.objects.bulk_update(batch, ['content_target'])
+            batch = []
+    if batch:
+        DNSRecord.objects.bulk_update(batch, ['content_target'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0007_domain_cloudflare_modified_on_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dnsrecord',
+            name='content_target',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_content_target, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dnsrecord',
+            index=models.Index(fields=['domain', 'record_type', 'content_target'], name='dnsrecord_content_target_idx'),
+        ),
+    ]
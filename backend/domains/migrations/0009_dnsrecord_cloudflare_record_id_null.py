@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def clean_cloudflare_record_ids(apps, schema_editor):
+    """
+    Prepara a constraint única (domain, cloudflare_record_id): IDs vazios viram
+    NULL e registros duplicados do mesmo ID são removidos, mantendo o mais
+    antigo (as permissões que apontavam para as cópias passam para ele).
+    """
+    DNSRecord = apps.get_model('domains', 'DNSRecord')
+    UserDomainPermission = apps.get_model('accounts', 'UserDomainPermission')
+
+    DNSRecord.objects.filter(cloudflare_record_id='').update(cloudflare_record_id=None)
+
+    duplicated = (
+        DNSRecord.objects.filter(cloudflare_record_id__isnull=False)
+        .values('domain_id', 'cloudflare_record_id')
+        .annotate(total=Count('id'), keep=Min('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicated.iterator():
+        copies = list(
+            DNSRecord.objects.filter(
+                domain_id=group['domain_id'],
+                cloudflare_record_id=group['cloudflare_record_id'],
+            ).exclude(pk=group['keep']).values_list('pk', flat=True)
+        )
+        for permission in UserDomainPermission.objects.filter(allowed_a_record_id__in=copies):
+            if UserDomainPermission.objects.filter(
+                user_id=permission.user_id, domain_id=permission.domain_id, allowed_a_record_id=group['keep'],
+            ).exists():
+                permission.delete()
+            else:
+                permission.allowed_a_record_id = group['keep']
+                permission.save(update_fields=['allowed_a_record'])
+        DNSRecord.objects.filter(pk__in=copies).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_userdomainpermission_unique_together'),
+        ('domains', '0008_dnsrecord_content_target'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dnsrecord',
+            name='cloudflare_record_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(clean_cloudflare_record_ids, migrations.RunPython.noop),
+    ]
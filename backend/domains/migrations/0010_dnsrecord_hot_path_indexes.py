@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+from core.migration_operations import AddIndexConcurrently, AddUniqueConstraintConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('domains', '0009_dnsrecord_cloudflare_record_id_null'),
+    ]
+
+    operations = [
+        AddUniqueConstraintConcurrently(
+            model_name='dnsrecord',
+            constraint=models.UniqueConstraint(fields=('domain', 'cloudflare_record_id'), name='unique_dnsrecord_cloudflare_id'),
+        ),
+        AddIndexConcurrently(
+            model_name='dnsrecord',
+            index=models.Index(fields=['domain', 'record_type', 'name'], name='dnsrecord_domain_type_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='dnsrecord',
+            index=models.Index(fields=['record_type', 'created_at'], name='dnsrecord_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0010_dnsrecord_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('domain_records', 'Registros DNS do domínio'), ('tenant_domains', 'Domínios do cliente'), ('tenant_analytics', 'Analytics dos domínios do cliente')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='ZoneAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Diária'), ('hour', 'Horária')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('requests', models.BigIntegerField(default=0)),
+                ('cached_requests', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('cached_bytes', models.BigIntegerField(default=0)),
+                ('threats', models.BigIntegerField(default=0)),
+                ('page_views', models.BigIntegerField(default=0)),
+                ('uniques', models.BigIntegerField(default=0)),
+                ('domain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='domains.domain')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('domain', 'granularity', 'bucket'), name='unique_zone_analytics_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0011_zone_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('domain_records', 'Registros DNS do domínio'), ('tenant_domains', 'Domínios do cliente'), ('tenant_analytics', 'Analytics dos domínios do cliente'), ('tenant_import', 'Importação das zonas do cliente')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='SyncJobEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('zone', models.CharField(blank=True, max_length=255)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='domains.syncjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'id'], name='syncjobevent_job_id_idx')],
+            },
+        ),
+    ]
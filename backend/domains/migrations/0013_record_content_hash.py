@@ -0,0 +1,101 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:37
+
+import hashlib
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Cópia do hash e da árvore de domains/models.py e domains/merkle.py na data
+# desta migração: ela não deve mudar se o código do app mudar.
+HASHED_FIELDS = ('cloudflare_record_id', 'record_type', 'name', 'content', 'ttl', 'proxied', 'priority')
+BUCKETS = 64
+
+
+def record_content_hash(record_id, record_type, name, content, ttl, proxied, priority):
+    parts = (
+        record_id or '', record_type, name, content, str(int(ttl)),
+        '1' if proxied else '0', '' if priority is None else str(int(priority)),
+    )
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _digest(items):
+    digest = hashlib.blake2b(digest_size=16)
+    for item in items:
+        digest.update(item.encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def bucket_of(record_id):
+    return int.from_bytes(hashlib.blake2b(record_id.encode('utf-8'), digest_size=4).digest(), 'big') % BUCKETS
+
+
+def build_tree(leaves):
+    buckets = defaultdict(list)
+    for record_id, content_hash in leaves:
+        buckets[bucket_of(record_id)].append(content_hash)
+    tree = {str(bucket): _digest(sorted(hashes)) for bucket, hashes in buckets.items()}
+    root = _digest(f'{bucket}:{tree[str(bucket)]}' for bucket in sorted(buckets))
+    return root, tree
+
+
+def backfill_record_hashes(apps, schema_editor):
+    """Calcula o hash dos registros existentes e a árvore de cada zona, em lotes (zona a zona)."""
+    DNSRecord = apps.get_model('domains', 'DNSRecord')
+    Domain = apps.get_model('domains', 'Domain')
+    empty_root, empty_tree = build_tree([])
+    Domain.objects.update(records_root=empty_root, records_tree=empty_tree)
+
+    records, domains = [], []
+    current, leaves = None, []
+
+    def flush_domain():
+        if current is not None:
+            root, tree = build_tree(leaves)
+            domains.append(Domain(pk=current, records_root=root, records_tree=tree))
+
+    rows = DNSRecord.objects.only('pk', 'domain_id', *HASHED_FIELDS).order_by('domain_id', 'pk')
+    for record in rows.iterator(chunk_size=2000):
+        if record.domain_id != current:
+            flush_domain()
+            current, leaves = record.domain_id, []
+        record.content_hash = record_content_hash(*(getattr(record, field) for field in HASHED_FIELDS))
+        if record.cloudflare_record_id:
+            leaves.append((record.cloudflare_record_id, record.content_hash))
+        records.append(record)
+        if len(records) >= 2000:
+            DNSRecord.objects.bulk_update(records, ['content_hash'])
+            records = []
+        if len(domains) >= 500:
+            Domain.objects.bulk_update(domains, ['records_root', 'records_tree'])
+            domains = []
+    flush_domain()
+    DNSRecord.objects.bulk_update(records, ['content_hash'])
+    Domain.objects.bulk_update(domains, ['records_root', 'records_tree'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0012_sync_job_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dnsrecord',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='domain',
+            name='records_root',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='domain',
+            name='records_tree',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_record_hashes, migrations.RunPython.noop),
+    ]
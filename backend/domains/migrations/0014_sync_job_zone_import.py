@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0013_record_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('domain_records', 'Registros DNS do domínio'), ('tenant_domains', 'Domínios do cliente'), ('tenant_analytics', 'Analytics dos domínios do cliente'), ('tenant_import', 'Importação das zonas do cliente'), ('zone_import', 'Importação de arquivo de zona do domínio')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:00
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def init_watermarks(apps, schema_editor):
+    """A marca de cada domínio começa no último período já gravado (refeito na próxima coleta)."""
+    Domain = apps.get_model('domains', 'Domain')
+    ZoneAnalytics = apps.get_model('domains', 'ZoneAnalytics')
+
+    def last_bucket(granularity):
+        return Subquery(
+            ZoneAnalytics.objects.filter(domain=OuterRef('pk'), granularity=granularity)
+            .values('domain').annotate(last=Max('bucket')).values('last')[:1]
+        )
+
+    Domain.objects.update(analytics_day_through=last_bucket('day'), analytics_hour_through=last_bucket('hour'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0014_sync_job_zone_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='domain',
+            name='analytics_day_through',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='domain',
+            name='analytics_hour_through',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(init_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:04
+
+import hashlib
+
+from django.db import migrations, models
+
+# Cópia de domains.models.record_bucket na data desta migração
+TREE_BUCKETS = 64
+
+
+def record_bucket(record_id):
+    return int.from_bytes(hashlib.blake2b(record_id.encode('utf-8'), digest_size=4).digest(), 'big') % TREE_BUCKETS
+
+
+def backfill_buckets(apps, schema_editor):
+    """Grava o balde dos registros existentes (a árvore gravada não muda)."""
+    DNSRecord = apps.get_model('domains', 'DNSRecord')
+    records = []
+    rows = DNSRecord.objects.filter(cloudflare_record_id__isnull=False).only('pk', 'cloudflare_record_id').order_by('pk')
+    for record in rows.iterator(chunk_size=2000):
+        record.bucket = record_bucket(record.cloudflare_record_id)
+        records.append(record)
+        if len(records) >= 2000:
+            DNSRecord.objects.bulk_update(records, ['bucket'])
+            records = []
+    DNSRecord.objects.bulk_update(records, ['bucket'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0015_domain_analytics_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dnsrecord',
+            name='bucket',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dnsrecord',
+            index=models.Index(fields=['domain', 'bucket'], name='dnsrecord_domain_bucket_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0016_dnsrecord_tree_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,28 @@
-from django.db import models
+import hashlib
+from collections import defaultdict
+
+from django.db import models, transaction
 from tenants.models import Tenant
 from django.conf import settings
+from django.utils import timezone
+
+class DomainQuerySet(models.QuerySet):
+    def delete(self):
+        """Exclusão em lote; envia ``domains_bulk_deleted`` uma vez por tenant afetado."""
+        from .signals import domains_bulk_deleted
+
+        with transaction.atomic(using=self.db):
+            deleted = defaultdict(list)
+            for pk, tenant_id in self.values_list('pk', 'tenant_id'):
+                deleted[tenant_id].append(pk)
+            result = super().delete()
+            for tenant_id, domain_ids in deleted.items():
+                domains_bulk_deleted.send(sender=Domain, tenant_id=tenant_id, domain_ids=domain_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class Domain(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='domains')
@@ -9,13 +31,67 @@ class Domain(models.Model):
     status = models.CharField(max_length=32, default='active')  # status real da Cloudflare
     created_at = models.DateTimeField(auto_now_add=True)
     cloudflare_zone_id = models.CharField(max_length=64, blank=True, null=True)  # Adicionado para integração Cloudflare
+    last_synced_at = models.DateTimeField(null=True, blank=True)  # última sincronização dos registros DNS
+    cloudflare_modified_on = models.DateTimeField(null=True, blank=True)  # 'modified_on' da zona na Cloudflare
+    records_fingerprint = models.CharField(max_length=64, blank=True)  # hash do conjunto de registros da zona
+    records_root = models.CharField(max_length=32, blank=True, editable=False)  # raiz da árvore de hashes (domains/merkle.py)
+    records_tree = models.JSONField(default=dict, blank=True, editable=False)   # hash de cada balde da árvore
+    # Coleta de analytics completa até este período, inclusive (refeito na próxima coleta; ver domains/analytics.py)
+    analytics_day_through = models.DateTimeField(null=True, blank=True, editable=False)
+    analytics_hour_through = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = DomainQuerySet.as_manager()
 
     class Meta:
         unique_together = ('tenant', 'name')
 
+    def delete(self, *args, **kwargs):
+        from .signals import domains_bulk_deleted
+
+        tenant_id, pk = self.tenant_id, self.pk
+        result = super().delete(*args, **kwargs)
+        domains_bulk_deleted.send(sender=Domain, tenant_id=tenant_id, domain_ids=[pk])
+        return result
+
     def __str__(self):
         return self.name
 
+def normalize_dns_name(name):
+    """Forma canônica de um nome DNS para comparação (minúsculas, sem ponto final)."""
+    return (name or '').strip().lower().rstrip('.')
+
+
+def content_target(record_type, content):
+    """Alvo normalizado de um registro CNAME (vazio para os demais tipos)."""
+    if (record_type or '').upper() != 'CNAME':
+        return ''
+    return normalize_dns_name(content)[:255]
+
+
+def record_content_hash(record_id, record_type, name, content, ttl, proxied, priority):
+    """Hash dos campos sincronizados de um registro (folha da árvore de ``domains/merkle.py``)."""
+    parts = (
+        record_id or '', record_type, name, content, str(int(ttl)),
+        '1' if proxied else '0', '' if priority is None else str(int(priority)),
+    )
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Campos que entram em ``DNSRecord.content_hash``
+HASHED_FIELDS = ('cloudflare_record_id', 'record_type', 'name', 'content', 'ttl', 'proxied', 'priority')
+
+# Baldes da árvore de hashes de cada zona; alterar invalida as árvores e
+# ``DNSRecord.bucket`` gravados (recalcule com ``check_dns_drift --rebuild``)
+TREE_BUCKETS = 64
+
+
+def record_bucket(record_id):
+    """Balde do registro na árvore da zona, pelo id na Cloudflare (``None`` sem id)."""
+    if not record_id:
+        return None
+    return int.from_bytes(hashlib.blake2b(record_id.encode('utf-8'), digest_size=4).digest(), 'big') % TREE_BUCKETS
+
+
 class DNSRecord(models.Model):
     RECORD_TYPES = [
         ('A', 'A'),
@@ -32,8 +108,181 @@ class DNSRecord(models.Model):
     ttl = models.IntegerField(default=3600)
     proxied = models.BooleanField(default=False)
     priority = models.IntegerField(null=True, blank=True) # Para registros MX
-    cloudflare_record_id = models.CharField(max_length=100, blank=True)
+    cloudflare_record_id = models.CharField(max_length=100, blank=True, null=True)  # NULL enquanto não existir na Cloudflare
+    content_target = models.CharField(max_length=255, blank=True, editable=False)  # alvo normalizado do CNAME
+    content_hash = models.CharField(max_length=32, blank=True, editable=False)  # hash dos campos sincronizados
+    bucket = models.SmallIntegerField(null=True, blank=True, editable=False)  # balde da árvore da zona (domains/merkle.py)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Alvo do upsert (ON CONFLICT) da sincronização com a Cloudflare
+            models.UniqueConstraint(fields=['domain', 'cloudflare_record_id'], name='unique_dnsrecord_cloudflare_id'),
+        ]
+        indexes = [
+            models.Index(fields=['domain', 'record_type', 'content_target'], name='dnsrecord_content_target_idx'),
+            models.Index(fields=['domain', 'record_type', 'name'], name='dnsrecord_domain_type_name_idx'),
+            models.Index(fields=['record_type', 'created_at'], name='dnsrecord_type_created_idx'),
+            models.Index(fields=['domain', 'bucket'], name='dnsrecord_domain_bucket_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Balde e hash gravados: a árvore só é atualizada se mudarem
+        if 'bucket' in field_names and 'content_hash' in field_names:
+            instance._stored_leaf = (instance.bucket, instance.content_hash)
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .merkle import update_zone_buckets
+
+        if not self.cloudflare_record_id:
+            self.cloudflare_record_id = None
+        self.content_target = content_target(self.record_type, self.content)
+        self.content_hash = record_content_hash(*(getattr(self, field) for field in HASHED_FIELDS))
+        self.bucket = record_bucket(self.cloudflare_record_id)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'content', 'record_type'} & update_fields:
+                update_fields.add('content_target')
+            if set(HASHED_FIELDS) & update_fields:
+                update_fields.update(('content_hash', 'bucket'))
+            kwargs['update_fields'] = update_fields
+
+        previous = None if self._state.adding else getattr(self, '_stored_leaf', None)
+        if previous == (self.bucket, self.content_hash):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            if previous is None and not self._state.adding:
+                # Instância montada fora do banco: o balde antigo vem da linha gravada
+                previous = DNSRecord.objects.filter(pk=self.pk).values_list('bucket', 'content_hash').first()
+            super().save(*args, **kwargs)
+            update_zone_buckets(self.domain_id, {self.bucket, previous[0] if previous else None})
+        self._stored_leaf = (self.bucket, self.content_hash)
+
+    def delete(self, *args, **kwargs):
+        from .merkle import update_zone_buckets
+
+        domain_id, bucket = self.domain_id, getattr(self, '_stored_leaf', (self.bucket,))[0]
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            update_zone_buckets(domain_id, {bucket})
+        return result
+
     def __str__(self):
         return f"{self.name}.{self.domain.name} ({self.record_type})"
+
+class SyncJob(models.Model):
+    """Tarefa da fila de sincronização com a Cloudflare (processada por ``run_sync_worker``)."""
+    KIND_DOMAIN_RECORDS = 'domain_records'
+    KIND_TENANT_DOMAINS = 'tenant_domains'
+    KIND_TENANT_ANALYTICS = 'tenant_analytics'
+    KIND_TENANT_IMPORT = 'tenant_import'
+    KIND_ZONE_IMPORT = 'zone_import'
+    KIND_CHOICES = [
+        (KIND_DOMAIN_RECORDS, 'Registros DNS do domínio'),
+        (KIND_TENANT_DOMAINS, 'Domínios do cliente'),
+        (KIND_TENANT_ANALYTICS, 'Analytics dos domínios do cliente'),
+        (KIND_TENANT_IMPORT, 'Importação das zonas do cliente'),
+        (KIND_ZONE_IMPORT, 'Importação de arquivo de zona do domínio'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_RUNNING, 'Em execução'),
+        (STATUS_DONE, 'Concluída'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='sync_jobs')
+    domain = models.ForeignKey(Domain, on_delete=models.CASCADE, related_name='sync_jobs', null=True, blank=True)
+    dedup_key = models.CharField(max_length=100)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    options = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # último sinal de vida do worker
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Apenas uma tarefa ativa por domínio/tenant
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_sync_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='syncjob_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.dedup_key}) - {self.status}"
+
+
+class SyncJobEvent(models.Model):
+    """
+    Evento de progresso de uma tarefa (início, zona buscada/comparada/gravada,
+    erro, fim). O ``id`` é o ``id:`` do stream SSE, usado pelo cliente no
+    ``Last-Event-ID`` ao reconectar.
+    """
+    job = models.ForeignKey(SyncJob, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=16)
+    zone = models.CharField(max_length=255, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'id'], name='syncjobevent_job_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id}:{self.pk} {self.kind} {self.zone}".rstrip()
+
+
+class ZoneAnalytics(models.Model):
+    """
+    Série temporal de tráfego de uma zona (GraphQL da Cloudflare), uma linha
+    por domínio, granularidade e período. Preenchida por ``domains/analytics.py``.
+    """
+    GRANULARITY_DAY = 'day'
+    GRANULARITY_HOUR = 'hour'
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_DAY, 'Diária'),
+        (GRANULARITY_HOUR, 'Horária'),
+    ]
+
+    domain = models.ForeignKey(Domain, on_delete=models.CASCADE, related_name='analytics')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()  # início do período, em UTC
+    requests = models.BigIntegerField(default=0)
+    cached_requests = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    cached_bytes = models.BigIntegerField(default=0)
+    threats = models.BigIntegerField(default=0)
+    page_views = models.BigIntegerField(default=0)
+    uniques = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Alvo do upsert e índice das consultas por intervalo
+            models.UniqueConstraint(fields=['domain', 'granularity', 'bucket'], name='unique_zone_analytics_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.domain_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
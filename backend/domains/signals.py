@@ -0,0 +1,15 @@
+"""
+Sinais emitidos pelas operações em lote de ``domains/sync.py`` (``bulk_create``
+não dispara ``post_save``) e pela exclusão de domínios (``Domain.delete()`` e
+``Domain.objects.filter(...).delete()``, inclusive a ação de exclusão em massa
+do admin), que não usa ``post_delete`` para não impedir a exclusão rápida
+(fast delete) em lote. Domínios excluídos em cascata com o tenant são
+descontados pelo ``pre_delete`` de ``Tenant`` (``admin_api/signals.py``).
+"""
+from django.dispatch import Signal
+
+# Enviado após criar domínios em lote: sender=Domain, tenant=<Tenant>, domains=[<Domain>, ...]
+domains_bulk_created = Signal()
+
+# Enviado após excluir domínios (``QuerySet.delete()`` ou ``Domain.delete()``): sender=Domain, tenant_id=<int>, domain_ids=[<int>, ...]
+domains_bulk_deleted = Signal()
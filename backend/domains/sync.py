@@ -0,0 +1,455 @@
+"""
+Sincronização de zonas e registros DNS da Cloudflare com o banco local.
+"""
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from cloudflare_api.services import CloudflareService, CloudflareAPIError
+from core.db import release_connections
+from core.instrumentation import propagate
+from .merkle import build_tree, leaf_from_cloudflare, update_zone_buckets, update_zone_trees
+from .models import Domain, DNSRecord, content_target, record_bucket, record_content_hash
+from .signals import domains_bulk_created
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_SETTINGS = {
+    'MAX_WORKERS': 8,        # zonas buscadas em paralelo
+    'BATCH_SIZE': 1000,      # linhas por INSERT/UPDATE em lote
+    'STALE_AFTER_SECONDS': 300,     # idade máxima dos registros locais antes de pedir atualização
+    'WORKER_POLL_SECONDS': 5,
+    'JOB_TIMEOUT_SECONDS': 900,     # tarefas 'running' sem sinal de vida há mais tempo voltam para a fila
+    'HEARTBEAT_SECONDS': 30,        # intervalo mínimo entre as gravações do sinal de vida de uma tarefa
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY_SECONDS': 30,
+    'MUTATION_MAX_WORKERS': 8,       # chamadas paralelas à Cloudflare em alterações em lote
+    'MUTATION_MAX_OPERATIONS': 1000,  # operações por requisição de lote
+    'IMPORT_BATCH_SIZE': 500,        # registros enviados por lote na importação de zona
+    'IMPORT_BACKGROUND_BYTES': 1024 * 1024,  # arquivos de zona maiores são importados pelo worker
+    'EVENTS_POLL_SECONDS': 0.5,      # intervalo de leitura dos eventos no stream SSE
+    'EVENTS_KEEPALIVE_SECONDS': 15,  # comentário enviado no stream sem eventos novos
+    'EVENTS_RETRY_MS': 3000,         # espera do EventSource antes de reconectar
+    'EVENTS_RETENTION_HOURS': 24,    # eventos de tarefas encerradas são apagados depois disso
+}
+
+
+def get_sync_settings():
+    config = dict(DEFAULT_SYNC_SETTINGS)
+    config.update(getattr(settings, 'CLOUDFLARE_SYNC', {}))
+    return config
+
+
+def _no_progress(kind, zone='', **data):
+    pass
+
+
+def fetch_zone_records(service, zones, max_workers=None, progress=None):
+    """
+    Busca os registros DNS de várias zonas em paralelo (pool de threads limitado).
+
+    Retorna, na mesma ordem de ``zones``, um dict por zona com ``records``,
+    ``elapsed_ms`` e ``error`` (mensagem ou ``None``). Com ``progress``, cada
+    zona gera um evento ``fetched`` ou ``error`` (na thread que chamou) assim
+    que o resultado chega. As listas vão para o banco, por isso são lidas sem o
+    cache de zonas (``fresh=True``).
+    """
+    progress = progress or _no_progress
+    max_workers = max_workers or get_sync_settings()['MAX_WORKERS']
+
+    def fetch(zone):
+        started = time.perf_counter()
+        try:
+            records = service.get_dns_records(zone['id'], fresh=True)
+            error = None
+        except CloudflareAPIError as e:
+            records, error = [], str(e)
+        except Exception as e:
+            records, error = [], f'Erro inesperado: {e}'
+        return {
+            'zone': zone,
+            'records': records,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'error': error,
+        }
+
+    if not zones:
+        return []
+    results = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(zones))) as executor:
+        for result in executor.map(propagate(release_connections(fetch)), zones):
+            if result['error']:
+                progress('error', result['zone']['name'], stage='fetch', error=result['error'])
+            else:
+                progress('fetched', result['zone']['name'], records=len(result['records']), elapsed_ms=result['elapsed_ms'])
+            results.append(result)
+    return results
+
+
+def synced_values(record):
+    """Campos locais de ``DNSRecord`` derivados de um registro da API da Cloudflare."""
+    return {
+        'name': record['name'],
+        'record_type': record['type'],
+        'content': record['content'],
+        'ttl': record['ttl'],
+        'proxied': record.get('proxied', False),
+        'priority': record.get('priority'),
+        'content_target': content_target(record['type'], record['content']),
+        'content_hash': record_content_hash(
+            record['id'], record['type'], record['name'], record['content'], record['ttl'],
+            record.get('proxied', False), record.get('priority'),
+        ),
+        'bucket': record_bucket(record['id']),
+    }
+
+
+def record_from_cloudflare(domain, record):
+    return DNSRecord(domain=domain, cloudflare_record_id=record['id'], **synced_values(record))
+
+
+def update_record_from_cloudflare(domain, record):
+    """Grava um registro alterado na Cloudflare e recalcula o balde dele na árvore da zona (mesma transação)."""
+    values = synced_values(record)
+    with transaction.atomic():
+        updated = DNSRecord.objects.filter(domain=domain, cloudflare_record_id=record['id']).update(**values)
+        if updated:
+            update_zone_buckets(domain.pk, {values['bucket']})
+    return updated
+
+
+SYNCED_FIELDS = ('name', 'record_type', 'content', 'ttl', 'proxied', 'priority', 'content_target', 'content_hash', 'bucket')
+
+
+def reconcile_dns_records(domain, cf_records, record_types=None, delete_stale=True):
+    """
+    Aplica no banco local o conjunto de registros DNS vindo da Cloudflare.
+
+    Carrega os registros do domínio em uma única consulta, compara em memória
+    pelo ``cloudflare_record_id`` e grava os novos e alterados com um upsert
+    em lote (``INSERT ... ON CONFLICT (domain, cloudflare_record_id) DO
+    UPDATE``) e um único ``DELETE`` dos registros que não existem mais, tudo
+    em uma transação, que também recalcula os baldes tocados da árvore de
+    hashes da zona. Com
+    ``record_types`` apenas esses tipos são sincronizados (e removidos).
+    Retorna a contagem de alterações.
+    """
+    config = get_sync_settings()
+    if record_types is not None:
+        record_types = set(record_types)
+        cf_records = [record for record in cf_records if record['type'] in record_types]
+    incoming = {record['id']: record for record in cf_records}
+    summary = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    with transaction.atomic():
+        rows = (
+            DNSRecord.objects.filter(domain=domain, cloudflare_record_id__isnull=False)
+            .only('pk', 'cloudflare_record_id', *SYNCED_FIELDS)
+        )
+        existing = {row.cloudflare_record_id: row for row in rows}
+
+        upserts = []
+        for record_id, record in incoming.items():
+            row = existing.get(record_id)
+            if row is None:
+                summary['created'] += 1
+            elif any(getattr(row, field) != value for field, value in synced_values(record).items()):
+                summary['updated'] += 1
+            else:
+                summary['unchanged'] += 1
+                continue
+            upserts.append(record_from_cloudflare(domain, record))
+
+        stale_rows = []
+        if delete_stale:
+            stale_rows = [
+                row for record_id, row in existing.items()
+                if record_id not in incoming and (record_types is None or row.record_type in record_types)
+            ]
+        stale = [row.pk for row in stale_rows]
+
+        if stale:
+            DNSRecord.objects.filter(pk__in=stale).delete()
+        if upserts:
+            # Também cobre registros inseridos por outra requisição desde a leitura acima
+            DNSRecord.objects.bulk_create(
+                upserts,
+                batch_size=config['BATCH_SIZE'],
+                update_conflicts=True,
+                unique_fields=['domain', 'cloudflare_record_id'],
+                update_fields=SYNCED_FIELDS,
+            )
+        if stale or upserts:
+            update_zone_buckets(domain.pk, {row.bucket for row in stale_rows + upserts})
+
+    summary['deleted'] = len(stale)
+    return summary
+
+
+def records_fingerprint(cf_records):
+    """Hash estável do conjunto de registros de uma zona (independe da ordem da API)."""
+    digest = hashlib.sha256()
+    for row in sorted(
+        (record['id'], record['type'], record['name'], record['content'], str(record['ttl']),
+         str(record.get('proxied', False)), str(record.get('priority')))
+        for record in cf_records
+    ):
+        digest.update('\x1f'.join(row).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def sync_domain_records(domain, cf_records=None, progress=None):
+    """
+    Reconcilia os registros DNS da zona do domínio com o banco local.
+
+    Se a raiz da árvore de hashes do conjunto recebido for igual à gravada
+    (``domains/merkle.py``), nada é gravado além do fingerprint e da data de
+    sincronização; edições feitas só no banco local mudam a raiz e são
+    desfeitas aqui. Com ``progress`` emite ``diffed`` (contagem
+    da comparação) e ``written`` (linhas gravadas).
+    """
+    progress = progress or _no_progress
+    if cf_records is None:
+        tenant = domain.tenant
+        service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+        cf_records = service.get_dns_records(domain.cloudflare_zone_id, fresh=True)
+
+    fingerprint = records_fingerprint(cf_records)
+    root, _ = build_tree(leaf_from_cloudflare(record) for record in cf_records)
+    if root == domain.records_root:
+        summary = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': len(cf_records)}
+    else:
+        summary = reconcile_dns_records(domain, cf_records)
+        if not (summary['created'] or summary['updated'] or summary['deleted']):
+            # Nada mudou nos registros: a árvore gravada é que estava desatualizada
+            update_zone_trees([domain.pk])
+    domain.records_fingerprint = fingerprint
+    domain.last_synced_at = timezone.now()
+    domain.save(update_fields=['records_fingerprint', 'last_synced_at'])
+    progress('diffed', domain.name, **summary)
+    progress('written', domain.name, records=summary['created'] + summary['updated'] + summary['deleted'])
+    return summary
+
+
+def _zone_values(zone):
+    return {
+        'proxied': zone.get('proxied', False),
+        'status': zone.get('status', 'active'),
+        'cloudflare_zone_id': zone['id'],
+        'cloudflare_modified_on': parse_datetime(zone['modified_on']) if zone.get('modified_on') else None,
+    }
+
+
+def sync_tenant_domains(tenant, zones=None, incremental=False, max_workers=None, progress=None):
+    """
+    Sobrescreve a lista de domínios do tenant com as zonas da Cloudflare.
+
+    Cria os domínios novos, atualiza proxied/status/zone id dos existentes e
+    remove os que não existem mais na Cloudflare, com operações em lote.
+
+    No modo incremental, zonas cujo ``modified_on`` não mudou desde a última
+    sincronização são ignoradas; as novas ou alteradas também têm os registros
+    DNS buscados (em paralelo) e reconciliados, pulando as que mantêm o mesmo
+    fingerprint.
+
+    ``progress(kind, zone='', **data)`` recebe os eventos da sincronização:
+    ``zones`` (lista lida) e, por zona, ``fetched``, ``diffed``, ``written``
+    ou ``error``. É usado pelas tarefas da fila (``domains/jobs.py``).
+    """
+    config = get_sync_settings()
+    progress = progress or _no_progress
+    service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+    if zones is None:
+        zones = service.get_zones()
+
+    existing_domains = {d.name: d for d in Domain.objects.filter(tenant=tenant)}
+    to_create = []
+    to_update = []
+    changed_zones = []
+    skipped = 0
+    cloudflare_domain_names = set()
+    for zone in zones:
+        name = zone['name']
+        cloudflare_domain_names.add(name)
+        values = _zone_values(zone)
+        domain = existing_domains.get(name)
+        if domain is None:
+            domain = Domain(tenant=tenant, name=name, **values)
+            to_create.append(domain)
+            changed_zones.append((domain, zone))
+            continue
+        if (incremental and values['cloudflare_modified_on'] is not None
+                and domain.cloudflare_modified_on == values['cloudflare_modified_on']
+                and domain.cloudflare_zone_id == values['cloudflare_zone_id']):
+            skipped += 1
+            continue
+        updated = False
+        for field, value in values.items():
+            if getattr(domain, field) != value:
+                setattr(domain, field, value)
+                updated = True
+        if updated:
+            to_update.append(domain)
+        changed_zones.append((domain, zone))
+
+    # Remover domínios locais que não existem mais na Cloudflare
+    stale_ids = [domain.pk for name, domain in existing_domains.items() if name not in cloudflare_domain_names]
+
+    with transaction.atomic():
+        if to_create:
+            Domain.objects.bulk_create(to_create, batch_size=config['BATCH_SIZE'])
+            domains_bulk_created.send(sender=Domain, tenant=tenant, domains=to_create)
+        if to_update:
+            Domain.objects.bulk_update(
+                to_update,
+                ['proxied', 'status', 'cloudflare_zone_id', 'cloudflare_modified_on'],
+                batch_size=config['BATCH_SIZE'],
+            )
+        if stale_ids:
+            Domain.objects.filter(pk__in=stale_ids).delete()  # envia domains_bulk_deleted
+
+    result = {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(stale_ids),
+        'skipped': skipped,
+        'total': len(zones),
+    }
+    progress('zones', **result)
+
+    if incremental and changed_zones:
+        fetched = fetch_zone_records(
+            service, [zone for domain, zone in changed_zones], max_workers=max_workers, progress=progress,
+        )
+        records_changed = 0
+        for (domain, zone), fetch_result in zip(changed_zones, fetched):
+            if fetch_result['error']:
+                logger.warning('Falha ao buscar registros da zona %s (%s): %s', zone['name'], zone['id'], fetch_result['error'])
+                continue
+            if records_fingerprint(fetch_result['records']) != domain.records_fingerprint:
+                records_changed += 1
+            try:
+                sync_domain_records(domain, fetch_result['records'], progress=progress)
+            except Exception as e:
+                progress('error', zone['name'], stage='write', error=str(e))
+                raise
+        result['records_changed_zones'] = records_changed
+
+    tenant.last_synced_at = timezone.now()
+    tenant.save(update_fields=['last_synced_at'])
+    return result
+
+
+IMPORTED_DOMAIN_FIELDS = (
+    'proxied', 'status', 'cloudflare_zone_id', 'cloudflare_modified_on',
+    'last_synced_at', 'records_fingerprint', 'records_root', 'records_tree',
+)
+
+
+def import_tenant_zones(tenant, max_workers=None, progress=None):
+    """
+    Cria os domínios e registros DNS de todas as zonas da conta Cloudflare do tenant.
+
+    As zonas são buscadas em paralelo e gravadas com upserts em lote, então
+    repetir a importação (ex.: tarefa reenfileirada depois de gravar) apenas
+    atualiza o que já existe. Retorna um relatório com o tempo e o erro (se
+    houver) de cada zona. ``progress`` recebe ``zones``, ``fetched``/``error``
+    por zona e, após a gravação, ``written``.
+    """
+    config = get_sync_settings()
+    progress = progress or _no_progress
+    report = {'zones': 0, 'domains_created': 0, 'records_created': 0, 'failed_zones': 0, 'zone_results': []}
+    service = CloudflareService(tenant.cloudflare_api_key, tenant.cloudflare_email)
+    try:
+        zones = service.get_zones()
+    except CloudflareAPIError as e:
+        logger.warning('Falha ao listar zonas do tenant %s: %s', tenant.pk, e)
+        report['error'] = str(e)
+        progress('error', stage='zones', error=str(e))
+        return report
+
+    progress('zones', total=len(zones))
+    results = fetch_zone_records(service, zones, max_workers=max_workers, progress=progress)
+
+    synced_at = timezone.now()
+    with transaction.atomic():
+        # Uma nova execução após uma importação gravada mas não marcada (tarefa
+        # reenfileirada) encontra os domínios e registros já no banco: tudo é upsert
+        existing = set(
+            Domain.objects.filter(tenant=tenant, name__in=[result['zone']['name'] for result in results])
+            .values_list('name', flat=True)
+        )
+        domains = []
+        for result in results:
+            # Zonas novas: a árvore de hashes sai dos próprios registros recebidos
+            records_root, records_tree = build_tree(leaf_from_cloudflare(record) for record in result['records'])
+            domains.append(Domain(
+                tenant=tenant,
+                name=result['zone']['name'],
+                # Cloudflare API pode não retornar 'proxied' para todos os tipos
+                **_zone_values(result['zone']),
+                # Zonas com falha ficam sem data para serem ressincronizadas pelo worker
+                last_synced_at=None if result['error'] else synced_at,
+                records_fingerprint='' if result['error'] else records_fingerprint(result['records']),
+                records_root=records_root,
+                records_tree=records_tree,
+            ))
+        domains = Domain.objects.bulk_create(
+            domains,
+            batch_size=config['BATCH_SIZE'],
+            update_conflicts=True,
+            unique_fields=['tenant', 'name'],
+            update_fields=IMPORTED_DOMAIN_FIELDS,
+        )
+        created = [domain for domain in domains if domain.name not in existing]
+        if created:
+            domains_bulk_created.send(sender=Domain, tenant=tenant, domains=created)
+        records = [
+            record_from_cloudflare(domain, record)
+            for domain, result in zip(domains, results)
+            for record in result['records']
+        ]
+        DNSRecord.objects.bulk_create(
+            records,
+            batch_size=config['BATCH_SIZE'],
+            update_conflicts=True,
+            unique_fields=['domain', 'cloudflare_record_id'],
+            update_fields=SYNCED_FIELDS,
+        )
+        reimported = [
+            (domain, result) for domain, result in zip(domains, results) if domain.name in existing
+        ]
+        for domain, result in reimported:
+            if not result['error']:
+                # Registros removidos na Cloudflare desde a execução anterior
+                (DNSRecord.objects.filter(domain=domain, cloudflare_record_id__isnull=False)
+                    .exclude(cloudflare_record_id__in=[record['id'] for record in result['records']])
+                    .delete())
+        if reimported:
+            # A árvore gravada acima vem só dos registros recebidos; recalcula pelo banco
+            update_zone_trees([domain.pk for domain, result in reimported])
+
+    for result in results:
+        zone = result['zone']
+        if result['error']:
+            report['failed_zones'] += 1
+            logger.warning('Falha ao buscar registros da zona %s (%s): %s', zone['name'], zone['id'], result['error'])
+        report['zone_results'].append({
+            'zone': zone['name'],
+            'records': len(result['records']),
+            'elapsed_ms': result['elapsed_ms'],
+            'error': result['error'],
+        })
+        if not result['error']:
+            progress('written', zone['name'], records=len(result['records']))
+    report.update(zones=len(zones), domains_created=len(created), records_created=len(records))
+    tenant.last_synced_at = synced_at
+    tenant.save(update_fields=['last_synced_at'])
+    return report
@@ -3,13 +3,16 @@ from rest_framework.response import Response
 from .models import Domain, DNSRecord
 from .serializers import DomainSerializer, DNSRecordSerializer
 from cloudflare_api.services import CloudflareService
+from core.instrumentation import get_logger
+
+logger = get_logger(__name__)
 
 class DomainViewSet(viewsets.ModelViewSet):
     queryset = Domain.objects.all()
     serializer_class = DomainSerializer
 
     def create(self, request, *args, **kwargs):
-        print(f"Dados recebidos para Domain: {request.data}")
+        logger.debug('domain.create', fields=lambda: sorted(request.data.keys()))
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
@@ -35,7 +38,7 @@ class DNSRecordViewSet(viewsets.ModelViewSet):
         # Busca os registros DNS da Cloudflare
         service = CloudflareService(domain.tenant.cloudflare_api_key, domain.tenant.cloudflare_email)
         try:
-            cf_records = service.get_dns_records(domain.cloudflare_zone_id)
+            cf_records = service.get_dns_records(domain.cloudflare_zone_id, fresh=True)
         except Exception as e:
             return Response({'error': f"Erro ao buscar registros na Cloudflare: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -78,7 +81,7 @@ class DNSRecordViewSet(viewsets.ModelViewSet):
                 instance.cloudflare_record_id = cf_record['id']
                 instance.save()
             except Exception as e:
-                print(f"Erro ao criar registro DNS na Cloudflare: {e}")
+                logger.error('cloudflare.record_create_failed', record=instance.pk, zone=domain.cloudflare_zone_id, error=e)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -106,7 +109,7 @@ class DNSRecordViewSet(viewsets.ModelViewSet):
             try:
                 service.update_dns_record(domain.cloudflare_zone_id, instance.cloudflare_record_id, record_data)
             except Exception as e:
-                print(f"Erro ao atualizar registro DNS na Cloudflare: {e}")
+                logger.error('cloudflare.record_update_failed', record=instance.pk, zone=domain.cloudflare_zone_id, error=e)
 
         return Response(serializer.data)
 
@@ -120,7 +123,7 @@ class DNSRecordViewSet(viewsets.ModelViewSet):
             try:
                 service.delete_dns_record(domain.cloudflare_zone_id, instance.cloudflare_record_id)
             except Exception as e:
-                print(f"Erro ao deletar registro DNS na Cloudflare: {e}")
+                logger.error('cloudflare.record_delete_failed', record=instance.pk, zone=domain.cloudflare_zone_id, error=e)
 
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
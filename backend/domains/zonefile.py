@@ -0,0 +1,386 @@
+"""
+Exportação e importação de registros DNS em arquivo de zona BIND e NDJSON.
+
+Tudo é feito em fluxo: a exportação percorre os registros com um cursor no
+servidor (``QuerySet.iterator``) e gera uma linha por vez, e a importação lê
+e interpreta o arquivo linha a linha, enviando os registros à Cloudflare e ao
+banco em lotes de ``IMPORT_BATCH_SIZE`` (ver ``domains/batch.py``). O uso de
+memória não depende do tamanho da zona. Linhas inválidas são contadas e
+relatadas com o número da linha, sem interromper a importação das demais.
+
+Arquivos maiores que ``IMPORT_BACKGROUND_BYTES`` são gravados no storage
+(``save_import_file``) e importados pelo worker, em uma tarefa
+``zone_import`` (``import_stored_zone``).
+
+No BIND, registros com proxy da Cloudflare levam o comentário
+``cf_tags=cf-proxied:true``, como nos arquivos exportados pela própria
+Cloudflare.
+"""
+import json
+import re
+import uuid
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .batch import apply_dns_batch
+from .models import DNSRecord, normalize_dns_name
+from .sync import get_sync_settings
+
+FORMATS = ('bind', 'ndjson')
+CONTENT_TYPES = {'bind': 'text/dns', 'ndjson': 'application/x-ndjson'}
+EXPORT_FIELDS = ('cloudflare_record_id', 'name', 'record_type', 'content', 'ttl', 'proxied', 'priority')
+
+SUPPORTED_TYPES = frozenset(choice for choice, _ in DNSRecord.RECORD_TYPES)
+HOSTNAME_TYPES = frozenset(['CNAME', 'MX'])  # conteúdo é um nome DNS
+PROXIED_TAG = 'cf-proxied:true'
+TTL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+MAX_IMPORT_ERRORS = 100  # mensagens de erro devolvidas no resumo
+IMPORT_DIR = 'zone_imports'  # arquivos à espera do worker, no storage padrão
+
+
+class ZoneFileError(ValueError):
+    """Linha inválida no arquivo importado."""
+
+
+def iter_records(domain, chunk_size=2000):
+    """Registros do domínio como tuplas de ``EXPORT_FIELDS``, via cursor no servidor."""
+    return (
+        DNSRecord.objects.filter(domain=domain).order_by('pk')
+        .values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    )
+
+
+def absolute_name(name, origin):
+    """Nome completo (sem ponto final) de um nome relativo, ``@`` ou já absoluto."""
+    name = (name or '').strip()
+    if name in ('', '@'):
+        return origin
+    if name.endswith('.'):
+        return name[:-1]
+    lowered = normalize_dns_name(name)
+    if lowered == origin or lowered.endswith('.' + origin):
+        return name
+    return f'{name}.{origin}'
+
+
+def _quote_txt(content):
+    # Strings de TXT têm no máximo 255 caracteres; as maiores são divididas
+    escaped = [content[i:i + 255].replace('\\', '\\\\').replace('"', '\\"') for i in range(0, len(content), 255)]
+    return ' '.join(f'"{part}"' for part in escaped or [''])
+
+
+# ---------------------------------------------------------------------------
+# Exportação
+
+def export_bind(domain):
+    """Gera o arquivo de zona BIND do domínio, uma linha por vez."""
+    origin = normalize_dns_name(domain.name)
+    yield f';; Zona {origin} exportada do painel\n'
+    yield f'$ORIGIN {origin}.\n'
+    for _, name, record_type, content, ttl, proxied, priority in iter_records(domain):
+        rdata = content
+        if record_type in HOSTNAME_TYPES:
+            rdata = f"{content.strip().rstrip('.')}."  # a Cloudflare guarda o alvo como nome completo
+        elif record_type == 'TXT':
+            rdata = _quote_txt(content)
+        if record_type == 'MX':
+            rdata = f'{priority if priority is not None else 10} {rdata}'
+        line = f'{absolute_name(name, origin)}.\t{ttl}\tIN\t{record_type}\t{rdata}'
+        if proxied:
+            line += f' ; cf_tags={PROXIED_TAG}'
+        yield line + '\n'
+
+
+def export_ndjson(domain):
+    """Gera um objeto JSON por linha, com os campos da API da Cloudflare."""
+    origin = normalize_dns_name(domain.name)
+    for record_id, name, record_type, content, ttl, proxied, priority in iter_records(domain):
+        record = {
+            'id': record_id, 'type': record_type, 'name': absolute_name(name, origin),
+            'content': content, 'ttl': ttl, 'proxied': proxied,
+        }
+        if priority is not None:
+            record['priority'] = priority
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_zone(domain, zone_format):
+    return export_bind(domain) if zone_format == 'bind' else export_ndjson(domain)
+
+
+# ---------------------------------------------------------------------------
+# Importação
+
+def _tokenize(line):
+    """Divide uma linha em tokens, respeitando aspas; retorna ``(tokens, comentário)``."""
+    tokens, current, quoted, escape = [], None, False, False
+    for position, char in enumerate(line):
+        if quoted:
+            if escape:
+                current.append(char)
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                tokens.append(('"', ''.join(current)))
+                current, quoted = None, False
+            else:
+                current.append(char)
+        elif char == '"':
+            if current is not None:
+                tokens.append(('', ''.join(current)))
+            current, quoted = [], True
+        elif char == ';':
+            if current is not None:
+                tokens.append(('', ''.join(current)))
+            return tokens, line[position + 1:].strip()
+        elif char.isspace() or char in '()':
+            if current is not None:
+                tokens.append(('', ''.join(current)))
+                current = None
+            if char in '()':
+                tokens.append(('(', char))
+        else:
+            if current is None:
+                current = []
+            current.append(char)
+    if quoted:
+        raise ZoneFileError('aspas sem fechamento')
+    if current is not None:
+        tokens.append(('', ''.join(current)))
+    return tokens, ''
+
+
+def _parse_ttl(value):
+    if value.isdigit():
+        return int(value)
+    match = re.fullmatch(r'(?:\d+[smhdw])+', value.lower())
+    if not match:
+        return None
+    return sum(int(amount) * TTL_UNITS[unit] for amount, unit in re.findall(r'(\d+)([smhdw])', value.lower()))
+
+
+def _logical_lines(lines):
+    """
+    Junta as linhas entre parênteses (ex.: SOA); entrega ``(número,
+    começa_com_espaço, tokens, comentário, erro)``. Uma linha que não pode ser
+    lida vem só com ``erro`` e descarta o registro que estava sendo montado.
+    """
+    pending, start, depth, indented = [], 0, 0, False
+    comments = []
+    for number, raw in enumerate(lines, 1):
+        try:
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            raw = raw.rstrip('\r\n')
+            tokens, comment = _tokenize(raw)
+        except (UnicodeDecodeError, ZoneFileError) as e:
+            reason = 'texto não é UTF-8' if isinstance(e, UnicodeDecodeError) else e
+            yield number, False, None, '', f'linha {number}: {reason}'
+            pending, comments, depth = [], [], 0
+            continue
+        if not pending:
+            start, indented = number, raw[:1].isspace()
+        for kind, value in tokens:
+            if kind == '(':
+                depth += 1 if value == '(' else -1
+            else:
+                pending.append((kind, value))
+        if comment:
+            comments.append(comment)
+        if depth <= 0:
+            if pending:
+                yield start, indented, pending, ' '.join(comments), None
+            pending, comments, depth = [], [], 0
+    if pending:
+        yield start, indented, pending, ' '.join(comments), None
+
+
+def _bind_record(tokens, comment, number, indented, owner, origin, default_ttl):
+    """Registro de uma linha lógica do BIND; retorna ``(registro, dono)`` ou levanta ``ZoneFileError``."""
+    values = [value for _, value in tokens]
+    position = 0
+    if not indented:
+        owner = absolute_name(values[0], origin)
+        position = 1
+    ttl = default_ttl
+    # TTL e classe, em qualquer ordem, antes do tipo
+    while position < len(values):
+        token = values[position]
+        if token.upper() in ('IN', 'CH', 'HS'):
+            position += 1
+        elif _parse_ttl(token) is not None:
+            ttl = _parse_ttl(token)
+            position += 1
+        else:
+            break
+    if position >= len(tokens):
+        raise ZoneFileError(f'linha {number}: tipo de registro ausente')
+    record_type = values[position].upper()
+    rdata = tokens[position + 1:]
+    if record_type not in SUPPORTED_TYPES:
+        return {'skipped': record_type, 'line': number}, owner
+    if not rdata:
+        raise ZoneFileError(f'linha {number}: registro {record_type} sem conteúdo')
+
+    record = {'type': record_type, 'name': owner, 'ttl': ttl, 'proxied': PROXIED_TAG in comment}
+    if record_type == 'MX':
+        if len(rdata) < 2 or not rdata[0][1].isdigit():
+            raise ZoneFileError(f'linha {number}: MX requer prioridade e servidor')
+        record['priority'] = int(rdata[0][1])
+        record['content'] = absolute_name(rdata[1][1], origin)
+    elif record_type == 'CNAME':
+        record['content'] = absolute_name(rdata[0][1], origin)
+    elif record_type == 'TXT':
+        record['content'] = ''.join(value for _, value in rdata)
+    else:
+        record['content'] = rdata[0][1]
+    return record, owner
+
+
+def parse_bind(lines, origin):
+    """
+    Interpreta um arquivo de zona BIND de forma incremental.
+
+    Gera dicts no formato da API da Cloudflare (``type``, ``name``,
+    ``content``, ``ttl``, ``proxied`` e ``priority``); tipos não suportados
+    pelo painel geram ``{'skipped': tipo}`` e linhas inválidas geram
+    ``{'error': mensagem}``, com o número da linha, sem interromper a leitura.
+    """
+    origin = normalize_dns_name(origin)
+    default_ttl, owner = 1, origin
+    for number, indented, tokens, comment, error in _logical_lines(lines):
+        if error:
+            yield {'error': error, 'line': number}
+            continue
+        values = [value for _, value in tokens]
+        if values[0].upper() == '$ORIGIN':
+            origin = normalize_dns_name(values[1]) if len(values) > 1 else origin
+            continue
+        if values[0].upper() == '$TTL':
+            default_ttl = _parse_ttl(values[1]) if len(values) > 1 else default_ttl
+            continue
+        if values[0].startswith('$'):
+            continue  # $INCLUDE e $GENERATE não são suportados
+        try:
+            record, owner = _bind_record(tokens, comment, number, indented, owner, origin, default_ttl)
+        except ZoneFileError as e:
+            yield {'error': str(e), 'line': number}
+            continue
+        yield record
+
+
+def parse_ndjson(lines):
+    """
+    Interpreta NDJSON (um registro da API da Cloudflare por linha) de forma
+    incremental; linhas inválidas geram ``{'error': mensagem}``.
+    """
+    for number, raw in enumerate(lines, 1):
+        try:
+            data = json.loads(raw) if raw.strip() else None
+        except ValueError:
+            yield {'error': f'linha {number}: JSON inválido', 'line': number}
+            continue
+        if data is None:
+            continue
+        if not isinstance(data, dict) or not all(data.get(field) for field in ('type', 'name', 'content')):
+            yield {'error': f'linha {number}: type, name e content são obrigatórios', 'line': number}
+            continue
+        record_type = str(data['type']).upper()
+        if record_type not in SUPPORTED_TYPES:
+            yield {'skipped': record_type, 'line': number}
+            continue
+        record = {
+            'type': record_type, 'name': data['name'], 'content': data['content'],
+            'ttl': data.get('ttl', 1), 'proxied': bool(data.get('proxied', False)),
+        }
+        if data.get('priority') is not None:
+            record['priority'] = data['priority']
+        yield record
+
+
+def parse_zone(lines, zone_format, origin):
+    return parse_bind(lines, origin) if zone_format == 'bind' else parse_ndjson(lines)
+
+
+def _add_error(summary, message):
+    if len(summary['errors']) < MAX_IMPORT_ERRORS:
+        summary['errors'].append(message)
+
+
+def import_zone(domain, lines, zone_format, batch_size=None, max_workers=None, progress=None):
+    """
+    Importa um arquivo de zona para a Cloudflare e o banco local, em lotes.
+
+    Registros que já existem no domínio (mesmo tipo, nome e conteúdo) são
+    ignorados, o que torna a importação segura para repetir. Linhas inválidas
+    são contadas em ``invalid`` e não impedem a importação das demais.
+    Retorna um resumo com as contagens e as primeiras mensagens de erro (das
+    linhas e da Cloudflare); ``error`` só é preenchido quando nenhuma linha do
+    arquivo pôde ser lida. Com ``progress``, cada lote gera um evento
+    ``written`` com as contagens acumuladas.
+    """
+    batch_size = batch_size or get_sync_settings()['IMPORT_BATCH_SIZE']
+    origin = normalize_dns_name(domain.name)
+    summary = {'created': 0, 'existing': 0, 'skipped': 0, 'failed': 0, 'invalid': 0, 'errors': [], 'error': None}
+    records = parse_zone(lines, zone_format, origin)
+    first_error = None
+
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        operations = []
+        for record in batch:
+            if 'error' in record:
+                summary['invalid'] += 1
+                first_error = first_error or record['error']
+                _add_error(summary, record['error'])
+            elif 'skipped' in record:
+                summary['skipped'] += 1
+            else:
+                record['name'] = absolute_name(record['name'], origin)
+                operations.append(record)
+
+        existing = set(
+            DNSRecord.objects.filter(
+                domain=domain,
+                record_type__in={record['type'] for record in operations},
+                name__in={record['name'] for record in operations},
+            ).values_list('record_type', 'name', 'content')
+        ) if operations else set()
+        prepared = []
+        for record in operations:
+            key = (record['type'], record['name'], record['content'])
+            if key in existing:
+                summary['existing'] += 1
+                continue
+            existing.add(key)  # duplicatas dentro do próprio arquivo
+            prepared.append({'index': len(prepared), 'op': 'create', 'record_id': None, 'payload': record})
+
+        for result in apply_dns_batch(domain, prepared, max_workers=max_workers):
+            if result['success']:
+                summary['created'] += 1
+            else:
+                summary['failed'] += 1
+                payload = result['payload']
+                _add_error(summary, f"{payload['type']} {payload['name']}: {result['error']}")
+        if progress:
+            progress('written', domain.name, **{key: summary[key] for key in ('created', 'existing', 'skipped', 'failed', 'invalid')})
+
+    if first_error and not any(summary[key] for key in ('created', 'existing', 'skipped', 'failed')):
+        summary['error'] = first_error
+    return summary
+
+
+def save_import_file(domain, upload):
+    """Grava o arquivo enviado no storage padrão, para a tarefa ``zone_import``; retorna o caminho."""
+    return default_storage.save(f'{IMPORT_DIR}/{domain.pk}-{uuid.uuid4().hex}', File(upload))
+
+
+def import_stored_zone(domain, path, zone_format, progress=None):
+    """Importa um arquivo gravado por ``save_import_file`` (no worker)."""
+    with default_storage.open(path, 'rb') as upload:
+        return import_zone(domain, upload, zone_format, progress=progress)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0004_alter_tenant_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='sync_interval_minutes',
+            field=models.PositiveIntegerField(default=60),
+        ),
+    ]
@@ -16,6 +16,8 @@ class Tenant(models.Model):
     cloudflare_api_key = models.CharField(max_length=100)
     cloudflare_email = models.EmailField()
     created_at = models.DateTimeField(auto_now_add=True)
+    sync_interval_minutes = models.PositiveIntegerField(default=60)  # 0 desativa a sincronização agendada
+    last_synced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name